@@ -1,15 +1,22 @@
 import sys
 import os
 import shutil
-import re
 import pandas as pd
-import requests
 import urllib3
 import argparse
-import math
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 # import debugger
 import pdb
+
+# shared geocode cache lives with the gis_ehr pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "gis_ehr"))
+from geocode_cache import GeocodeCache
+from address_normalize import address_keys, normalize_zip
+from address_validate import validate_addresses
+from geocoder_backends import make_backend, multi_line_records, single_line_records
+from geocode_client import GeocodeError
  
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
  
@@ -34,15 +41,56 @@ parser.add_argument("-d", "--delimiter",
 parser.add_argument("-s", "--singleLine",
                     action="store_true",
                     help="addresses are in a single column called address")
+
+parser.add_argument("-m", "--combined",
+                    action="store_true",
+                    help="geocode both the single column address and the separate fields at once, and keep the better match per row")
+
+parser.add_argument("-p", "--policy",
+                    default="score",
+                    choices=["score", "zip"],
+                    help="with --combined, how to pick a row's match: highest score, or the one whose ZIP agrees with the input's (then highest score)")
                    
 parser.add_argument("-v", "--validate",
                     action="store_true",
-                    help="filter out invalid addresses (e.g. UNKNOWN, PO BOX, etc)")
+                    help="filter out invalid addresses (e.g. UNKNOWN, PO BOX, etc); dropped rows and why are written to *_REJECTED.csv")
  
 # output arguments
 parser.add_argument("-o", "--outputPath",
                     default=".",
                     help="directory to store output")
+
+parser.add_argument("-u", "--url",
+                    default=None,
+                    help="geocodeAddresses endpoint for the arcgis backend (default: the I2 server)")
+
+parser.add_argument("-b", "--backend",
+                    default="arcgis",
+                    choices=["arcgis", "offline"],
+                    help="geocoder to use (see gis_ehr/geocoder_backends.py); offline needs no network")
+
+parser.add_argument("--reference",
+                    default=None,
+                    help="street address range table for the offline backend")
+
+parser.add_argument("-c", "--cache",
+                    default=None,
+                    help="path to a SQLite geocode cache; cached addresses are not sent to the server")
+
+parser.add_argument("--cacheTTL",
+                    type=float,
+                    default=90,
+                    help="days before a cached geocode is refreshed")
+
+parser.add_argument("--timeout",
+                    type=float,
+                    default=300,
+                    help="seconds to wait for the server to answer one batch")
+
+parser.add_argument("--retries",
+                    type=int,
+                    default=5,
+                    help="times to retry a failed batch, with jittered exponential backoff")
  
 args = parser.parse_args()
 
@@ -52,6 +100,11 @@ args = parser.parse_args()
 # Check arguments
 ########################################################################################################################
  
+# modes
+if args.singleLine and args.combined:
+    print("ERROR: --singleLine and --combined can't be used together")
+    exit(1)
+
 # infile
 if not os.path.exists(args.infile) or not os.path.isfile(args.infile):
     print("ERROR: infile not found: " + args.infile)
@@ -71,64 +124,38 @@ if not os.path.exists(args.outputPath):
 ########################################################################################################################
 # Choose which addresses to include in the visualization based on their states
 # Only called if there is no -s (for single line), but there is a -v (for validate)
+# The states and rules are in gis_ehr/address_validate.py; every dropped row gets a reason code
+# (state, no_address, unknown, update, po_box)
 
-#STATES_OF_INTEREST = ["MISSOURI", "ILLINOIS"]
-# Non Missouri or Illinois States
-STATES_OF_INTEREST = ["MISSOURI", "ILLINOIS","ALABAMA","ALASKA","ARIZONA","ARKANSAS","CALIFORNIA","COLORADO", "CONNECTICUT","DELAWARE","FLORIDA","GEORGIA","INDIANA","IOWA","KANSAS","KENTUCKY","LOUISIANA","MARYLAND","MASSACHUSETTS", "MICHIGAN", "MINNESOTA","MISSISSIPPI","NEBRASKA","NEVADA","NEW JERSEY","NEW MEXICO", "NEW YORK","NORTH CAROLINA", "OHIO","OKLAHOMA","OREGON" , "PENNSYLVANIA","RHODE ISLAND","TENNESSEE","TEXAS","UTAH","VIRGINIA" ,"WASHINGTON","WISCONSIN" ]
-NA_VALUES = ["", "N/A", "NA"]
 SINGLE_LINE_ADDRESS_FIELD = "address"
-ADDRESS_FIELDS = ["ADD_LINE_1", "ADD_LINE_2", "CITY", "STATE", "ZIP"]
- 
-def is_input_valid_result_address(x):
-    [add1, add2, city, state, zip] = x[ADDRESS_FIELDS].str.upper()
-    if state not in STATES_OF_INTEREST:
-        return False
-    if add1 in NA_VALUES and add2 in NA_VALUES:
-        return False
-    if re.match(".*UNKNOWN.*", add1) or re.match(".*UNKNOWN.*", add2):
-        return False
-    if re.match(".*UPDATE.*", add1) or re.match(".*UPDATE.*", add2):
-        return False
-    if (re.match("^PO BOX \d+$", add1) and add2 in NA_VALUES) or (re.match("^PO BOX \d+$", add2) and add1 in NA_VALUES):
-        return False
-    return True
 ########################################################################################################################
 
 
 
 
 
+## Original url
+##url = https://10.25.63.131:6443/arcgis/rest/services/USA_StreetAddress_StreetName_Point/GeocodeServer/geocodeAddresses
+URL = "https://10.25.44.136:6443/arcgis/rest/services/USA/GeocodeServer/geocodeAddresses"
+## Ian sent us the url that ends with "findAddressCandidates" instead of "geocodeAddresses"
+
+# Batches are at most the backend's limit (1000 addresses for the ArcGIS server), and shrink below it while it is slow or failing
+# --combined sends both modes' batches at once
+backend = make_backend(args.backend, args.url or URL, args.reference, args.timeout, args.retries, workers=2 if args.combined else 1)
+batch_size = backend.batch_size
+
 def sendPostRequest(records):
-    ## Original url
-    ##url = https://10.25.63.131:6443/arcgis/rest/services/USA_StreetAddress_StreetName_Point/GeocodeServer/geocodeAddresses
-    url = "https://10.25.44.136:6443/arcgis/rest/services/USA/GeocodeServer/geocodeAddresses"
-    ## Ian sent us the url that ends with "findAddressCandidates" instead of "geocodeAddresses"
-    params = {"f" : "pjson", "addresses" : str(records)}
-    result = requests.post(url, data = params, verify = False)
-    return result.json()
- 
-def parsePostResponse(response):
+    # For ArcGIS: pooled session; transient failures and "error" responses are retried with backoff (see gis_ehr/geocode_client.py)
     try:
-        print(response['error'])
+        return backend.geocode_batch(records)
+    except GeocodeError as e:
+        print(e)
         sys.exit(-100)
-    except:
-        pass
-    locations = response["locations"]
-    
-    # Edit below data to consider Null data
-    #d = [[l["attributes"]["ResultID"], l["address"], l["location"]["x"], l["location"]["y"], l["score"], l["attributes"]["Status"]] for l in locations]
-    
-    d = []
-    for l in locations:
-        result_id = l["attributes"].get("ResultID", None)
-        address = l.get("address", None)
-        location_x = l.get("location", {}).get("x", None)
-        location_y = l.get("location", {}).get("y", None)
-        score = l.get("score", None)
-        status = l["attributes"].get("Status", None)
-        d.append([result_id, address, location_x, location_y, score, status])
-
-    df = pd.DataFrame(d, columns = ("ID", "Returned Address", "Longitude", "Latitude", "Score", "Status"))
+ 
+def parsePostResponse(results):
+    # Parsed column by column, missing fields become NaN/None (see gis_ehr/geocoder_backends.py)
+    df = results.copy()
+    df.columns = ["ID", "Returned Address", "Longitude", "Latitude", "Score", "Status"]
     df = df.sort_values("ID")
     return df
  
@@ -136,26 +163,12 @@ def formatRecordsSingleLine(data):
     print("... using single-line formatter")
     #pdb.set_trace()
     #print(data.columns)
-    addresses = data['address']
-    records = []
-    for i, address in enumerate(addresses):
-        attributes = dict({"ObjectID" : i, "SingleLine" : address})
-        records.append(dict({"attributes": attributes}))
-    return dict({"records" : records})
+    return single_line_records(range(len(data)), data['address'])
  
 def formatRecords(data):
     print("... using multi-line formatter")
-    records = []
-    i = 0
-    for index, row in data.iterrows():
-        attributes = dict({"ObjectID" : i, 
-                           "address" : row["street_address"], 
-                           "city" : row["givenCity"], 
-                           "region" : row["givenState"], 
-                           "postal" : row["givenZip"]})
-        records.append(dict({"attributes": attributes}))
-        i+=1
-    return dict({"records" : records})
+    return multi_line_records(range(len(data)), data["street_address"], 
+                              data["givenCity"], data["givenState"], data["givenZip"])
  
 def geocode(data, singleLine):
     records = formatRecordsSingleLine(data) if singleLine else formatRecords(data)
@@ -178,7 +191,12 @@ print("Columns in file:", data.columns)
  
 # filter for valid addresses if they are in separate fields. Assume a single line address is valid
 if not args.singleLine and args.validate:
-    data = data[data.apply(is_input_valid_result_address, axis=1)]
+    keep, reason = validate_addresses(data)
+    rejected = data[~keep].assign(**{"Reject Reason": reason[~keep]})
+    [tmp_file_name, tmp_file_ext] = os.path.splitext(os.path.basename(args.infile))
+    rejected.to_csv(os.path.join(args.outputPath, tmp_file_name + "_REJECTED.csv"), sep=",")
+    print("Rejected input addresses:", reason.value_counts().to_dict())
+    data = data[keep]
     print("Valid input addresses:", len(data.index))
  
 ########################################################################################################################
@@ -195,26 +213,106 @@ if not args.singleLine and args.validate:
    
 output_columns = ["Returned Address", "Latitude", "Longitude", "Score", "Status"]
 
-# add output columns
-for col in output_columns:
-    #data = data.assign(**{col:""})
-    if col not in data.columns:
-        data[col] = ""
+# Single-line results are cached under their own source: a single-line address has the same key as a
+# multi-line one with a blank city, state and ZIP, and --combined geocodes both
+if args.cache:
+    caches = {singleLine: GeocodeCache(args.cache, backend.source + ("#singleLine" if singleLine else ""),
+                                       ttl_days=args.cacheTTL)
+              for singleLine in [False, True]}
 
- 
-# The ArcGIS server has a batch limit of 1000 addresses
-ADDRESSES_PER_BATCH = 1000
-for i in range(0, math.ceil(data.shape[0] / ADDRESSES_PER_BATCH)):
-    startBatch = i * ADDRESSES_PER_BATCH
-    endBatch = min(data.shape[0], startBatch + ADDRESSES_PER_BATCH)
-    data_batch = data[startBatch:endBatch]
-   
-    print("Geocoding rows", startBatch+1, "-", endBatch)
- 
-    geocoding_results = geocode(data_batch, args.singleLine)
-   
-    for col in output_columns:
-        data.iloc[startBatch:endBatch, data.columns.get_loc(col)] = geocoding_results[col].values
+def geocodeAll(data, singleLine):
+    # Returns output_columns for every row of data, in order
+    results = pd.DataFrame("", index=range(data.shape[0]), columns=output_columns)
+
+    # Fill cached rows first; only the remaining (pending) rows are sent to the server
+    if args.cache:
+        cache = caches[singleLine]
+        if singleLine:
+            blank = pd.Series("", index=data.index)
+            keys = address_keys(data[SINGLE_LINE_ADDRESS_FIELD], blank, blank, blank)
+        else:
+            keys = address_keys(data["street_address"], data["givenCity"], data["givenState"], data["givenZip"])
+        cached = cache.get_many(keys)
+        hit_rows = [i for i, key in enumerate(keys) if key in cached]
+        hits = pd.DataFrame([cached[keys[i]] for i in hit_rows],
+                            columns=["Returned Address", "Longitude", "Latitude", "Score", "Status"])
+        for col in output_columns:
+            results.iloc[hit_rows, results.columns.get_loc(col)] = hits[col].values
+        pending_rows = [i for i, key in enumerate(keys) if key not in cached]
+        print(cache.summary())
+    else:
+        pending_rows = list(range(data.shape[0]))
+
+    startBatch = 0
+    while startBatch < len(pending_rows):
+        endBatch = min(len(pending_rows), startBatch + batch_size.size)
+        batch_rows = pending_rows[startBatch:endBatch]
+        data_batch = data.iloc[batch_rows]
+       
+        print("Geocoding rows", startBatch+1, "-", endBatch)
+     
+        geocoding_results = geocode(data_batch, singleLine)
+       
+        for col in output_columns:
+            results.iloc[batch_rows, results.columns.get_loc(col)] = geocoding_results[col].values
+
+        if args.cache:
+            cache.put_many(zip([keys[r] for r in batch_rows], 
+                               geocoding_results[["Returned Address", "Longitude", "Latitude", "Score", "Status"]].itertuples(index=False)))
+        startBatch = endBatch
+    return results
+
+########################################################################################################################
+# Combined mode: keep the better of the single-line and multi-line match for each row
+
+MODE_PREFIXES = {"single": "Single ", "multi": "Multi "}
+
+def returnedZip(results):
+    # ZIP at the end of each returned address ("..., St Louis, Missouri, 63110"); NaN if there is none
+    return results["Returned Address"].astype(str).str.extract(r"(\d{5})(?:-\d{4})?\s*$", expand=False).to_numpy(dtype=object)
+
+def chooseMatches(single, multi, givenZip, policy):
+    # Returns True where the single-line match is kept. Ties go to the multi-line match;
+    # a missing score (no match) counts as lower than any
+    single_score = pd.to_numeric(single["Score"], errors="coerce").fillna(-1).to_numpy()
+    multi_score = pd.to_numeric(multi["Score"], errors="coerce").fillna(-1).to_numpy()
+    use_single = single_score > multi_score
+    if policy == "zip":
+        # Only one match's ZIP agrees with the input's: keep that one
+        given = normalize_zip(givenZip).to_numpy(dtype=object)
+        single_agrees = returnedZip(single) == given
+        multi_agrees = returnedZip(multi) == given
+        use_single = np.where(single_agrees != multi_agrees, single_agrees, use_single)
+    return use_single
+
+def geocodeCombined(data, policy):
+    # Both modes run at once, from the same rows; output_columns hold the kept match,
+    # and each mode's own match is kept in its prefixed columns
+    with ThreadPoolExecutor(max_workers=min(2, backend.concurrency_limit)) as executor:
+        futures = {mode: executor.submit(geocodeAll, data, mode == "single") for mode in MODE_PREFIXES}
+        matches = {mode: future.result() for mode, future in futures.items()}
+    use_single = chooseMatches(matches["single"], matches["multi"], data["givenZip"], policy)
+    results = matches["multi"].copy()
+    results.loc[use_single] = matches["single"].loc[use_single]
+    results["Chosen Mode"] = np.where(use_single, "single", "multi")
+    for mode, prefix in MODE_PREFIXES.items():
+        results = pd.concat([matches[mode].add_prefix(prefix), results], axis=1)
+    print("Chosen mode:", results["Chosen Mode"].value_counts().to_dict())
+    return results
+
+if args.combined:
+    results = geocodeCombined(data, args.policy)
+else:
+    results = geocodeAll(data, args.singleLine)
+for col in results.columns:
+    data[col] = results[col].values
+
+backend.close()
+
+if args.cache:
+    for cache in caches.values():
+        cache.evict()
+        cache.close()
  
 ########################################################################################################################
 # Output
@@ -229,7 +327,7 @@ for i in range(0, math.ceil(data.shape[0] / ADDRESSES_PER_BATCH)):
 #data.to_csv(tmp_file_path, sep="\t")
 
 # csv
-method = "_single" if args.singleLine else "_multi"
+method = "_combined" if args.combined else "_single" if args.singleLine else "_multi"
 [tmp_file_name, tmp_file_ext] = os.path.splitext(os.path.basename(args.infile))
 tmp_file_path = os.path.join(args.outputPath, tmp_file_name + method + "_GEOCODED.csv")
 data.to_csv(tmp_file_path, sep=",")
\ No newline at end of file
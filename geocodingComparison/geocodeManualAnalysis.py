@@ -1,7 +1,8 @@
+import os
 import sys
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 
 
 # Define files to analyze
@@ -26,14 +27,20 @@ PLOTFILES = ['arcgisGeocode/stratumA_multi_GEOCODED.csv',
              'arcgisGeocode/stratumB_multi_GEOCODED.csv',
            'degauss/stratumB_geocoder_3.3.0_score_threshold_0.5.csv']
 
-FLAGGED_ADDRESSES = set()
+# Columns read as strings; the ZIP columns keep pandas' inference (see matchCityStateZip)
+TEXT_COLUMNS = ['address', 'givenCity', 'givenState', 'Returned Address', 'matched_city', 'matched_state']
+SCORE_COLUMNS = ['score', 'Score']
 
 
-def get_scores_from_csv(filename):
+def readGeocoderFile(filename):
     
-    # Read the CSV file
+    # Read the CSV file once, keeping only the score column and the columns from 'address' on
+    # (the given and matched fields, and everything the flag tables report)
     try:
-        df = pd.read_csv(filename)
+        header = pd.read_csv(filename, nrows=0).columns
+        first = header.get_loc('address')
+        usecols = [c for i, c in enumerate(header) if i >= first or c in SCORE_COLUMNS]
+        df = pd.read_csv(filename, usecols=usecols, dtype={c: str for c in TEXT_COLUMNS if c in usecols})
     except FileNotFoundError:
         print(f"File not found: {filename}")
         sys.exit(1)
@@ -43,6 +50,25 @@ def get_scores_from_csv(filename):
     except pd.errors.ParserError:
         print("Error parsing the file.")
         sys.exit(1)
+    except KeyError:
+        print(f"'address' column not found in {filename}.")
+        sys.exit(1)
+
+    return df[usecols]
+
+
+def getFileType(filename):
+    if 'single' in filename:
+        return "arcGISsingle"
+    elif 'multi' in filename:
+        return "arcGISmulti"
+    else:
+        return "DeGAUSS"
+
+
+
+
+def get_scores(df, filename):
 
     # Check if the 'score' column exists
     if 'score' in df.columns:
@@ -80,21 +106,8 @@ def get_scores_from_csv(filename):
 
 
 
-def matchCityStateZip(filename):
+def matchCityStateZip(df, filename):
     
-    # Read the CSV file
-    try:
-        df = pd.read_csv(filename)
-    except FileNotFoundError:
-        print(f"File not found: {filename}")
-        sys.exit(1)
-    except pd.errors.EmptyDataError:
-        print("No data in file.")
-        sys.exit(1)
-    except pd.errors.ParserError:
-        print("Error parsing the file.")
-        sys.exit(1)
-
     # Get the given columns and matched columns
     givenCols = df[['address', 'givenCity', 'givenState', 'givenZip']].astype('str')
 
@@ -105,64 +118,44 @@ def matchCityStateZip(filename):
     if filename in DGFILES:
         matchedCols = df[['matched_city', 'matched_state', 'matched_zip']].astype('str')
 
-    # Check equality
-    citiesEqual = []
-    zipsEqual = []
-    zipsNan = []
-    zipsDiff = []
-    mismatchTable = []
-    for i in range(len(givenCols)):
-        # Get the data
-        givenCity = givenCols.loc[i]['givenCity'].lower().strip()
-        givenZip = givenCols.loc[i]['givenZip'][0:5]
-        matchedCity = matchedCols.loc[i]['matched_city'].lower().strip()
-        matchedZip = matchedCols.loc[i]['matched_zip'][0:5]
-
-        if len(matchedZip) == 5 and matchedZip[4] == '.':
-            matchedZip = '0' + matchedZip[:4]
-        
-        # Calculate booleans
-        cityEqual = givenCity == matchedCity
-        zipEqual = givenZip == matchedZip
-        zipNan = matchedZip == 'nan'
-        zipDiff = not (zipEqual or zipNan)
-        
-        # Put them in vectors
-        citiesEqual.append(cityEqual)
-        zipsEqual.append(zipEqual)
-        zipsNan.append(zipNan)
-        zipsDiff.append(zipDiff)
-
-        # If Zip codes aren't equal, flag the address
-        if (not zipEqual):
-            
-            FLAGGED_ADDRESSES.add(givenCols.loc[i]['address'])
-
-            # May remove the mismatchDict importance
-            if 'single' in filename:
-                fileType = "arcGISsingle"
-            elif 'multi' in filename:
-                fileType = "arcGISmulti"
-            else:
-                fileType = "DeGAUSS"
-            
-            mismatchDict = {
-                "address": givenCols.loc[i]['address'],
-                "givenCity": givenCity,
-                "givenZip": givenZip,
-                "matchedCity_"+fileType: matchedCity,
-                "matchedZip_"+fileType: matchedZip
-            }
-
-            mismatchTable.append(mismatchDict)
+    # Normalize whole columns: lowercase/strip the cities, keep the first 5 characters of the ZIPs
+    # (missing values were turned into 'nan' by astype(str) above)
+    givenCity = givenCols['givenCity'].str.lower().str.strip()
+    givenZip = givenCols['givenZip'].str[0:5]
+    matchedCity = matchedCols['matched_city'].str.lower().str.strip()
+    matchedZip = matchedCols['matched_zip'].str[0:5]
+
+    # ZIPs read as floats lost their leading zero: '6311.' -> '06311'
+    floatZip = (matchedZip.str.len() == 5) & (matchedZip.str[4] == '.')
+    matchedZip = matchedZip.where(~floatZip, '0' + matchedZip.str[0:4])
+
+    # Equality masks
+    citiesEqual = (givenCity == matchedCity).to_numpy()
+    zipsEqual = (givenZip == matchedZip).to_numpy()
+    zipsNan = (matchedZip == 'nan').to_numpy()
+    zipsDiff = ~(zipsEqual | zipsNan)
+
+    # If Zip codes aren't equal, flag the address
+    mismatch = ~zipsEqual
+
+    # May remove the mismatchDict importance
+    fileType = getFileType(filename)
+
+    mismatchTable = pd.DataFrame({
+        "address": givenCols['address'][mismatch],
+        "givenCity": givenCity[mismatch],
+        "givenZip": givenZip[mismatch],
+        "matchedCity_"+fileType: matchedCity[mismatch],
+        "matchedZip_"+fileType: matchedZip[mismatch]
+    }).reset_index(drop=True)
 
     # Return results:
     matchDict = {
         "filename": filename,
-        "cityMatch": sum(citiesEqual),
-        "zipCodeMatch": sum(zipsEqual),
-        "Nan zip codes": sum(zipsNan),
-        "Diff zip codes": sum(zipsDiff)
+        "cityMatch": citiesEqual.sum(),
+        "zipCodeMatch": zipsEqual.sum(),
+        "Nan zip codes": zipsNan.sum(),
+        "Diff zip codes": zipsDiff.sum()
     }
 
     return matchDict, mismatchTable
@@ -170,124 +163,130 @@ def matchCityStateZip(filename):
 
 
 
-def getFlaggedRows(filename):
+def getFlaggedRows(df, flaggedAddresses):
     
-    # Read the CSV file
-    try:
-        df = pd.read_csv(filename)
-    except FileNotFoundError:
-        print(f"File not found: {filename}")
-        sys.exit(1)
-    except pd.errors.EmptyDataError:
-        print("No data in file.")
-        sys.exit(1)
-    except pd.errors.ParserError:
-        print("Error parsing the file.")
-        sys.exit(1)
-    
-    # If the address is in FLAGGED_ADDRESSES, get the data
+    # If the address is flagged, get the data
     address_column_index = df.columns.get_loc('address')
-    flagged_rows = df[df['address'].isin(FLAGGED_ADDRESSES)].iloc[:, address_column_index:].sort_values(by='address')
+    flagged_rows = df[df['address'].isin(flaggedAddresses)].iloc[:, address_column_index:].sort_values(by='address')
     
     return flagged_rows
 
 
 
+
+def combineFlags(flagTables, fileTypes):
+
+    # One outer join of the files' flagged rows on address, each file's columns suffixed with its
+    # file type. An address listed more than once is lined up by occurrence rather than cross-joined
+    keyed = [flags.set_index(['address', flags.groupby('address').cumcount()]) for flags in flagTables]
+    combined = pd.concat(keyed, axis=1, keys=fileTypes, join='outer').sort_index()
+    combined.columns = [f"{column}_{fileType}" for fileType, column in combined.columns]
+
+    return combined.reset_index(level=1, drop=True).reset_index()
+
+
+
+
+def analyzeFile(filename):
+
+    # Everything the report needs from one file, from a single read; run in a worker process
+    df = readGeocoderFile(filename)
+    verify, mismatchTable = matchCityStateZip(df, filename)
+
+    return {
+        "scores": get_scores(df, filename) if filename in PLOTFILES else None,
+        "verify": verify,
+        "mismatchTable": mismatchTable,
+        "flagged": set(mismatchTable['address']),
+        "df": df
+    }
+
+
+
 #############
-plotLabels = ['arcGIS - stratum A', 'gaia - stratum A', 'arcGIS - stratum B', 'gaia - stratum B']
-
-
-print('\n \nSummary statistics:')
-results = []
-for file in PLOTFILES:
-    result = get_scores_from_csv(file)
-    if result is not None:
-        results.append(result)
-dfSummary = pd.DataFrame(results)
-dfSummary['filename'] = plotLabels
-print(dfSummary)
-print(dfSummary.columns, dfSummary.shape)
-
-
-#box_data = dfSummary['scores'].dropna().to_list()
-#print(box_data)
-
-arcGISstratumA = dfSummary['scores'][0]
-cleanedAA = arcGISstratumA[~np.isnan(arcGISstratumA)]
-GAIAstratumA = dfSummary['scores'][1]
-cleanedGA = GAIAstratumA[~np.isnan(GAIAstratumA)]
-arcGISstratumB = dfSummary['scores'][2]
-cleanedAB = arcGISstratumB[~np.isnan(arcGISstratumB)]
-GAIAstratumB = dfSummary['scores'][3]
-cleanedGB = GAIAstratumB[~np.isnan(GAIAstratumB)]
-summary_data = [cleanedAA, cleanedGA, cleanedAB, cleanedGB]
-
-def set_axis_style(ax, labels):
-    
-    ax.set_xlim(0.25, len(labels) + 0.75)
-    ax.set_xlabel('Sample name')
+def main():
+    import matplotlib.pyplot as plt
 
-fig, ax = plt.subplots(1,1)
-ax.violinplot(summary_data, vert=False)
-ax.set_yticks(np.arange(1, 5), labels=dfSummary['filename'])
-ax.set_ylim(4.5, 0.5)
-ax.set_xlabel("Scores")
-ax.set_title("Geocoding Scores by Stratum by Method")
-#plt.violinplot(box_data, vert=False, patch_artist=True, labels=dfSummary['filename'])
+    plotLabels = ['arcGIS - stratum A', 'gaia - stratum A', 'arcGIS - stratum B', 'gaia - stratum B']
 
-plt.tight_layout()
-plt.savefig('violinPlot.png')
-#print(pd.DataFrame(results))
+    # Analyze the files in parallel, one worker per file
+    files = ARCFILES + DGFILES
+    with ProcessPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as executor:
+        analyses = dict(zip(files, executor.map(analyzeFile, files)))
 
 
+    print('\n \nSummary statistics:')
+    results = [analyses[file]["scores"] for file in PLOTFILES]
+    dfSummary = pd.DataFrame(results)
+    dfSummary['filename'] = plotLabels
+    print(dfSummary)
+    print(dfSummary.columns, dfSummary.shape)
 
 
+    #box_data = dfSummary['scores'].dropna().to_list()
+    #print(box_data)
 
+    arcGISstratumA = dfSummary['scores'][0]
+    cleanedAA = arcGISstratumA[~np.isnan(arcGISstratumA)]
+    GAIAstratumA = dfSummary['scores'][1]
+    cleanedGA = GAIAstratumA[~np.isnan(GAIAstratumA)]
+    arcGISstratumB = dfSummary['scores'][2]
+    cleanedAB = arcGISstratumB[~np.isnan(arcGISstratumB)]
+    GAIAstratumB = dfSummary['scores'][3]
+    cleanedGB = GAIAstratumB[~np.isnan(GAIAstratumB)]
+    summary_data = [cleanedAA, cleanedGA, cleanedAB, cleanedGB]
 
-print('\n \nCity/State/Zip verifications:')
-verifications = []
-mismatches = []
-for file in ARCFILES + DGFILES:
-    verify, mismatchTable = matchCityStateZip(file)
-    verifications.append(verify)
-    mismatches.append(pd.DataFrame(mismatchTable))
+    def set_axis_style(ax, labels):
+        
+        ax.set_xlim(0.25, len(labels) + 0.75)
+        ax.set_xlabel('Sample name')
 
+    fig, ax = plt.subplots(1,1)
+    ax.violinplot(summary_data, vert=False)
+    ax.set_yticks(np.arange(1, 5), labels=dfSummary['filename'])
+    ax.set_ylim(4.5, 0.5)
+    ax.set_xlabel("Scores")
+    ax.set_title("Geocoding Scores by Stratum by Method")
+    #plt.violinplot(box_data, vert=False, patch_artist=True, labels=dfSummary['filename'])
 
-zipTable = pd.DataFrame(verifications)
-zipTable = zipTable.loc[[1, 4, 3, 5], ['zipCodeMatch', 'Nan zip codes', 'Diff zip codes']]
-zipTable.index = plotLabels
-zipTable.columns = ['Zip Match', 'Zip NULL', 'Different Zip']
+    plt.tight_layout()
+    plt.savefig('violinPlot.png')
+    #print(pd.DataFrame(results))
 
 
-print()
-print(zipTable)
 
 
 
 
+    print('\n \nCity/State/Zip verifications:')
+    verifications = [analyses[file]["verify"] for file in files]
+    mismatches = [analyses[file]["mismatchTable"] for file in files]
+
+
+    zipTable = pd.DataFrame(verifications)
+    zipTable = zipTable.loc[[1, 4, 3, 5], ['zipCodeMatch', 'Nan zip codes', 'Diff zip codes']]
+    zipTable.index = plotLabels
+    zipTable.columns = ['Zip Match', 'Zip NULL', 'Different Zip']
+
+
+    print()
+    print(zipTable)
+
 
 
 
-print('\n \nMismatched addresses: ', len(FLAGGED_ADDRESSES))
 
-stratumAflags = []
-stratumBflags = []
-for file in ARCFILES + DGFILES:
-    if file in STRATUMA:
-        stratumAflags.append(getFlaggedRows(file))
-    else:
-        stratumBflags.append(getFlaggedRows(file))
 
-merged_df_A = stratumAflags[0]
-for df in stratumAflags[1:]:
-    merged_df_A = merged_df_A.merge(df, on='address', how='outer')
 
-merged_df_B = stratumBflags[0]
-for df in stratumBflags[1:]:
-    merged_df_B = merged_df_B.merge(df, on='address', how='outer')
+    flaggedAddresses = set().union(*[analyses[file]["flagged"] for file in files])
+    print('\n \nMismatched addresses: ', len(flaggedAddresses))
 
-merged_df_A.to_csv("flags_stratumA.csv", sep=",")
-merged_df_B.to_csv("flags_stratumB.csv", sep=",")
+    for stratum, stratumFiles in [('A', STRATUMA), ('B', STRATUMB)]:
+        flagTables = [getFlaggedRows(analyses[file]["df"], flaggedAddresses) for file in stratumFiles]
+        combined = combineFlags(flagTables, [getFileType(file) for file in stratumFiles])
+        combined.to_csv(f"flags_stratum{stratum}.csv", sep=",")
 
 
 
+if __name__ == "__main__":
+    main()
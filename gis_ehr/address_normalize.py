@@ -0,0 +1,102 @@
+# Address cleaning shared by the geocoding scripts.
+# combine_address is the original row-wise helper from geocode.py, kept as the reference behavior;
+# combine_address_vectorized gives the same output using whole-column operations.
+
+# Imports
+import operator
+import numpy as np
+import pandas as pd
+
+
+
+# --- Helper: manually parse combining address_1 and address_2 ---
+
+def combine_address(add1, add2):
+    # Evaluate none-types
+    if pd.isna(add1) and pd.isna(add2):
+        return ""
+    elif pd.isna(add1):
+        return add2
+    elif pd.isna(add2):
+        return add1
+    # Evaluate equality and substrings
+    add1, add2 = add1.strip(), add2.strip()
+    if add1 == add2:
+        return add1
+    elif add1 in add2:
+        return add2
+    elif add2 in add1:
+        return add1
+    # If add2 starts with a digit, put it first
+    if add2 and add2[0].isdigit():
+        return add2 + " " + add1
+    # Default: add1 + add2
+    return add1 + " " + add2
+
+
+
+# --- Vectorized version of combine_address ---
+
+def combine_address_vectorized(add1, add2):
+    # Same rules as combine_address, evaluated as boolean masks over whole columns.
+    # Non-string values (e.g. an all-numeric address_2 column) are compared as strings,
+    # where combine_address would fail on .strip().
+    na1 = add1.isna().to_numpy()
+    na2 = add2.isna().to_numpy()
+    s1 = add1.where(~na1, "").astype(str).str.strip()
+    s2 = add2.where(~na2, "").astype(str).str.strip()
+    a1 = s1.to_numpy(dtype=object)
+    a2 = s2.to_numpy(dtype=object)
+
+    # Equality and substrings, on the object arrays: a fixed-width str array would size every row
+    # for the longest address in the column
+    equal = a1 == a2
+    add1_in_add2 = np.fromiter(map(operator.contains, a2, a1), dtype=bool, count=len(a1))
+    add2_in_add1 = np.fromiter(map(operator.contains, a1, a2), dtype=bool, count=len(a1))
+
+    # If add2 starts with a digit, put it first
+    add2_digit = s2.str[:1].str.isdigit().to_numpy(dtype=bool)
+    joined = np.where(add2_digit, (s2 + " " + s1).to_numpy(dtype=object), (s1 + " " + s2).to_numpy(dtype=object))
+
+    combined = np.select([equal, add1_in_add2, add2_in_add1], [a1, a2, a1], default=joined)
+
+    # Missing values keep the other field as-is (unstripped), like combine_address
+    combined = np.where(na2, add1.to_numpy(dtype=object), combined)
+    combined = np.where(na1, add2.to_numpy(dtype=object), combined)
+    combined = np.where(na1 & na2, "", combined)
+    return pd.Series(combined, index=add1.index, dtype=object)
+
+
+
+# --- Normalization for cache and dedup keys ---
+# Two spellings of the same address should give the same key:
+# casing and runs of whitespace are ignored, and ZIP+4 / float-parsed ZIPs reduce to 5 digits.
+
+def normalize_text(values):
+    values = pd.Series(values)
+    return (values.where(values.notna(), "").astype(str)
+            .str.replace(r"\s+", " ", regex=True)
+            .str.strip()
+            .str.upper())
+
+def normalize_zip(values):
+    # "63110-1234", "631101234" and 63110.0 all become "63110"; 6311 (a lost leading zero) becomes "06311".
+    # Anything else, such as "1234567", is kept as it is rather than read as a short ZIP
+    values = normalize_text(values)
+    values = values.str.replace(r"\.0+$", "", regex=True)
+    digits = values.str.extract(r"^(?:(\d{5})(?:-?\d{4})?|(\d{3,4}))$")
+    digits = digits[0].where(digits[0].notna(), digits[1])
+    return digits.str.zfill(5).where(digits.notna(), values)
+
+def normalize_address(street_address, city, state, zip):
+    return pd.DataFrame({
+        "street_address": normalize_text(street_address).to_numpy(),
+        "city": normalize_text(city).to_numpy(),
+        "state": normalize_text(state).to_numpy(),
+        "zip": normalize_zip(zip).to_numpy(),
+    })
+
+def address_keys(street_address, city, state, zip):
+    # One "STREET|CITY|STATE|ZIP" string per row
+    fields = normalize_address(street_address, city, state, zip)
+    return (fields["street_address"] + "|" + fields["city"] + "|" + fields["state"] + "|" + fields["zip"]).tolist()
@@ -0,0 +1,65 @@
+# Input address validation for geocodingComparison/abigailScript.py --validate.
+# is_input_valid_result_address is the original row-wise filter, kept as the reference behavior;
+# validate_addresses gives the same keep/drop decision over whole columns, plus the reason each
+# dropped row was rejected.
+
+# Imports
+import re
+import numpy as np
+import pandas as pd
+
+#STATES_OF_INTEREST = ["MISSOURI", "ILLINOIS"]
+# Non Missouri or Illinois States
+STATES_OF_INTEREST = ["MISSOURI", "ILLINOIS","ALABAMA","ALASKA","ARIZONA","ARKANSAS","CALIFORNIA","COLORADO", "CONNECTICUT","DELAWARE","FLORIDA","GEORGIA","INDIANA","IOWA","KANSAS","KENTUCKY","LOUISIANA","MARYLAND","MASSACHUSETTS", "MICHIGAN", "MINNESOTA","MISSISSIPPI","NEBRASKA","NEVADA","NEW JERSEY","NEW MEXICO", "NEW YORK","NORTH CAROLINA", "OHIO","OKLAHOMA","OREGON" , "PENNSYLVANIA","RHODE ISLAND","TENNESSEE","TEXAS","UTAH","VIRGINIA" ,"WASHINGTON","WISCONSIN" ]
+NA_VALUES = ["", "N/A", "NA"]
+ADDRESS_FIELDS = ["ADD_LINE_1", "ADD_LINE_2", "CITY", "STATE", "ZIP"]
+
+# Why a row was dropped, in the order the checks run (the first failing check is reported)
+REJECT_REASONS = ["state", "no_address", "unknown", "update", "po_box"]
+
+
+
+# --- Original row-wise filter ---
+
+def is_input_valid_result_address(x):
+    [add1, add2, city, state, zip] = x[ADDRESS_FIELDS].str.upper()
+    if state not in STATES_OF_INTEREST:
+        return False
+    if add1 in NA_VALUES and add2 in NA_VALUES:
+        return False
+    if re.match(".*UNKNOWN.*", add1) or re.match(".*UNKNOWN.*", add2):
+        return False
+    if re.match(".*UPDATE.*", add1) or re.match(".*UPDATE.*", add2):
+        return False
+    if (re.match(r"^PO BOX \d+$", add1) and add2 in NA_VALUES) or (re.match(r"^PO BOX \d+$", add2) and add1 in NA_VALUES):
+        return False
+    return True
+
+
+
+# --- Vectorized version ---
+# Compiled once; matched from the start of the string like re.match, so (as in the original) "." stops
+# at a newline and UNKNOWN/UPDATE only count on an address's first line
+
+UNKNOWN = re.compile(".*UNKNOWN")
+UPDATE = re.compile(".*UPDATE")
+PO_BOX = re.compile(r"PO BOX \d+$")
+
+def validate_addresses(data, states=STATES_OF_INTEREST):
+    # data has ADDRESS_FIELDS as strings. Returns (keep mask, reason): reason is a categorical of
+    # REJECT_REASONS for dropped rows and NaN for kept ones. Missing values count as empty strings
+    # (the row-wise filter fails on them)
+    add1, add2, state = [data[field].fillna("").astype(str).str.upper() for field in ["ADD_LINE_1", "ADD_LINE_2", "STATE"]]
+
+    na1 = add1.isin(NA_VALUES).to_numpy()
+    na2 = add2.isin(NA_VALUES).to_numpy()
+    failed = [
+        ~state.isin(frozenset(states)).to_numpy(),
+        na1 & na2,
+        (add1.str.match(UNKNOWN) | add2.str.match(UNKNOWN)).to_numpy(),
+        (add1.str.match(UPDATE) | add2.str.match(UPDATE)).to_numpy(),
+        (add1.str.match(PO_BOX).to_numpy() & na2) | (add2.str.match(PO_BOX).to_numpy() & na1),
+    ]
+    codes = np.select(failed, range(len(REJECT_REASONS)), default=-1)
+    reason = pd.Series(pd.Categorical.from_codes(codes, REJECT_REASONS), index=data.index)
+    return codes == -1, reason
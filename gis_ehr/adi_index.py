@@ -0,0 +1,264 @@
+# Block group lookup for join_adi.py: polygons, a spatial index, and the FIPS -> ADI table.
+# Reading the shapefile and building the index takes longer than joining a small daily increment,
+# so this can be compiled once into a directory that later runs load in milliseconds:
+#   blockgroups.parquet - GeoParquet of FIPS + polygons, rows in Hilbert-curve order, with bbox columns
+#   adi.feather         - the ADI table as typed columns (int64 FIPS, int8 ranks; see adi_table.py)
+#   grid/               - the NumPy point-in-polygon engine's arrays (see pip_engine.py)
+# Loading reads the WKB straight into shapely (no geopandas import) and packs an STRtree over the
+# Hilbert-ordered polygons, prepared for fast point-in-polygon tests. When the grid engine is there,
+# points are located with it, and the STRtree only settles points right next to a boundary.
+#
+# Compile with:
+#   python adi_index.py
+
+# Imports
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import shapely
+
+from adi_table import FIPS_DIGITS, AdiTable, numeric_ranks
+from defaults import ADI_TABLE, GEOGRAPHY_LEVELS, INDEX_DIR, SHAPEFILE
+from parallel_join import locate_parallel
+from pip_engine import ENGINE_DIR, GridEngine
+
+BLOCK_GROUPS_FILE = 'blockgroups.parquet'
+ADI_FILE = 'adi.feather'
+EARTH_RADIUS_METERS = 6371008.8
+
+
+
+# --- Sources ---
+
+def read_block_groups(path=SHAPEFILE):
+    # Returns a GeoDataFrame with FIPS (str) and geometry
+    import geopandas as gpd
+    shp = gpd.read_file(path)
+    shp.rename(columns={'GEOID20':'FIPS'}, inplace=True)
+    shp['FIPS'] = shp['FIPS'].astype(str)
+    return shp.loc[:, ['FIPS', 'geometry']]
+
+def read_adi(path=ADI_TABLE):
+    return AdiTable.from_csv(path)
+
+def shapefile_files(path):
+    # The parts of a shapefile the block groups are read from
+    stem = os.path.splitext(path)[0]
+    return [stem + extension for extension in ['.shp', '.shx', '.dbf']]
+
+
+
+# --- Larger geographies ---
+# Block group GEOIDs nest: state (2 digits) + county (3) + tract (6) + block group (1),
+# so one block group hit already determines the tract, county and state (GEOGRAPHY_LEVELS, in defaults.py).
+
+def level_metrics(adi, level):
+    # Per-unit summary of the block group ADI ranks: how many block groups it has, and median ranks
+    # over the ones with a numeric rank (GQ, PH, GQ-PH and QDI are left out)
+    units = pd.Series(adi.fips).astype(str).str.zfill(FIPS_DIGITS).str[:GEOGRAPHY_LEVELS[level]]
+    ranks = pd.DataFrame({
+        level + '_FIPS': units,
+        level + '_ADI_NAT_MEDIAN': numeric_ranks(adi.nat),
+        level + '_ADI_ST_MEDIAN': numeric_ranks(adi.st),
+    })
+    metrics = ranks.groupby(level + '_FIPS').median()
+    metrics.insert(0, level + '_BLOCK_GROUPS', units.value_counts())
+    return metrics.reset_index()
+
+def add_levels(df, adi, levels=GEOGRAPHY_LEVELS):
+    # Adds <LEVEL>_FIPS and that level's metrics for every level, from the FIPS column alone
+    for level in levels:
+        df = df.assign(**{level + '_FIPS': df['FIPS'].astype(object).str[:GEOGRAPHY_LEVELS[level]]})
+        df = df.merge(level_metrics(adi, level), on=level + '_FIPS', how='left')
+        df[level + '_BLOCK_GROUPS'] = df[level + '_BLOCK_GROUPS'].astype('Int64')
+    return df
+
+def level_counts(df, level):
+    # Number of locations in each unit of one level (what the anaphylaxis notebook counted by brute force),
+    # alongside that unit's metrics
+    columns = [c for c in df.columns if c.startswith(level + '_')]
+    located = df[df[level + '_FIPS'].notna()]
+    return located.groupby(columns, dropna=False).size().rename('numAddr').reset_index()
+
+
+# --- Index ---
+
+class BlockGroupIndex:
+
+    def __init__(self, fips, geometries, adi, crs=None, engine=None):
+        self.fips = np.asarray(fips, dtype=object)
+        self.geometries = np.asarray(geometries)
+        self.adi = adi
+        self.crs = crs
+        self.engine = engine
+        # Set by load(), so worker processes can reopen the same compiled index
+        self.path = None
+        # Set by from_sources(): the shapefile and ADI table it was built from
+        self.sources = []
+        # More than one locates large inputs in a process pool (see parallel_join.py)
+        self.workers = 1
+        self.tree = shapely.STRtree(self.geometries)
+        # Prepared polygons make the repeated point-in-polygon tests much cheaper
+        shapely.prepare(self.geometries)
+
+    def __len__(self):
+        return len(self.fips)
+
+    @classmethod
+    def from_sources(cls, shapefile=SHAPEFILE, adi_table=ADI_TABLE):
+        block_groups = read_block_groups(shapefile)
+        # Neighbouring polygons end up next to each other in the file and in the tree's leaves
+        block_groups = block_groups.iloc[block_groups.geometry.hilbert_distance().argsort()]
+        index = cls(block_groups['FIPS'].values, block_groups.geometry.values, read_adi(adi_table),
+                    block_groups.crs.to_json() if block_groups.crs else None)
+        index.sources = shapefile_files(shapefile) + [adi_table]
+        return index
+
+    @classmethod
+    def load(cls, path=INDEX_DIR, engine=True, mmap_mode=None):
+        # engine=False ignores a saved grid engine and locates points with the STRtree alone
+        table = pq.read_table(os.path.join(path, BLOCK_GROUPS_FILE), columns=['FIPS', 'geometry'])
+        geo = json.loads(table.schema.metadata[b'geo'])
+        crs = geo['columns']['geometry'].get('crs')
+        geometries = shapely.from_wkb(table.column('geometry').to_numpy())
+        adi = AdiTable.load(os.path.join(path, ADI_FILE))
+        grid = None
+        if engine and os.path.isdir(os.path.join(path, ENGINE_DIR)):
+            grid = GridEngine.load(path, mmap_mode)
+        index = cls(table.column('FIPS').to_numpy(zero_copy_only=False), geometries, adi,
+                    json.dumps(crs) if crs else None, grid)
+        index.path = path
+        return index
+
+    def source_files(self):
+        # The files the index came from: its compiled directory, or the shapefile and ADI table
+        return [self.path] if self.path else self.sources
+
+    def block_groups(self):
+        # GeoDataFrame of FIPS and geometry (what read_block_groups gives), without rereading the shapefile
+        import geopandas as gpd
+        return gpd.GeoDataFrame({'FIPS': self.fips}, geometry=self.geometries, crs=self.crs)
+
+    def save(self, path=INDEX_DIR):
+        os.makedirs(path, exist_ok=True)
+        block_groups = self.block_groups()
+        block_groups.to_parquet(os.path.join(path, BLOCK_GROUPS_FILE), index=False, write_covering_bbox=True)
+        self.adi.save(os.path.join(path, ADI_FILE))
+        engine = self.engine if self.engine is not None else GridEngine.build(self.geometries)
+        engine.save(path)
+
+    def locate(self, x, y):
+        # Returns (point index, polygon index) for every point strictly inside a block group,
+        # the same pairs gpd.sjoin(..., predicate='within') finds, ordered by point
+        if self.workers > 1:
+            return locate_parallel(self, x, y, self.workers)
+        return self.locate_serial(x, y)
+
+    def locate_serial(self, x, y):
+        if self.engine is not None:
+            return self.engine.locate(x, y, exact=self.locate_exact)
+        return self.locate_exact(x, y)
+
+    def locate_exact(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        # Bounding-box candidates from the tree, then an exact test against each candidate polygon
+        # (contains_xy excludes the boundary, exactly like 'within')
+        point_idx, polygon_idx = self.tree.query(shapely.points(x, y))
+        inside = shapely.contains_xy(self.geometries[polygon_idx], x[point_idx], y[point_idx])
+        point_idx, polygon_idx = point_idx[inside], polygon_idx[inside]
+        order = np.lexsort((polygon_idx, point_idx))
+        return point_idx[order], polygon_idx[order]
+
+    def locate_nearest(self, x, y, max_meters):
+        # For each point, the nearest block group within max_meters of it, as (point index, FIPS, meters).
+        # Meant for the points locate() left unmatched (just off the coast or a state line, or in a gap)
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        rows = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+        if len(rows) == 0:
+            return rows, np.array([], dtype=object), np.array([])
+        points = shapely.points(x[rows], y[rows])
+        point_idx, polygon_idx = self.tree.query_nearest(points, max_distance=search_degrees(y[rows], max_meters))
+        # query_nearest measures in degrees; keep the first match per point (there may be none at all)
+        # and measure it on the ground
+        point_idx, first = np.unique(point_idx, return_index=True)
+        polygon_idx = polygon_idx[first]
+        lines = shapely.shortest_line(points[point_idx], self.geometries[polygon_idx])
+        meters = haversine_meters(*shapely.get_coordinates(lines).reshape(-1, 4).T)
+        keep = meters <= max_meters
+        return rows[point_idx[keep]], self.fips[polygon_idx[keep]], meters[keep]
+
+    def join(self, df, nearest=None):
+        # Adds FIPS and the ADI columns to df (location_id, location_x, location_y), like join_adi.py always has.
+        # With nearest (meters), unmatched points take the nearest block group within that distance
+        x, y = df['location_x'].values, df['location_y'].values
+        point_idx, polygon_idx = self.locate(x, y)
+        if nearest is None:
+            return join_fips(df, point_idx, self.fips[polygon_idx], self.adi)
+        point_idx, fips, match = match_nearest(x, y, point_idx, self.fips[polygon_idx], self.locate_nearest, nearest)
+        return join_fips(df, point_idx, fips, self.adi, match)
+
+def search_degrees(lat, meters):
+    # A search radius in degrees that covers `meters` everywhere in the points' latitude range:
+    # a degree of longitude is shortest at the highest latitude
+    lat = min(np.abs(lat).max() + 1, 89)
+    return meters / (np.radians(1) * EARTH_RADIUS_METERS * np.cos(np.radians(lat)))
+
+def haversine_meters(x0, y0, x1, y1):
+    x0, y0, x1, y1 = map(np.radians, (x0, y0, x1, y1))
+    a = np.sin((y1 - y0) / 2) ** 2 + np.cos(y0) * np.cos(y1) * np.sin((x1 - x0) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(a))
+
+def match_nearest(x, y, point_idx, fips, locate_nearest, max_meters):
+    # Adds a nearest-block-group match for each point locate() left unmatched, and labels every match.
+    # Returns (point index, FIPS, match), ordered by point; match holds match_type and match_distance_m
+    unmatched = np.setdiff1d(np.arange(len(x)), point_idx)
+    near_idx, near_fips, meters = locate_nearest(np.asarray(x, dtype=float)[unmatched],
+                                                 np.asarray(y, dtype=float)[unmatched], max_meters)
+    point_idx = np.concatenate([point_idx, unmatched[near_idx]])
+    order = np.argsort(point_idx, kind='stable')
+    match = pd.DataFrame({
+        'match_type': np.repeat(['within', 'nearest'], [len(fips), len(near_fips)]),
+        'match_distance_m': np.concatenate([np.zeros(len(fips)), meters]),
+    }).iloc[order].reset_index(drop=True)
+    return point_idx[order], np.concatenate([fips, near_fips])[order], match
+
+def join_fips(df, point_idx, fips, adi, match=None):
+    # Left-joins the FIPS found for rows point_idx of df, then probes the ADI table for each FIPS.
+    # match (from match_nearest) adds match_type and match_distance_m; rows with no match get 'none'
+    joined_df = pd.DataFrame({'location_id': df['location_id'].values[point_idx], 'FIPS': fips})
+    if match is not None:
+        joined_df = pd.concat([joined_df, match], axis=1)
+    print("Shape of joined_df: ", joined_df.shape)
+    df = df.merge(joined_df, on='location_id', how='left')
+    if match is not None:
+        df['match_type'] = df['match_type'].fillna('none')
+    return adi.join(df)
+
+def load_index(path=INDEX_DIR, shapefile=SHAPEFILE, adi_table=ADI_TABLE, engine=True):
+    # Use the compiled index when there is one, otherwise build it from the raw files
+    if os.path.isdir(path):
+        return BlockGroupIndex.load(path, engine)
+    print(f"No compiled index at {path}; reading {shapefile} (run adi_index.py once to compile it)")
+    return BlockGroupIndex.from_sources(shapefile, adi_table)
+
+
+
+if __name__ == "__main__":
+    description = "Compile the block group polygons, spatial index and ADI table for join_adi.py"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-s', '--shapefile', default=SHAPEFILE, help="block group shapefile")
+    parser.add_argument('-a', '--adi', default=ADI_TABLE, help="ADI CSV for the same state")
+    parser.add_argument('-o', '--output', default=INDEX_DIR, help="directory to write the compiled index to")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = BlockGroupIndex.from_sources(args.shapefile, args.adi)
+    index.save(args.output)
+    print(f"Compiled {len(index)} block groups and {len(index.adi)} ADI rows to {args.output} "
+          f"in {time.perf_counter() - start:.2f}s")
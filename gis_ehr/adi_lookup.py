@@ -0,0 +1,157 @@
+# FIPS/ADI lookup for single points or arrays of points, loaded once and reused.
+# In-process:
+#   from adi_lookup import AdiLookup
+#   lookup = AdiLookup()
+#   lookup.lookup(-90.263, 38.635)            -> ('295101124003', '25', '1')
+#   lookup.lookup_many(lons, lats)            -> DataFrame of FIPS, ADI_NAT_20, ADI_ST_20
+# As a local service (so notebooks and other scripts don't each load the index):
+#   python adi_lookup.py --port 8090
+#   GET  /lookup?lon=-90.263&lat=38.635       -> {"FIPS": ..., "ADI_NAT_20": ..., "ADI_ST_20": ...}
+#   POST /lookup_many  {"lon": [...], "lat": [...]}  -> {"FIPS": [...], "ADI_NAT_20": [...], "ADI_ST_20": [...]}
+# Points outside every block group get None for all three.
+
+# Imports
+import argparse
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+import shapely
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from adi_index import INDEX_DIR, SHAPEFILE, ADI_TABLE, load_index
+from adi_table import decode_ranks, fips_keys
+
+LOOKUP_COLUMNS = ['FIPS', 'ADI_NAT_20', 'ADI_ST_20']
+
+
+
+# --- Lookup ---
+
+class AdiLookup:
+
+    def __init__(self, index=None, path=INDEX_DIR, shapefile=SHAPEFILE, adi_table=ADI_TABLE):
+        self.index = index if index is not None else load_index(path, shapefile, adi_table)
+        # One ADI row per polygon, so a polygon hit maps straight to its metrics without a merge
+        rows = self.index.adi.rows(fips_keys(self.index.fips))
+        self.values = {'FIPS': self.index.fips}
+        for column in LOOKUP_COLUMNS[1:]:
+            ranks = decode_ranks(self.index.adi.ranks(column, rows))
+            self.values[column] = np.asarray(ranks, dtype=object)
+            self.values[column][ranks.isna()] = None
+
+    def polygon_of(self, lon, lat):
+        # Index of the block group containing (lon, lat), or -1
+        candidates = self.index.tree.query(shapely.Point(lon, lat))
+        if len(candidates) == 0:
+            return -1
+        inside = shapely.contains_xy(self.index.geometries[candidates], lon, lat)
+        return candidates[inside].min() if inside.any() else -1
+
+    def lookup(self, lon, lat):
+        # Returns (FIPS, ADI_NAT_20, ADI_ST_20), or (None, None, None) outside every block group
+        i = self.polygon_of(lon, lat)
+        if i < 0:
+            return (None, None, None)
+        return tuple(self.values[column][i] for column in LOOKUP_COLUMNS)
+
+    def lookup_many(self, lons, lats):
+        # One row per input point, in input order; a point on several polygons takes the first
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        if lons.shape != lats.shape or lons.ndim != 1:
+            raise ValueError("lons and lats must be flat arrays of equal length")
+        point_idx, polygon_idx = self.index.locate(lons, lats)
+        # point_idx is sorted, so its first occurrences are each point's first polygon (there may be none)
+        point_idx, first = np.unique(point_idx, return_index=True)
+        polygon = np.full(len(lons), -1)
+        polygon[point_idx] = polygon_idx[first]
+        found = polygon >= 0
+        result = {}
+        for column in LOOKUP_COLUMNS:
+            values = np.full(len(lons), None, dtype=object)
+            values[found] = self.values[column][polygon[found]]
+            result[column] = values
+        return pd.DataFrame(result)
+
+
+
+# --- Local service ---
+
+class LookupHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients don't pay for a new connection per lookup
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY each reply waits on a delayed ACK
+    disable_nagle_algorithm = True
+    lookup = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/lookup":
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        try:
+            lon, lat = float(query["lon"][0]), float(query["lat"][0])
+        except (KeyError, ValueError):
+            self.sendJson(400, {"error": "lon and lat are required numbers"})
+            return
+        self.sendJson(200, dict(zip(LOOKUP_COLUMNS, self.lookup.lookup(lon, lat))))
+
+    def do_POST(self):
+        if self.path != "/lookup_many":
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length))
+            result = self.lookup.lookup_many(body["lon"], body["lat"])
+        except (KeyError, TypeError, ValueError):
+            self.sendJson(400, {"error": "body must be {\"lon\": [...], \"lat\": [...]} of equal length"})
+            return
+        self.sendJson(200, {column: result[column].tolist() for column in LOOKUP_COLUMNS})
+
+    def sendJson(self, status, content):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class LookupServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections from bursts of concurrent clients
+    request_queue_size = 128
+
+def startServer(lookup, port=0):
+    # Starts the service in a background thread; returns (server, base url)
+    handler = type("LookupHandler", (LookupHandler,), {"lookup": lookup})
+    server = LookupServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+
+if __name__ == "__main__":
+    description = "Serve FIPS/ADI lookups from a block group index loaded once"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-p', '--port', type=int, default=8090, help="port to listen on")
+    parser.add_argument('-i', '--index', default=INDEX_DIR, help="compiled block group index from adi_index.py")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    lookup = AdiLookup(path=args.index)
+    server, url = startServer(lookup, args.port)
+    print(f"Loaded {len(lookup.index)} block groups in {time.perf_counter() - start:.2f}s; listening at {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,145 @@
+# The Neighborhood Atlas ADI table, held as typed arrays instead of a DataFrame of strings:
+#   fips  - int64 block group GEOIDs, sorted, so a FIPS is found with one searchsorted probe
+#   nat   - int8 national rank (1-100)
+#   st    - int8 state rank (1-10)
+# Block groups without a rank carry a suppression code instead, stored as a negative sentinel:
+#   GQ (-1), PH (-2), GQ-PH (-3), QDI (-4); 0 means no value at all.
+# GISJOIN isn't stored: it is always 'G' + state + '0' + county + '0' + tract + block group.
+#
+# Joined output gets the ranks back as categoricals of the original strings ('70', 'GQ', ...),
+# so the CSV that join_adi.py writes is unchanged, while a joined frame costs one small code per row.
+
+# Imports
+import numpy as np
+import pandas as pd
+
+ADI_CODES = {'GQ': -1, 'PH': -2, 'GQ-PH': -3, 'QDI': -4}
+RANK_COLUMNS = {'ADI_NAT_20': 'nat', 'ADI_ST_20': 'st'}
+FIPS_DIGITS = 12
+
+# Category i of a decoded rank column is rank i + 1; suppression code c is category 99 - c
+RANK_CATEGORIES = [str(rank) for rank in range(1, 101)] + list(ADI_CODES)
+
+
+
+# --- Encoding ---
+
+def fips_keys(fips):
+    # FIPS strings (or numbers) -> int64 keys; missing values become -1
+    fips = pd.Series(np.asarray(fips, dtype=object))
+    return pd.to_numeric(fips, errors='coerce').fillna(-1).astype(np.int64).values
+
+def encode_ranks(values):
+    # ADI rank strings or numbers -> int8: the rank itself, a negative suppression code, or 0 if missing
+    values = pd.Series(np.asarray(values, dtype=object)).astype(str).str.strip()
+    ranks = pd.to_numeric(values, errors='coerce')
+    codes = values.map(ADI_CODES)
+    return ranks.fillna(codes).fillna(0).astype(np.int8).values
+
+def numeric_ranks(ranks):
+    # int8 ranks -> float, with NaN for suppression codes and missing values (for medians and plots)
+    ranks = np.asarray(ranks)
+    return np.where(ranks > 0, ranks, np.nan)
+
+def decode_ranks(ranks):
+    # int8 ranks -> a categorical of the strings the ADI CSV used
+    ranks = np.asarray(ranks, dtype=np.int16)
+    codes = np.where(ranks > 0, ranks - 1, np.where(ranks < 0, 99 - ranks, -1))
+    return pd.Categorical.from_codes(codes, categories=RANK_CATEGORIES)
+
+def gisjoin(fips):
+    # int64 FIPS -> GISJOIN strings
+    fips = pd.Series(fips).astype(str).str.zfill(FIPS_DIGITS)
+    return ('G' + fips.str[:2] + '0' + fips.str[2:5] + '0' + fips.str[5:]).values
+
+
+
+# --- Table ---
+
+class AdiTable:
+
+    def __init__(self, fips, nat, st):
+        order = np.argsort(fips, kind='stable')
+        self.fips = np.asarray(fips, dtype=np.int64)[order]
+        self.nat = np.asarray(nat, dtype=np.int8)[order]
+        self.st = np.asarray(st, dtype=np.int8)[order]
+        if len(self.fips) > 1 and (np.diff(self.fips) == 0).any():
+            raise ValueError("ADI table has duplicate FIPS codes")
+
+    def __len__(self):
+        return len(self.fips)
+
+    @classmethod
+    def from_frame(cls, adi):
+        # adi: the Neighborhood Atlas columns (GISJOIN, FIPS, ADI_NATRANK, ADI_STATERNK), or the renamed
+        # string table older compiled indexes saved
+        adi = adi.rename(columns={'ADI_NATRANK': 'ADI_NAT_20', 'ADI_STATERNK': 'ADI_ST_20'})
+        fips = fips_keys(adi['FIPS'])
+        if 'GISJOIN' in adi and not (gisjoin(fips) == adi['GISJOIN'].astype(str).values).all():
+            raise ValueError("ADI table has GISJOIN codes that don't match their FIPS")
+        return cls(fips, encode_ranks(adi['ADI_NAT_20']), encode_ranks(adi['ADI_ST_20']))
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls.from_frame(pd.read_csv(path, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        adi = pd.read_feather(path)
+        if adi['FIPS'].dtype == object:
+            return cls.from_frame(adi)
+        return cls(adi['FIPS'].values, adi['ADI_NAT_20'].values, adi['ADI_ST_20'].values)
+
+    def save(self, path):
+        pd.DataFrame({'FIPS': self.fips, 'ADI_NAT_20': self.nat, 'ADI_ST_20': self.st}).to_feather(path)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = list(tables)
+        return cls(np.concatenate([t.fips for t in tables] or [np.array([], dtype=np.int64)]),
+                   np.concatenate([t.nat for t in tables] or [np.array([], dtype=np.int8)]),
+                   np.concatenate([t.st for t in tables] or [np.array([], dtype=np.int8)]))
+
+    def rows(self, keys):
+        # Row of each int64 FIPS key, or -1 where the table has none
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self.fips) == 0:
+            return np.full(len(keys), -1)
+        rows = np.minimum(np.searchsorted(self.fips, keys), len(self.fips) - 1)
+        return np.where(self.fips[rows] == keys, rows, -1)
+
+    def ranks(self, column, rows=None):
+        # int8 ranks of one column (ADI_NAT_20 or ADI_ST_20), for rows (default: every row); 0 where rows is -1
+        ranks = getattr(self, RANK_COLUMNS[column])
+        if rows is None:
+            return ranks
+        # An empty table (a registry with no states) has nothing for rows to point at
+        if len(ranks) == 0:
+            return np.zeros(len(rows), dtype=np.int8)
+        return np.where(rows >= 0, ranks[rows], 0).astype(np.int8)
+
+    def join(self, df, on='FIPS'):
+        # Adds GISJOIN, ADI_NAT_20 and ADI_ST_20 for the FIPS in df[on], as categoricals.
+        # Each distinct FIPS is converted and probed once, however many rows share it
+        codes, uniques = pd.factorize(df[on])
+        rows = self.rows(fips_keys(uniques))
+        found = rows >= 0
+        # GISJOIN categories are only built for the block groups that actually occur.
+        # Both lookups end in -1, so a missing FIPS (code -1) gets -1 even when there are no uniques
+        gisjoin_codes = np.full(len(uniques) + 1, -1)
+        gisjoin_codes[:-1][found] = np.arange(found.sum())
+        columns = {'GISJOIN': pd.Categorical.from_codes(gisjoin_codes[codes],
+                                                        categories=gisjoin(self.fips[rows[found]]))}
+        row_of_point = np.append(rows, -1)[codes]
+        for column in RANK_COLUMNS:
+            columns[column] = decode_ranks(self.ranks(column, row_of_point))
+        return df.assign(**columns)
+
+    def frame(self):
+        # The table as the string DataFrame join_adi.py used to merge (GISJOIN, FIPS, ADI_NAT_20, ADI_ST_20)
+        return pd.DataFrame({
+            'GISJOIN': gisjoin(self.fips),
+            'FIPS': pd.Series(self.fips).astype(str).str.zfill(FIPS_DIGITS).values,
+            'ADI_NAT_20': np.asarray(decode_ranks(self.nat), dtype=object),
+            'ADI_ST_20': np.asarray(decode_ranks(self.st), dtype=object),
+        })
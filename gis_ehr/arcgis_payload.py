@@ -0,0 +1,57 @@
+# Build geocodeAddresses request payloads and parse responses, column by column.
+# Shared by geocode.py and geocodingComparison/abigailScript.py.
+
+# Imports
+import json
+import numpy as np
+import pandas as pd
+
+# Columns of a parsed response, one row per returned location
+RESPONSE_COLUMNS = ['ResultID', 'matched_address', 'location_x', 'location_y', 'score', 'status']
+
+
+
+# --- Request payloads ---
+
+def json_values(values):
+    # Plain Python values for json.dumps: NaN becomes null, and a float column of whole numbers
+    # (e.g. ZIPs or IDs that pandas read as float because of missing values) is sent as integers
+    values = pd.Series(values)
+    if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+        values = values.astype('Int64')
+    return values.astype(object).where(values.notna(), None).tolist()
+
+def payload_attributes(object_ids, **fields):
+    # One attributes dict per record, as the server receives them
+    names = list(fields)
+    columns = [json_values(object_ids)] + [json_values(fields[name]) for name in names]
+    return [dict(zip(["ObjectID"] + names, row)) for row in zip(*columns)]
+
+def build_payload(object_ids, **fields):
+    # fields are address attribute columns, e.g. address=..., city=..., region=..., postal=...
+    records = [{"attributes": attributes} for attributes in payload_attributes(object_ids, **fields)]
+    return json.dumps({"records": records}, separators=(",", ":"))
+
+def build_multi_line_payload(object_ids, address, city, region, postal):
+    return build_payload(object_ids, address=address, city=city, region=region, postal=postal)
+
+def build_single_line_payload(object_ids, single_line):
+    return build_payload(object_ids, SingleLine=single_line)
+
+
+
+# --- Responses ---
+
+def parse_response(response):
+    # One column per field, instead of a tuple per location; coordinates are parsed straight into float arrays
+    locations = response["locations"]
+    attributes = [l.get("attributes", {}) for l in locations]
+    coordinates = [l.get("location") or {} for l in locations]
+    return pd.DataFrame({
+        'ResultID': [a.get("ResultID") for a in attributes],
+        'matched_address': [l.get("address") for l in locations],
+        'location_x': np.array([c.get("x") for c in coordinates], dtype=float),
+        'location_y': np.array([c.get("y") for c in coordinates], dtype=float),
+        'score': [l.get("score") for l in locations],
+        'status': [a.get("Status") for a in attributes],
+    }, columns=RESPONSE_COLUMNS)
@@ -0,0 +1,45 @@
+# Benchmark for adi_table.py: join FIPS codes to ADI ranks the way join_adi.py used to (string table,
+# pandas merge on FIPS) and with the typed table (int64 keys, searchsorted probe, categorical output).
+# Reports the time and the memory of the joined ADI columns; tests/test_adi_table.py checks both give
+# the same values.
+
+# Imports
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from adi_index import ADI_TABLE
+from adi_table import AdiTable
+
+description = "Compare the string ADI merge with the typed ADI table"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-a', '--adi', default=ADI_TABLE, help="ADI CSV")
+parser.add_argument('-n', '--rows', type=int, default=5000000, help="number of joined rows")
+args = parser.parse_args()
+
+strings = pd.read_csv(args.adi).astype(str).rename(columns={'ADI_NATRANK':'ADI_NAT_20', 'ADI_STATERNK':'ADI_ST_20'})
+table = AdiTable.from_csv(args.adi)
+
+# Mostly block groups in the table, some missing (no FIPS) and some unknown to it
+rng = np.random.default_rng(0)
+fips = rng.choice(np.append(strings['FIPS'].values, ['299999999999', np.nan]), args.rows).astype(object)
+df = pd.DataFrame({'location_id': np.arange(args.rows), 'FIPS': fips})
+
+start = time.perf_counter()
+merged = df.merge(strings, on='FIPS', how='left')
+merge_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+probed = table.join(df)
+probe_seconds = time.perf_counter() - start
+
+columns = ['GISJOIN', 'ADI_NAT_20', 'ADI_ST_20']
+
+def megabytes(frame):
+    return frame[columns].memory_usage(index=False, deep=True).sum() / 1e6
+
+print(f"{args.rows} rows, {len(table)} ADI rows")
+print(f"{'':>14} {'seconds':>9} {'ADI columns MB':>15}")
+print(f"{'string merge':>14} {merge_seconds:>9.2f} {megabytes(merged):>15.1f}")
+print(f"{'typed probe':>14} {probe_seconds:>9.2f} {megabytes(probed):>15.1f}")
@@ -0,0 +1,85 @@
+# Benchmark geocode.py throughput against the local stub server at several concurrency levels.
+# With the fault options, it reports how many rows retries and adaptive batching failed to geocode.
+# tests/test_geocode_equivalence.py checks that every way of running geocode.py gives the same output.
+
+# Imports
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+
+import stub_server
+
+description = "Benchmark geocode.py against a local stub geocoder"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-n', '--rows', type=int, default=20000, help="number of synthetic addresses")
+parser.add_argument('-l', '--latency', type=float, default=0.5,
+                    help="seconds the stub waits before answering each batch")
+parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                    help="concurrency levels to compare")
+parser.add_argument('--failRate', type=float, default=0.0, help="fraction of batches answered with HTTP 503")
+parser.add_argument('--errorRate', type=float, default=0.0,
+                    help="fraction of batches answered with an ArcGIS-style error body")
+parser.add_argument('--slowRate', type=float, default=0.0, help="fraction of batches that stall")
+parser.add_argument('--slowLatency', type=float, default=5.0, help="seconds a stalled batch takes")
+parser.add_argument('--maxBatch', type=int, default=None, help="stub rejects batches larger than this")
+parser.add_argument('--timeout', type=float, default=300, help="geocode.py --timeout")
+parser.add_argument('--offline', action='store_true',
+                    help="also time geocode.py --backend offline, which makes no requests at all")
+args = parser.parse_args()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+
+# --- Synthetic input ---
+
+def writeSampleCsv(path, nrow):
+    with open(path, 'w') as f:
+        f.write("location_id,address_1,address_2,city,state,zip\n")
+        for i in range(nrow):
+            f.write(f"{i + 1},{i % 9000 + 100} Main St,,SAINT LOUIS,MO,{63100 + i % 50}\n")
+
+
+
+# --- Run geocode.py at each concurrency level ---
+
+server, url = stub_server.startServer(latency=args.latency, fail_rate=args.failRate, error_rate=args.errorRate,
+                                     slow_rate=args.slowRate, slow_latency=args.slowLatency,
+                                     max_batch=args.maxBatch, seed=0)
+print(f"Stub geocoder at {url} ({args.latency}s per batch)")
+
+with tempfile.TemporaryDirectory() as tmpdir:
+    infile = os.path.join(tmpdir, 'benchAddresses.csv')
+    writeSampleCsv(infile, args.rows)
+
+    print(f"\n{'workers':>8} {'seconds':>10} {'rows/s':>10} {'speedup':>8} {'requests':>9} {'faults':>7} {'missing':>8}")
+    baseline = None
+    for workers in args.workers:
+        server.counts.update(requests=0, failed=0)
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(HERE, 'geocode.py'), infile,
+             '--workers', str(workers), '--url', url, '--outputPath', tmpdir, '--timeout', str(args.timeout)],
+            check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        missing = pd.read_csv(os.path.join(tmpdir, 'GEOCODED_benchAddresses.csv'))['location_x'].isna().sum()
+        print(f"{workers:>8} {elapsed:>10.2f} {args.rows / elapsed:>10.0f} {baseline / elapsed:>7.1f}x "
+              f"{server.counts['requests']:>9} {server.counts['failed']:>7} {missing:>8}")
+
+    # Everything but the geocoder: reading, dedup, journal and output, with the stub's coordinates
+    if args.offline:
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(HERE, 'geocode.py'), infile, '--backend', 'offline', '--outputPath', tmpdir],
+            check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        missing = pd.read_csv(os.path.join(tmpdir, 'GEOCODED_benchAddresses.csv'))['location_x'].isna().sum()
+        print(f"{'offline':>8} {elapsed:>10.2f} {args.rows / elapsed:>10.0f} {baseline / elapsed:>7.1f}x "
+              f"{0:>9} {0:>7} {missing:>8}")
+
+server.shutdown()
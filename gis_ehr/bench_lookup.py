@@ -0,0 +1,107 @@
+# Load test for adi_lookup.py: p50/p99 latency and throughput for single lookups, vectorized
+# lookup_many batches, and the local HTTP service under concurrent clients.
+# Random points are drawn over the index's bounding box, so some fall outside every block group.
+# tests/test_adi_lookup.py checks that lookup, lookup_many and the service agree.
+
+# Imports
+import argparse
+import time
+import numpy as np
+import requests
+import shapely
+from concurrent.futures import ThreadPoolExecutor
+
+from adi_index import INDEX_DIR
+from adi_lookup import AdiLookup, startServer
+
+description = "Load-test FIPS/ADI lookups in-process and through the local service"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-i', '--index', default=INDEX_DIR, help="compiled block group index from adi_index.py")
+parser.add_argument('-n', '--lookups', type=int, default=20000, help="number of single lookups to time")
+parser.add_argument('-b', '--batchSizes', type=int, nargs='+', default=[100, 10000, 1000000],
+                    help="lookup_many batch sizes to time")
+parser.add_argument('-c', '--clients', type=int, nargs='+', default=[1, 4, 16],
+                    help="concurrent HTTP clients to compare")
+parser.add_argument('--httpLookups', type=int, default=4000, help="HTTP lookups per concurrency level")
+args = parser.parse_args()
+
+
+
+# --- Helpers ---
+
+def randomPoints(lookup, n, seed=0):
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = shapely.total_bounds(lookup.index.geometries)
+    return rng.uniform(xmin, xmax, n), rng.uniform(ymin, ymax, n)
+
+def report(label, latencies, calls, points, elapsed):
+    latencies = np.asarray(latencies) * 1000
+    print(f"{label:<28} {np.percentile(latencies, 50):>9.3f} {np.percentile(latencies, 99):>9.3f} "
+          f"{calls / elapsed:>11.0f} {points / elapsed:>12.0f}")
+
+
+
+# --- Load once ---
+
+start = time.perf_counter()
+lookup = AdiLookup(path=args.index)
+print(f"Loaded {len(lookup.index)} block groups in {time.perf_counter() - start:.3f}s")
+
+print(f"\n{'':<28} {'p50 ms':>9} {'p99 ms':>9} {'calls/s':>11} {'points/s':>12}")
+
+
+
+# --- In-process ---
+
+lons, lats = randomPoints(lookup, args.lookups)
+latencies = []
+start = time.perf_counter()
+for lon, lat in zip(lons, lats):
+    t = time.perf_counter()
+    lookup.lookup(lon, lat)
+    latencies.append(time.perf_counter() - t)
+report("lookup", latencies, args.lookups, args.lookups, time.perf_counter() - start)
+
+for batch in args.batchSizes:
+    lons, lats = randomPoints(lookup, batch)
+    calls = max(1, min(200, 1000000 // batch))
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(calls):
+        t = time.perf_counter()
+        lookup.lookup_many(lons, lats)
+        latencies.append(time.perf_counter() - t)
+    report(f"lookup_many ({batch})", latencies, calls, calls * batch, time.perf_counter() - start)
+
+
+
+# --- Local service ---
+
+server, url = startServer(lookup)
+lons, lats = randomPoints(lookup, args.httpLookups)
+for clients in args.clients:
+    sessions = {}
+
+    def get(i):
+        session = sessions.setdefault(i % clients, requests.Session())
+        t = time.perf_counter()
+        session.get(url + "/lookup", params={"lon": lons[i], "lat": lats[i]}).raise_for_status()
+        return time.perf_counter() - t
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(get, range(args.httpLookups)))
+    report(f"HTTP lookup ({clients} clients)", latencies, args.httpLookups, args.httpLookups,
+           time.perf_counter() - start)
+
+batch = 10000
+lons, lats = randomPoints(lookup, batch)
+latencies = []
+start = time.perf_counter()
+with requests.Session() as session:
+    for _ in range(20):
+        t = time.perf_counter()
+        session.post(url + "/lookup_many", json={"lon": lons.tolist(), "lat": lats.tolist()}).raise_for_status()
+        latencies.append(time.perf_counter() - t)
+report(f"HTTP lookup_many ({batch})", latencies, 20, 20 * batch, time.perf_counter() - start)
+server.shutdown()
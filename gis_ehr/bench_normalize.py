@@ -0,0 +1,55 @@
+# Time combine_address against combine_address_vectorized on random rows.
+# tests/test_address_normalize.py checks that the two agree.
+
+# Imports
+import argparse
+import random
+import time
+import numpy as np
+import pandas as pd
+
+from address_normalize import combine_address, combine_address_vectorized
+
+description = "Compare row-wise and vectorized address combining"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-n', '--rows', type=int, default=1000000, help="number of synthetic rows to time")
+args = parser.parse_args()
+
+
+
+# --- Random rows ---
+
+random.seed(0)
+streets = ["Main St", "S Euclid Ave", "Forsyth Blvd", "N 4th St", "Pennsylvania Avenue NW"]
+seconds = ["Apt 2", "Unit 5", "#3", "Suite 100", "2nd Floor", "1 Brookings Dr"]
+
+def randomAddress1():
+    r = random.random()
+    if r < 0.05:
+        return np.nan
+    return f"{random.randint(1, 9999)} {random.choice(streets)}" + (" " if r < 0.1 else "")
+
+def randomAddress2(add1):
+    r = random.random()
+    if r < 0.7:
+        return np.nan
+    if r < 0.75 and isinstance(add1, str):
+        return add1.strip()
+    if r < 0.8 and isinstance(add1, str):
+        return add1 + " " + random.choice(seconds)
+    return random.choice(seconds)
+
+rows = [randomAddress1() for i in range(args.rows)]
+df = pd.DataFrame({'address_1': rows, 'address_2': [randomAddress2(a) for a in rows]})
+
+start = time.perf_counter()
+rowwise = df.apply(lambda row: combine_address(row['address_1'], row['address_2']), axis=1)
+rowwise_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+vectorized = combine_address_vectorized(df['address_1'], df['address_2'])
+vectorized_seconds = time.perf_counter() - start
+
+print(f"{args.rows} random rows")
+print(f"row-wise apply: {rowwise_seconds:.2f}s")
+print(f"vectorized:     {vectorized_seconds:.2f}s ({rowwise_seconds / vectorized_seconds:.1f}x faster)")
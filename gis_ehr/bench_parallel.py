@@ -0,0 +1,39 @@
+# Scaling benchmark for parallel_join.py: locate the same points with 1, 2, 4, ... worker processes
+# and report the speedup. tests/test_parallel_join.py checks the result matches the serial one.
+# Speedup is bounded by the number of CPU cores; it is printed first.
+
+# Imports
+import argparse
+import os
+import time
+import numpy as np
+import shapely
+
+from adi_index import INDEX_DIR, BlockGroupIndex
+from parallel_join import locate_parallel
+
+description = "Time parallel point-in-polygon joins at several worker counts"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-i', '--index', default=INDEX_DIR, help="compiled block group index from adi_index.py")
+parser.add_argument('-n', '--points', type=int, default=10000000, help="number of points to join")
+parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 2, 4, 8], help="worker counts to compare")
+args = parser.parse_args()
+
+index = BlockGroupIndex.load(args.index)
+rng = np.random.default_rng(0)
+xmin, ymin, xmax, ymax = shapely.total_bounds(index.geometries)
+x = rng.uniform(xmin, xmax, args.points)
+y = rng.uniform(ymin, ymax, args.points)
+print(f"{os.cpu_count()} CPU cores; {args.points} points; grid engine: {index.engine is not None}")
+
+start = time.perf_counter()
+index.locate_serial(x, y)
+serial = time.perf_counter() - start
+
+print(f"\n{'workers':>8} {'seconds':>9} {'points/s':>12} {'speedup':>8}")
+print(f"{'serial':>8} {serial:>9.2f} {args.points / serial:>12.0f} {1:>7.1f}x")
+for workers in args.workers:
+    start = time.perf_counter()
+    locate_parallel(index, x, y, workers)
+    elapsed = time.perf_counter() - start
+    print(f"{workers:>8} {elapsed:>9.2f} {args.points / elapsed:>12.0f} {serial / elapsed:>7.1f}x")
@@ -0,0 +1,82 @@
+# Micro-benchmark: cost to build and parse one 1000-record geocodeAddresses batch,
+# comparing the original iterrows/str() helpers with arcgis_payload.py.
+# tests/test_arcgis_payload.py checks that both send and read back the same records.
+
+# Imports
+import argparse
+import json
+import timeit
+import pandas as pd
+
+from arcgis_payload import build_multi_line_payload, parse_response
+
+description = "Compare request build and response parse cost per batch"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-n', '--batchSize', type=int, default=1000, help="records per batch")
+parser.add_argument('-r', '--repeat', type=int, default=20, help="timing repetitions")
+args = parser.parse_args()
+
+
+
+# --- Original helpers, as they were in geocode.py ---
+
+def formatRecordsOld(data):
+    records = []
+    for index, row in data.iterrows():
+        attributes = dict({"ObjectID" : row["location_id"],
+                           "address" : row["street_address"],
+                           "city" : row["givenCity"],
+                           "region" : row["givenState"],
+                           "postal" : row["givenZip"]})
+        records.append(dict({"attributes": attributes}))
+    return str(dict({"records" : records}))
+
+def parsePostResponseOld(response):
+    locations = response["locations"]
+    d = []
+    for l in locations:
+        location_id = l["attributes"].get("ResultID", None)
+        address = l.get("address", None)
+        location_x = l.get("location", {}).get("x", None)
+        location_y = l.get("location", {}).get("y", None)
+        score = l.get("score", None)
+        status = l["attributes"].get("Status", None)
+        d.append((location_id, address, location_x, location_y, score, status))
+    return pd.DataFrame(d, columns=['location_id', 'matched_address', 'location_x', 'location_y', 'score', 'status'])
+
+def formatRecordsNew(data):
+    return build_multi_line_payload(data["location_id"], data["street_address"],
+                                    data["givenCity"], data["givenState"], data["givenZip"])
+
+
+
+# --- Synthetic batch and response ---
+
+batch = pd.DataFrame({
+    'location_id': range(1, args.batchSize + 1),
+    'street_address': [f"{i} Main St" for i in range(args.batchSize)],
+    'givenCity': 'SAINT LOUIS',
+    'givenState': 'MO',
+    'givenZip': 63110,
+})
+response = json.loads(json.dumps({"locations": [
+    {"address": f"{i} Main St, Saint Louis, Missouri, 63110",
+     "location": {"x": -90.2 + i * 1e-5, "y": 38.6 + i * 1e-5},
+     "score": 100,
+     "attributes": {"ResultID": i + 1, "Status": "M"}}
+    for i in range(args.batchSize)]}))
+
+def perBatch(f):
+    return min(timeit.repeat(f, number=1, repeat=args.repeat)) * 1000
+
+timings = [
+    ("build: iterrows + str()", perBatch(lambda: formatRecordsOld(batch))),
+    ("build: columnar json.dumps", perBatch(lambda: formatRecordsNew(batch))),
+    ("parse: tuple list", perBatch(lambda: parsePostResponseOld(response))),
+    ("parse: typed columns", perBatch(lambda: parse_response(response))),
+]
+
+print(f"Milliseconds per {args.batchSize}-record batch (best of {args.repeat}):")
+for label, ms in timings:
+    print(f"  {label:<28} {ms:8.2f}")
+print(f"Payload size: str() {len(formatRecordsOld(batch))} bytes, JSON {len(formatRecordsNew(batch))} bytes")
@@ -0,0 +1,84 @@
+# Benchmark the point-in-polygon engines against gpd.sjoin(predicate='within') at several input sizes
+# (tests/test_pip_engine.py checks that they find exactly the same (point, block group) pairs):
+#   sjoin    - geopandas, as join_adi.py originally did it
+#   strtree  - shapely STRtree candidates + contains_xy on prepared polygons (adi_index.py without a grid)
+#   grid     - the NumPy grid engine (pip_engine.py), with the STRtree for points right at a boundary
+# Points are drawn over the index's bounding box, plus a share placed exactly on polygon vertices and
+# edge midpoints, the slow path for the grid.
+
+# Imports
+import argparse
+import time
+import numpy as np
+import shapely
+
+from adi_index import INDEX_DIR, BlockGroupIndex
+from pip_engine import GridEngine, polygon_edges
+
+description = "Compare point-in-polygon engines against gpd.sjoin"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-i', '--index', default=INDEX_DIR, help="compiled block group index from adi_index.py")
+parser.add_argument('-n', '--sizes', type=int, nargs='+', default=[10000, 1000000, 10000000],
+                    help="numbers of points to join")
+parser.add_argument('--sjoinMax', type=int, default=1000000, help="skip sjoin above this many points (it's slow)")
+args = parser.parse_args()
+
+
+
+# --- Engines ---
+
+index = BlockGroupIndex.load(args.index, engine=False)
+start = time.perf_counter()
+engine = GridEngine.build(index.geometries)
+print(f"{len(index)} block groups; grid engine built in {time.perf_counter() - start:.2f}s "
+      f"({engine.shape[1]}x{engine.shape[0]} cells, {len(engine.cell_edges)} bucketed edges)")
+
+def sjoin(x, y):
+    import geopandas as gpd
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y))
+    polygons = gpd.GeoDataFrame(geometry=index.geometries)
+    joined = gpd.sjoin(points, polygons, how='inner', predicate='within')
+    order = np.lexsort((joined['index_right'].values, joined.index.values))
+    return joined.index.values[order], joined['index_right'].values[order]
+
+engines = {
+    'sjoin': sjoin,
+    'strtree': index.locate_exact,
+    'grid': lambda x, y: engine.locate(x, y, exact=index.locate_exact),
+}
+
+
+
+# --- Points ---
+
+def samplePoints(n, seed=0):
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = shapely.total_bounds(index.geometries)
+    x = rng.uniform(xmin, xmax, n)
+    y = rng.uniform(ymin, ymax, n)
+    # 1% exactly on vertices and 1% on edge midpoints
+    x0, y0, x1, y1, _ = polygon_edges(index.geometries)
+    k = n // 100
+    vertices = rng.integers(0, len(x0), k)
+    x[:k], y[:k] = x0[vertices], y0[vertices]
+    midpoints = rng.integers(0, len(x0), k)
+    x[k:2 * k] = (x0[midpoints] + x1[midpoints]) / 2
+    y[k:2 * k] = (y0[midpoints] + y1[midpoints]) / 2
+    return x, y
+
+
+
+# --- Run ---
+
+print(f"\n{'points':>10} {'engine':>8} {'seconds':>9} {'points/s':>12} {'speedup':>8}")
+for n in args.sizes:
+    x, y = samplePoints(n)
+    baseline = None
+    for name, locate in engines.items():
+        if name == 'sjoin' and n > args.sjoinMax:
+            continue
+        start = time.perf_counter()
+        locate(x, y)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{n:>10} {name:>8} {elapsed:>9.2f} {n / elapsed:>12.0f} {baseline / elapsed:>7.1f}x")
@@ -0,0 +1,89 @@
+# Benchmark how long each gis_ehr CLI takes to start: `--help` wall time, plus what `python -X importtime`
+# says it imported on the way. `--help` and argument errors should not need pandas, pyarrow, shapely,
+# geopandas or the plotting libraries, so those are listed when a CLI pulls them in anyway.
+# --save writes the numbers to a JSON file, and --compare prints them next to an earlier --save.
+
+# Imports
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CLIS = ['geocode.py', 'join_adi.py', 'plot_adi.py', 'pipeline.py', 'adi_index.py', 'state_registry.py',
+        'adi_lookup.py']
+HEAVY_MODULES = ['numpy', 'pandas', 'pyarrow', 'shapely', 'geopandas', 'requests', 'plotly', 'matplotlib']
+
+description = "Benchmark --help startup time and imports of each gis_ehr CLI"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-c', '--clis', nargs='+', default=CLIS, help="scripts to time")
+parser.add_argument('-r', '--repeat', type=int, default=5, help="runs per CLI (the median is reported)")
+parser.add_argument('--save', default=None, help="write the results to this JSON file")
+parser.add_argument('--compare', default=None, help="JSON file from an earlier --save to compare against")
+args = parser.parse_args()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+
+# --- Measure ---
+
+def wall_seconds(cli):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(HERE, cli), '--help'], cwd=HERE,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def import_times(cli):
+    # Returns ({top-level import: cumulative microseconds}, every module imported, error or None).
+    # Nested imports are folded into the import that triggered them
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(HERE, cli), '--help'],
+                            cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    top_level, imported, other = {}, set(), []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            other.append(line)
+            continue
+        if 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported.add(name.strip().split('.')[0])
+        if not name[1:].startswith(' '):
+            top_level[name.strip()] = int(cumulative)
+    error = other[-1] if result.returncode != 0 and other else None
+    return top_level, imported, error
+
+def measure(cli):
+    top_level, imported, error = import_times(cli)
+    return {
+        'wall_seconds': statistics.median(wall_seconds(cli) for _ in range(args.repeat)),
+        'import_seconds': sum(top_level.values()) / 1e6,
+        'heavy': [m for m in HEAVY_MODULES if m in imported],
+        'slowest': sorted(top_level, key=top_level.get, reverse=True)[:3],
+        'error': error,
+    }
+
+
+
+# --- Report ---
+
+previous = {}
+if args.compare:
+    with open(args.compare) as f:
+        previous = json.load(f)
+
+results = {}
+print(f"{'cli':<18} {'--help s':>9} {'before':>8} {'imports s':>10}  heavy imports")
+for cli in args.clis:
+    results[cli] = measure(cli)
+    before = previous.get(cli, {}).get('wall_seconds')
+    print(f"{cli:<18} {results[cli]['wall_seconds']:>9.3f} {'' if before is None else f'{before:.3f}':>8} "
+          f"{results[cli]['import_seconds']:>10.3f}  {', '.join(results[cli]['heavy']) or '-'}")
+    if results[cli]['error']:
+        print(f"{'':<18} failed: {results[cli]['error']}")
+
+if args.save:
+    with open(args.save, 'w') as f:
+        json.dump(results, f, indent=2)
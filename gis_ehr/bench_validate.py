@@ -0,0 +1,55 @@
+# Time is_input_valid_result_address against validate_addresses on random rows.
+# tests/test_address_validate.py checks that the two keep and drop the same rows.
+
+# Imports
+import argparse
+import random
+import time
+import pandas as pd
+
+from address_validate import REJECT_REASONS, is_input_valid_result_address, validate_addresses
+
+description = "Compare row-wise and vectorized address validation"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('-n', '--rows', type=int, default=200000, help="number of synthetic rows to time")
+args = parser.parse_args()
+
+
+
+# --- Random rows ---
+
+random.seed(0)
+streets = ["Main St", "S Euclid Ave", "Forsyth Blvd", "N 4th St"]
+second_lines = ["", "", "", "Apt 2", "N/A", "UNKNOWN", "Unit 5"]
+states = ["MISSOURI", "Illinois", "KANSAS", "MO", "HAWAII", "new york", "", "N/A"]
+
+def randomAddress1():
+    r = random.random()
+    if r < 0.05:
+        return random.choice(["", "NA", "n/a"])
+    if r < 0.08:
+        return random.choice(["UNKNOWN", "Address Unknown", "NEEDS UPDATE"])
+    if r < 0.12:
+        return f"PO Box {random.randint(1, 9999)}"
+    return f"{random.randint(1, 9999)} {random.choice(streets)}"
+
+data = pd.DataFrame({
+    "ADD_LINE_1": [randomAddress1() for i in range(args.rows)],
+    "ADD_LINE_2": [random.choice(second_lines) for i in range(args.rows)],
+    "CITY": "St Louis",
+    "STATE": [random.choice(states) for i in range(args.rows)],
+    "ZIP": "63110",
+})
+
+start = time.perf_counter()
+rowwise = data.apply(is_input_valid_result_address, axis=1)
+rowwise_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+keep, reason = validate_addresses(data)
+vectorized_seconds = time.perf_counter() - start
+
+print(f"{args.rows} random rows ({keep.sum()} kept)")
+print(reason.value_counts().reindex(REJECT_REASONS).to_string())
+print(f"row-wise apply: {rowwise_seconds:.2f}s")
+print(f"vectorized:     {vectorized_seconds:.2f}s ({rowwise_seconds / vectorized_seconds:.1f}x faster)")
@@ -0,0 +1,21 @@
+# Default paths and option values shared by the gis_ehr scripts. This imports nothing, so a CLI can build
+# its argument parser (and answer --help or reject a bad argument) before loading pandas, pyarrow,
+# shapely or the plotting libraries; those are imported by the code paths that use them.
+
+# The WUSTL I2 ArcGIS geocodeAddresses endpoint
+ARCGIS_URL = "https://10.25.44.136:6443/arcgis/rest/services/USA/GeocodeServer/geocodeAddresses"
+
+# Per-state block group and ADI files (see state_registry.py)
+RESOURCES = 'resources'
+
+# The single-state Missouri sources, and where adi_index.py compiles them
+SHAPEFILE = 'resources/tl_2020_29_bg20.shp'
+ADI_TABLE = 'resources/MO_2020_ADI_Census_Block_Group_v4_0_1.csv'
+INDEX_DIR = 'resources/compiled/tl_2020_29_bg20'
+
+# Table formats by file extension (see table_io.py)
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.feather': 'feather'}
+
+# Larger geographies a block group GEOID determines, by the length of their GEOID prefix:
+# state (2 digits) + county (3) + tract (6) + block group (1)
+GEOGRAPHY_LEVELS = {'TRACT': 11, 'COUNTY': 5, 'STATE': 2}
@@ -2,11 +2,17 @@
 # This code is adapted from Abigail's script
 
 # Imports
-import pandas as pd
+# pandas, requests and the modules built on them are imported by the functions that use them,
+# so --help and a bad path return without loading them
 import argparse
 import os
 import math
-import requests
+import glob
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from geocode_cache import GeocodeCache
+from defaults import ARCGIS_URL, FORMATS
 
 # --- Load in address table ---
 
@@ -16,135 +22,372 @@ import requests
 
 description = "Geocode addresses using I2 ArcGIS server"
 parser = argparse.ArgumentParser(description=description)
-parser.add_argument('infile', help="path to input CSV")
-args = parser.parse_args()
+parser.add_argument('infile', help="path to input CSV, Parquet or Feather file")
+parser.add_argument('-w', '--workers', type=int, default=1,
+                    help="number of batches to keep in flight at once (default: 1, serial)")
+parser.add_argument('-b', '--backend', default='arcgis', choices=['arcgis', 'offline'],
+                    help="geocoder to use (see geocoder_backends.py); offline needs no network")
+parser.add_argument('-u', '--url', default=ARCGIS_URL,
+                    help="geocodeAddresses endpoint for the arcgis backend (e.g. a local stub_server.py)")
+parser.add_argument('--reference', default=None,
+                    help="street address range table for the offline backend "
+                         "(without one, it returns stub_server.py's fake coordinates)")
+parser.add_argument('-o', '--outputPath', default='results',
+                    help="directory to store output")
+parser.add_argument('-f', '--format', default=None, choices=sorted(FORMATS.values()),
+                    help="output format (default: the input's)")
+parser.add_argument('-c', '--cache', default=None,
+                    help="path to a SQLite geocode cache; cached addresses are not sent to the server")
+parser.add_argument('--cacheTTL', type=float, default=90,
+                    help="days before a cached geocode is refreshed (default: 90)")
+parser.add_argument('--cacheMaxEntries', type=int, default=None,
+                    help="keep at most this many cached addresses, dropping the least recently used")
+parser.add_argument('-r', '--resume', action='store_true',
+                    help="resume an interrupted run, skipping batches already saved in its journal")
+parser.add_argument('-s', '--stream', action='store_true',
+                    help="read, geocode and write the input one batch at a time, to keep memory flat")
+parser.add_argument('--timeout', type=float, default=300,
+                    help="seconds to wait for the server to answer one batch (default: 300)")
+parser.add_argument('--retries', type=int, default=5,
+                    help="times to retry a failed batch, with jittered exponential backoff (default: 5)")
+parser.add_argument('--minBatch', type=int, default=50,
+                    help="smallest batch size to shrink to when the server is slow or failing (default: 50)")
 
-if not os.path.exists(args.infile) or not os.path.isfile(args.infile):
-    print("ERROR: infile not found: " + args.infile)
-    exit(1)
+def checkInput(options):
+    if options.workers < 1:
+        print("ERROR: --workers must be at least 1")
+        exit(1)
 
-df = pd.read_csv(args.infile)
+    if not os.path.exists(options.infile) or not os.path.isfile(options.infile):
+        print("ERROR: infile not found: " + options.infile)
+        exit(1)
 
-if df is None:
-    print("ERROR: df is type None.")
-    exit(1)
+    # Check the header before reading any rows
+    from table_io import table_columns
+    header = table_columns(options.infile)
 
-required_columns = ['location_id', 'address_1', 'address_2', 'city', 'state', 'zip']
-missing_columns = [col for col in required_columns if col not in df.columns]
-if missing_columns:
-    print(f"ERROR: missing columns: {missing_columns}")
-    exit(1)
-    
-df.rename(columns={
-    'city': 'givenCity', 
-    'state': 'givenState', 
-    'zip': 'givenZip'}, inplace=True)
-
-# The ArcGIS server has a batch limit of 1000 addresses
-ADDRESSES_PER_BATCH = 1000 
-NROW = df.shape[0]
-BATCH_NUMS = math.ceil(NROW / ADDRESSES_PER_BATCH)
-global_geocodes = []
-
-print(f"There are {NROW} rows")
-print(f"These will be processed in {BATCH_NUMS} batches.")
-
-# --- Helper: manually parse combining address_1 and address_2 --- 
-
-def combine_address(add1, add2):
-    # Evaluate none-types
-    if pd.isna(add1) and pd.isna(add2):
-        return ""
-    elif pd.isna(add1):
-        return add2
-    elif pd.isna(add2):
-        return add1
-    # Evaluate equality and substrings
-    add1, add2 = add1.strip(), add2.strip()
-    if add1 == add2:
-        return add1
-    elif add1 in add2:
-        return add2
-    elif add2 in add1:
-        return add1
-    # If add2 starts with a digit, put it first
-    if add2 and add2[0].isdigit():
-        return add2 + " " + add1
-    # Default: add1 + add2
-    return add1 + " " + add2
+    required_columns = ['location_id', 'address_1', 'address_2', 'city', 'state', 'zip']
+    missing_columns = [col for col in required_columns if col not in header]
+    if missing_columns:
+        print(f"ERROR: missing columns: {missing_columns}")
+        exit(1)
+
+def renameColumns(data):
+    return data.rename(columns={
+        'city': 'givenCity', 
+        'state': 'givenState', 
+        'zip': 'givenZip'})
+
+# Set by setup(), for the helpers below
+args = None
+OUTFILE = None
+JOURNAL_DIR = None
+batch_size = None
+backend = None
+cache = None
+
+def setup(options):
+    # Output path, geocoder backend and cache for one run with these options
+    global args, OUTFILE, JOURNAL_DIR, batch_size, backend, cache
+    from geocoder_backends import make_backend
+    from table_io import with_format
+    args = options
+    OUTFILE = with_format(os.path.join(args.outputPath, 'GEOCODED_' + os.path.basename(args.infile)), args.format)
+    JOURNAL_DIR = OUTFILE + '.parts'
+    if not os.path.exists(args.outputPath):
+        os.makedirs(args.outputPath)
+    backend = make_backend(args.backend, args.url, args.reference, args.timeout, args.retries, args.workers, args.minBatch)
+    # Batches are at most the backend's limit, and shrink below it while the server is slow or failing
+    batch_size = backend.batch_size
+    if args.workers > backend.concurrency_limit:
+        print(f"The {args.backend} backend takes at most {backend.concurrency_limit} batches at once; "
+              f"using --workers {backend.concurrency_limit}")
+        args.workers = backend.concurrency_limit
+    cache = None
+    if args.cache:
+        # Keyed by the backend's source (endpoint or reference table), so geocoders never share results
+        cache = GeocodeCache(args.cache, backend.source, ttl_days=args.cacheTTL, max_entries=args.cacheMaxEntries)
+
+def teardown():
+    backend.close()
+    if args.cache:
+        cache.evict()
+        cache.close()
+
+
+
+# --- Checkpoint journal ---
+# Every finished batch is saved as its own part file, so a crash only loses the batches in flight.
+# The journal is removed once the final CSV has been written.
+
+RESULT_COLUMNS = ['location_id', 'matched_address', 'location_x', 'location_y', 'score', 'status']
+
+def writeJournalPart(part, geocoding_results, prefix="batch"):
+    # Write to a temporary file first, so a part file is either complete or absent
+    path = os.path.join(JOURNAL_DIR, f"{prefix}_{part:06d}.csv")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        geocoding_results.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def readJournal():
+    # Returns (results saved by the previous run, next free part number)
+    import pandas as pd
+    paths = sorted(glob.glob(os.path.join(JOURNAL_DIR, "batch_*.csv")))
+    if not paths:
+        return emptyResults(), 0
+    results = pd.concat([readJournalPart(p) for p in paths], ignore_index=True)
+    last_part = int(os.path.basename(paths[-1])[len("batch_"):-len(".csv")])
+    return results, last_part + 1
+
+def readJournalPart(path):
+    import pandas as pd
+    return pd.read_csv(path, float_precision='round_trip')
+
+def resetJournal():
+    if os.path.isdir(JOURNAL_DIR):
+        shutil.rmtree(JOURNAL_DIR)
+    os.makedirs(JOURNAL_DIR)
 
 
 
 # --- Geocoding helper functions ---
+# Each batch goes to the backend as records (see geocoder_backends.py); results are DataFrames with RESULT_COLUMNS.
+
 def formatRecords(data):
-    records = []
-    for index, row in data.iterrows():
-        attributes = dict({"ObjectID" : row["location_id"], 
-                           "address" : row["street_address"], 
-                           "city" : row["givenCity"], 
-                           "region" : row["givenState"], 
-                           "postal" : row["givenZip"]})
-        records.append(dict({"attributes": attributes}))
-    return dict({"records" : records})
-
-def sendPostRequest(records):
-    url = "https://10.25.44.136:6443/arcgis/rest/services/USA/GeocodeServer/geocodeAddresses"
-    params = {"f" : "pjson", "addresses" : str(records)}
-    result = requests.post(url, data = params, verify = False)
-    return result.json()
-
-def parsePostResponse(response):
-    locations = response["locations"]
-    d = []
-    for l in locations:
-        location_id = l["attributes"].get("ResultID", None)
-        address = l.get("address", None)
-        location_x = l.get("location", {}).get("x", None)
-        location_y = l.get("location", {}).get("y", None)
-        score = l.get("score", None)
-        status = l["attributes"].get("Status", None)
-        d.append((location_id, address, location_x, location_y, score, status))
-    return d
-
-def driver(i): 
-    global global_geocodes
+    from geocoder_backends import multi_line_records
+    return multi_line_records(data["location_id"], data["street_address"], 
+                              data["givenCity"], data["givenState"], data["givenZip"])
 
-    # Define the batch
-    startBatch = i * ADDRESSES_PER_BATCH
-    endBatch = min(NROW, startBatch + ADDRESSES_PER_BATCH)
-    data_batch = df[startBatch:endBatch]
-    print("\n\nBatch:", startBatch + 1, "-", endBatch, "of", NROW)
-    
-    # Geocode the batch
-    print("Formatting records...")
+def parseResults(results):
+    return results.rename(columns={'ResultID': 'location_id'})
+
+def emptyResults():
+    import pandas as pd
+    return pd.DataFrame(columns=RESULT_COLUMNS)
+
+def geocodeBatch(data_batch):
+    # Batches bigger than the current adaptive size are split; a batch that keeps failing is split in half,
+    # unless the server rejected the request itself
+    from geocode_client import GeocodeError, RequestRejected
+    nrow = data_batch.shape[0]
+    if nrow == 0:
+        return emptyResults()
+    size = batch_size.size
+    if nrow > size:
+        return concatResults([geocodeBatch(data_batch[i:i + size]) for i in range(0, nrow, size)])
     records = formatRecords(data_batch)
-    print("Sending request...")
-    response = sendPostRequest(records)
+    try:
+        results = backend.geocode_batch(records)
+    except RequestRejected:
+        raise
+    except GeocodeError:
+        if nrow <= batch_size.min_size:
+            raise
+        half = math.ceil(nrow / 2)
+        print(f"Splitting a failed batch of {nrow} addresses")
+        return concatResults([geocodeBatch(data_batch[:half]), geocodeBatch(data_batch[half:])])
     del(records)
-    print("Parsing request...")
-    geocoding_results = parsePostResponse(response)
-    del(response)
+    return parseResults(results)
+
+
+
+# --- Dedup and cache ---
+# Many location_ids share a physical address. Each unique (normalized) address is geocoded once,
+# using its first location_id as the ObjectID, and the result is fanned back out to every row.
+
+def dedupAddresses(data):
+    # Returns (address key of every row, first row of each unique address, key of each of those location_ids)
+    import pandas as pd
+    from address_normalize import address_keys
+    keys = pd.Series(address_keys(data['street_address'], data['givenCity'], data['givenState'], data['givenZip']), 
+                     index=data.index)
+    unique = data[~keys.duplicated()]
+    key_by_location = dict(zip(unique['location_id'], keys[unique.index]))
+    return keys, unique, key_by_location
+
+def lookupCache(unique, key_by_location):
+    # Returns (cached results, unique rows still to geocode)
+    import pandas as pd
+    if not args.cache:
+        return emptyResults(), unique
+    unique_keys = [key_by_location[location_id] for location_id in unique['location_id']]
+    cached = cache.get_many(unique_keys)
+    is_cached = [key in cached for key in unique_keys]
+    cached_results = pd.DataFrame(
+        [(location_id,) + cached[key] for location_id, key in zip(unique['location_id'], unique_keys) if key in cached],
+        columns=RESULT_COLUMNS)
+    pending = unique[[not c for c in is_cached]]
+    return cached_results, pending
+
+def cacheResults(geocoding_results, key_by_location):
+    if args.cache and geocoding_results.shape[0] > 0:
+        values = geocoding_results.astype(object).where(geocoding_results.notna(), None)
+        cache.put_many((key_by_location[r[0]], r[1:]) for r in values.itertuples(index=False, name=None))
+
+def fanOut(data, keys, geocoding_results, key_by_location):
+    # Attach each unique address's result to every row that shares it, in input order
+    import pandas as pd
+    results = geocoding_results.copy()
+    results.index = results['location_id'].map(key_by_location)
+    results = results.drop(columns='location_id')
+    results = results[~results.index.duplicated()]
+    geocoded = results.reindex(keys.to_numpy())
+    return pd.concat([data.reset_index(drop=True), geocoded.reset_index(drop=True)], axis=1)
+
+def concatResults(frames):
+    import pandas as pd
+    frames = [f for f in frames if f.shape[0] > 0]
+    return pd.concat(frames, ignore_index=True) if frames else emptyResults()
+
+def dedupSummary(nrow, nunique):
+    ratio = nrow / nunique if nunique else 1
+    return f"{nunique} unique addresses in {nrow} rows (dedup ratio {ratio:.2f})"
+
+def driver(pending, part, startBatch, endBatch): 
+    # Define the batch
+    data_batch = pending[startBatch:endBatch]
+    print("\n\nBatch:", startBatch + 1, "-", endBatch, "of", pending.shape[0])
     
-    # Save results
-    if len(global_geocodes) == 0:
-        global_geocodes = geocoding_results
-    else:
-        global_geocodes = global_geocodes + geocoding_results
+    # Geocode the batch
+    geocoding_results = geocodeBatch(data_batch)
+    writeJournalPart(part, geocoding_results)
+    print("Finished batch:", startBatch + 1, "-", endBatch)
+    return geocoding_results
+
+
+
+# --- Streaming mode ---
+# Reads the input one batch-sized chunk at a time, and appends each chunk's merged rows 
+# to the output as soon as it (and every chunk before it) is done. 
+# At most --workers chunks are held in memory, no matter how large the input is.
+# The journal holds one part file per input chunk, so --resume can skip whole chunks.
+
+def streamChunk(i, chunk_pending, cached_results):
+    # Returns (results of every unique address in the chunk, results that are new to the cache)
+    path = os.path.join(JOURNAL_DIR, f"chunk_{i:06d}.csv")
+    if args.resume and os.path.exists(path):
+        return readJournalPart(path), emptyResults()
+    new_results = geocodeBatch(chunk_pending)
+    geocoding_results = concatResults([cached_results, new_results])
+    writeJournalPart(i, geocoding_results, prefix="chunk")
+    print("Finished chunk", i + 1)
+    return geocoding_results, new_results
+
+def writeChunk(writer, chunk, keys, key_by_location, future):
+    geocoding_results, new_results = future.result()
+    cacheResults(new_results, key_by_location)
+    writer.write(fanOut(chunk, keys, geocoding_results, key_by_location))
+
+def runStream():
+    from address_normalize import combine_address_vectorized
+    from table_io import TableWriter, iter_table
+    if not args.resume:
+        resetJournal()
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+
+    nunique = 0
+    in_flight = deque()
+    reader = iter_table(args.infile, batch_size.max_size)
+    writer = TableWriter(OUTFILE)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for i, chunk in enumerate(reader):
+            chunk = renameColumns(chunk)
+            chunk['street_address'] = combine_address_vectorized(chunk['address_1'], chunk['address_2'])
+            keys, unique, key_by_location = dedupAddresses(chunk)
+            nunique += unique.shape[0]
+            cached_results, chunk_pending = lookupCache(unique, key_by_location)
+            future = executor.submit(streamChunk, i, chunk_pending, cached_results)
+            in_flight.append((chunk, keys, key_by_location, future))
+
+            # Write finished chunks in input order, keeping at most --workers chunks in flight
+            while len(in_flight) >= args.workers:
+                writeChunk(writer, *in_flight.popleft())
+        while in_flight:
+            writeChunk(writer, *in_flight.popleft())
+    writer.close()
+    print(f"Wrote {writer.rows} rows to {OUTFILE}")
+    print(dedupSummary(writer.rows, nunique))
 
 
 
 # --- Call all functions ---
-df['street_address'] = df.apply(lambda row: combine_address(row['address_1'], row['address_2']), axis=1)
 
-for i in range(0, BATCH_NUMS):
-    driver(i)
+def geocodeTable(df):
+    # Geocodes an input table (location_id, address_1, address_2, city, state, zip) in memory,
+    # after setup(); returns it with the geocoded columns added, in input order
+    from address_normalize import combine_address_vectorized
+    df = renameColumns(df)
+    print(f"There are {df.shape[0]} rows")
+
+    df['street_address'] = combine_address_vectorized(df['address_1'], df['address_2'])
+
+    # Look up every unique address in the cache; only the misses are sent to the server
+    keys, unique, key_by_location = dedupAddresses(df)
+    print(dedupSummary(df.shape[0], unique.shape[0]))
+    cached_results, pending = lookupCache(unique, key_by_location)
+    geocodes = [cached_results]
+    if args.cache:
+        print(cache.summary())
+
+    # Batches saved by an interrupted run are read back instead of being sent again
+    if args.resume and os.path.isdir(JOURNAL_DIR):
+        journal_results, first_part = readJournal()
+        journal_results = journal_results[journal_results['location_id'].isin(pending['location_id'])]
+        pending = pending[~pending['location_id'].isin(journal_results['location_id'])]
+        print(f"Resuming: {journal_results.shape[0]} addresses already geocoded in {JOURNAL_DIR}")
+    else:
+        resetJournal()
+        journal_results, first_part = emptyResults(), 0
+
+    nrow = pending.shape[0]
+    print(f"{nrow} addresses will be processed in batches of up to {batch_size.max_size}, {args.workers} at a time.")
+
+    def saveResults(geocoding_results):
+        geocodes.append(geocoding_results)
+        cacheResults(geocoding_results, key_by_location)
+
+    saveResults(journal_results)
+
+    # Up to --workers batches are in flight at once. Each new batch takes the current adaptive batch size.
+    # Results can finish in any order; fanOut puts the output rows back in input order.
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        startBatch = 0
+        part = first_part
+        in_flight = set()
+        while startBatch < nrow or in_flight:
+            while startBatch < nrow and len(in_flight) < args.workers:
+                endBatch = min(nrow, startBatch + batch_size.size)
+                in_flight.add(executor.submit(driver, pending, part, startBatch, endBatch))
+                startBatch, part = endBatch, part + 1
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                saveResults(future.result())
+
+    return fanOut(df, keys, concatResults(geocodes), key_by_location)
+
+def main(argv=None):
+    options = parser.parse_args(argv)
+    checkInput(options)
+    from table_io import read_table, write_table
+    setup(options)
+
+    if args.stream:
+        runStream()
+        if args.cache:
+            print(cache.summary())
+        teardown()
+        shutil.rmtree(JOURNAL_DIR)
+        return
+
+    merged_df = geocodeTable(read_table(args.infile))
+    teardown()
+    write_table(merged_df, OUTFILE)
+    shutil.rmtree(JOURNAL_DIR)
 
-geocoded_df = pd.DataFrame(global_geocodes,
-    columns=['location_id', 'matched_address', 'location_x', 'location_y', 'score', 'status']
-)
 
-merged_df = pd.merge(df, geocoded_df, on='location_id', how='left')
 
-merged_df.to_csv(
-    'results/GEOCODED_' + os.path.basename(args.infile), 
-    index = False)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# On-disk cache of geocoding results, shared by geocode.py and geocodingComparison/abigailScript.py
+# Results are keyed by the normalized (street_address, city, state, zip) and by the geocoder endpoint,
+# so switching servers (or server versions) never returns stale coordinates.
+# Keys come from address_normalize.address_keys.
+
+# Imports
+import sqlite3
+import threading
+import time
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+
+# --- Cache ---
+
+class GeocodeCache:
+
+    def __init__(self, path, endpoint, ttl_days=90, max_entries=None):
+        self.endpoint = endpoint
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # One connection, shared by the threads that use the cache one call at a time
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                endpoint TEXT NOT NULL,
+                address_key TEXT NOT NULL,
+                matched_address TEXT,
+                location_x REAL,
+                location_y REAL,
+                score NUMERIC,
+                status TEXT,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (endpoint, address_key)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS geocodes_last_used ON geocodes (last_used)")
+        self.evict()
+
+    def get_many(self, keys):
+        # Returns {key: (matched_address, location_x, location_y, score, status)} for every cached key
+        # Counters are per key looked up, so repeated addresses count once per row
+        with self.lock:
+            found = {}
+            unique_keys = list(set(keys))
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i:i + 500]
+                rows = self.conn.execute(
+                    "SELECT address_key, matched_address, location_x, location_y, score, status FROM geocodes "
+                    f"WHERE endpoint = ? AND address_key IN ({','.join('?' * len(chunk))})",
+                    [self.endpoint] + chunk)
+                for row in rows:
+                    found[row[0]] = tuple(row[1:])
+            self.conn.executemany(
+                "UPDATE geocodes SET last_used = ? WHERE endpoint = ? AND address_key = ?",
+                [(time.time(), self.endpoint, key) for key in found])
+            self.conn.commit()
+
+            n_hits = sum(1 for key in keys if key in found)
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+            return found
+
+    def put_many(self, items):
+        # items: iterable of (key, (matched_address, location_x, location_y, score, status))
+        with self.lock:
+            now = time.time()
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.endpoint, key) + tuple(result) + (now, now) for key, result in items])
+            self.conn.commit()
+
+    def evict(self):
+        # Drop entries older than the TTL, then the least recently used ones above max_entries
+        with self.lock:
+            if self.ttl_days is not None:
+                cutoff = time.time() - self.ttl_days * SECONDS_PER_DAY
+                self.conn.execute("DELETE FROM geocodes WHERE created < ?", (cutoff,))
+            if self.max_entries is not None:
+                self.conn.execute("""
+                    DELETE FROM geocodes WHERE rowid IN (
+                        SELECT rowid FROM geocodes ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )""", (self.max_entries,))
+            self.conn.commit()
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+        return f"Cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,119 @@
+# HTTP client for the geocodeAddresses endpoint, shared by geocode.py and abigailScript.py:
+# one pooled keep-alive session, timeouts, retries with jittered exponential backoff,
+# and an adaptive batch size that shrinks when the server is slow or failing.
+
+# Imports
+import random
+import threading
+import time
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# The I2 server uses a self-signed certificate
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Status codes worth retrying, besides 5xx
+RETRY_STATUS = (408, 429)
+# The request was too large: sending it again won't help, but a smaller batch may
+SIZE_STATUS = (413, 414)
+
+class GeocodeError(Exception):
+    pass
+
+class RequestRejected(GeocodeError):
+    # Any other 4xx (a bad token, a malformed request): the same request will fail however it is split
+    pass
+
+
+
+# --- Adaptive batch size ---
+# Halve the batch size after an error or a slow response; grow it back by one step
+# (up to the server's limit) after every few fast responses in a row.
+
+class AdaptiveBatchSize:
+
+    def __init__(self, max_size=1000, min_size=50, slow_seconds=60, grow_step=100, grow_after=5):
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.slow_seconds = slow_seconds
+        self.grow_step = grow_step
+        self.grow_after = grow_after
+        self.size = max_size
+        self.successes = 0
+        self.lock = threading.Lock()
+
+    def record_success(self, elapsed):
+        if elapsed > self.slow_seconds:
+            self.shrink(f"slow response ({elapsed:.0f}s)")
+            return
+        with self.lock:
+            self.successes += 1
+            if self.successes >= self.grow_after:
+                self.size = min(self.max_size, self.size + self.grow_step)
+                self.successes = 0
+
+    def shrink(self, reason):
+        with self.lock:
+            self.successes = 0
+            new_size = max(self.min_size, self.size // 2)
+            if new_size < self.size:
+                print(f"Batch size {self.size} -> {new_size} after {reason}")
+            self.size = new_size
+
+
+
+# --- Client ---
+
+class GeocodeClient:
+
+    def __init__(self, url, timeout=300, connect_timeout=10, retries=5, backoff=1.0, max_backoff=60,
+                 pool_size=10, batch_size=None):
+        self.url = url
+        self.timeout = (connect_timeout, timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.batch_size = batch_size or AdaptiveBatchSize()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def backoff_seconds(self, attempt):
+        # "Full jitter": a random wait up to the exponential cap, so concurrent workers don't retry in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def post(self, addresses):
+        # addresses: JSON payload from arcgis_payload.py; returns the parsed JSON response
+        params = {"f" : "pjson", "addresses" : addresses}
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                result = self.session.post(self.url, data=params, timeout=self.timeout, verify=False)
+                if result.status_code in RETRY_STATUS or result.status_code >= 500:
+                    raise GeocodeError(f"HTTP {result.status_code}")
+                # Other 4xx responses won't succeed on retry either (see below)
+                if result.status_code >= 400:
+                    break
+                response = result.json()
+                # ArcGIS reports some failures as HTTP 200 with an "error" body
+                if "error" in response:
+                    raise GeocodeError(f"server error: {response['error']}")
+            except (requests.RequestException, ValueError, GeocodeError) as e:
+                self.batch_size.shrink(str(e) or type(e).__name__)
+                if attempt == self.retries:
+                    raise GeocodeError(f"giving up after {self.retries + 1} attempts: {e}") from e
+                wait = self.backoff_seconds(attempt)
+                print(f"Request failed ({e}); retrying in {wait:.1f}s")
+                time.sleep(wait)
+                continue
+            self.batch_size.record_success(time.perf_counter() - start)
+            return response
+        if result.status_code in SIZE_STATUS:
+            self.batch_size.shrink(f"HTTP {result.status_code}")
+            raise GeocodeError(f"HTTP {result.status_code}: batch too large")
+        raise RequestRejected(f"HTTP {result.status_code}: {result.text[:200]}")
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,172 @@
+# Geocoder backends shared by geocode.py and geocodingComparison/abigailScript.py.
+# A backend geocodes one batch of address records:
+#   geocode_batch(records) -> DataFrame of arcgis_payload.RESPONSE_COLUMNS
+#                             (ResultID, matched_address, location_x, location_y, score, status)
+# where records is a DataFrame with an ObjectID column and either the multi-line fields (address, city,
+# region, postal) or SingleLine, built by multi_line_records / single_line_records. Failures raise
+# GeocodeError (RequestRejected when the request itself was refused). Each backend declares batch_limit (most records per call) and concurrency_limit (most
+# calls in flight at once), and holds the AdaptiveBatchSize callers split their batches by.
+#   arcgis  - the ArcGIS geocodeAddresses endpoint, through GeocodeClient (pooled session, retries)
+#   offline - no network: street address ranges from a reference table, falling back to the ZIP's
+#             centroid; with no table, the same deterministic coordinates stub_server.py returns
+
+# Imports
+import os
+import numpy as np
+import pandas as pd
+
+from address_normalize import normalize_text, normalize_zip
+from arcgis_payload import RESPONSE_COLUMNS, build_payload, parse_response, payload_attributes
+from defaults import ARCGIS_URL
+from geocode_client import AdaptiveBatchSize, GeocodeClient
+
+# Columns of an offline reference table: one row per street segment, with the house numbers at its
+# two ends and their coordinates (as in TIGER/Line address ranges)
+REFERENCE_COLUMNS = ['zip', 'street', 'from_number', 'to_number', 'from_x', 'from_y', 'to_x', 'to_y']
+
+# Score of an offline match to the ZIP's centroid rather than a street range
+ZIP_SCORE = 50
+
+
+
+# --- Records ---
+
+def multi_line_records(object_ids, address, city, region, postal):
+    return pd.DataFrame({name: pd.Series(values).reset_index(drop=True) for name, values in
+                         [('ObjectID', object_ids), ('address', address), ('city', city),
+                          ('region', region), ('postal', postal)]})
+
+def single_line_records(object_ids, single_line):
+    return pd.DataFrame({'ObjectID': pd.Series(object_ids).reset_index(drop=True),
+                         'SingleLine': pd.Series(single_line).reset_index(drop=True)})
+
+def record_fields(records):
+    return {name: records[name] for name in records.columns if name != 'ObjectID'}
+
+
+
+# --- ArcGIS ---
+
+class ArcGISBackend:
+    # The server takes at most 1000 addresses per request
+    batch_limit = 1000
+    concurrency_limit = 16
+
+    def __init__(self, url=ARCGIS_URL, timeout=300, retries=5, workers=1, min_batch=50):
+        self.source = url
+        self.batch_size = AdaptiveBatchSize(self.batch_limit, min_batch, slow_seconds=timeout / 2)
+        self.client = GeocodeClient(url, timeout=timeout, retries=retries,
+                                    pool_size=min(workers, self.concurrency_limit), batch_size=self.batch_size)
+
+    def geocode_batch(self, records):
+        return parse_response(self.client.post(build_payload(records['ObjectID'], **record_fields(records))))
+
+    def close(self):
+        self.client.close()
+
+
+
+# --- Offline ---
+
+def split_street(address):
+    # (house number as float, normalized street name) from e.g. "660 S Euclid Ave"; NaN when there is no number
+    parts = normalize_text(address).str.extract(r"^(\d+)\s+(.*)$")
+    return pd.to_numeric(parts[0]).to_numpy(dtype=float), parts[1].fillna("").to_numpy(dtype=object)
+
+def split_single_line(single_line):
+    # (street address, ZIP) from "660 S Euclid Ave, St Louis, MO 63110": the text before the first comma,
+    # and the last 5-digit (or ZIP+4) number
+    text = normalize_text(single_line)
+    return text.str.split(",").str[0], text.str.extract(r"(\d{5})(?:-\d{4})?\s*$", expand=False)
+
+class OfflineBackend:
+    # In-process and single-threaded, so large batches and one at a time
+    batch_limit = 10000
+    concurrency_limit = 1
+
+    def __init__(self, reference=None):
+        self.source = 'offline:' + (os.path.abspath(reference) if reference else 'stub')
+        self.batch_size = AdaptiveBatchSize(self.batch_limit, self.batch_limit)
+        self.ranges = None
+        self.centroids = None
+        if reference:
+            self.load_reference(reference)
+
+    def load_reference(self, path):
+        from table_io import read_table
+        ranges = read_table(path)
+        missing_columns = [c for c in REFERENCE_COLUMNS if c not in ranges.columns]
+        if missing_columns:
+            raise ValueError(f"{path} is missing reference columns: {missing_columns}")
+        ranges = ranges[REFERENCE_COLUMNS].assign(zip=normalize_zip(ranges['zip']).to_numpy(),
+                                                  street=normalize_text(ranges['street']).to_numpy())
+        low = ranges[['from_number', 'to_number']].min(axis=1)
+        high = ranges[['from_number', 'to_number']].max(axis=1)
+        # A segment numbered along one side of the street (both ends even, or both odd) also holds the
+        # other side's numbers on that block: 699 S Euclid Ave is on the 600-698 segment
+        one_side = (high - low) % 2 == 0
+        ranges['low'] = low - (one_side & (low % 2 == 1))
+        ranges['high'] = high + (one_side & (high % 2 == 0))
+        self.ranges = ranges
+        # Each ZIP's centroid, as the mean of its segments' midpoints
+        self.centroids = ranges.assign(x=(ranges['from_x'] + ranges['to_x']) / 2,
+                                       y=(ranges['from_y'] + ranges['to_y']) / 2).groupby('zip')[['x', 'y']].mean()
+
+    def geocode_batch(self, records):
+        if self.ranges is None:
+            from stub_server import fakeLocation
+            attributes = payload_attributes(records['ObjectID'], **record_fields(records))
+            return parse_response({"locations": [fakeLocation(a) for a in attributes]})
+
+        if 'SingleLine' in records.columns:
+            address, zip = split_single_line(records['SingleLine'])
+        else:
+            address, zip = records['address'], records['postal']
+        number, street = split_street(address)
+        query = pd.DataFrame({'row': np.arange(len(records)), 'zip': normalize_zip(zip).to_numpy(),
+                              'street': street, 'number': number})
+
+        # Street ranges: the first segment of the street whose range holds the house number, interpolated
+        hits = query.merge(self.ranges, on=['zip', 'street'])
+        hits = hits[(hits['number'] >= hits['low']) & (hits['number'] <= hits['high'])].drop_duplicates('row')
+        span = (hits['to_number'] - hits['from_number']).to_numpy(dtype=float)
+        t = np.divide(hits['number'] - hits['from_number'], span, out=np.full(len(hits), 0.5), where=span != 0)
+        t = np.clip(t, 0, 1)
+
+        results = pd.DataFrame({
+            'ResultID': records['ObjectID'].to_numpy(),
+            'matched_address': np.full(len(records), None, dtype=object),
+            'location_x': np.full(len(records), np.nan),
+            'location_y': np.full(len(records), np.nan),
+            'score': 0,
+            'status': 'U',
+        }, columns=RESPONSE_COLUMNS)
+        rows = hits['row'].to_numpy()
+        results.loc[rows, 'location_x'] = (hits['from_x'] + t * (hits['to_x'] - hits['from_x'])).to_numpy()
+        results.loc[rows, 'location_y'] = (hits['from_y'] + t * (hits['to_y'] - hits['from_y'])).to_numpy()
+        results.loc[rows, 'matched_address'] = (hits['number'].astype('int64').astype(str) + " " + hits['street']
+                                                + ", " + hits['zip']).to_numpy()
+        results.loc[rows, ['score', 'status']] = [100, 'M']
+
+        # Otherwise the ZIP's centroid, with a lower score
+        unmatched = np.ones(len(records), dtype=bool)
+        unmatched[rows] = False
+        centroid = self.centroids.reindex(query['zip'])
+        in_zip = unmatched & centroid['x'].notna().to_numpy()
+        results.loc[in_zip, 'location_x'] = centroid['x'].to_numpy()[in_zip]
+        results.loc[in_zip, 'location_y'] = centroid['y'].to_numpy()[in_zip]
+        results.loc[in_zip, 'matched_address'] = query['zip'].to_numpy()[in_zip]
+        results.loc[in_zip, ['score', 'status']] = [ZIP_SCORE, 'M']
+        return results
+
+    def close(self):
+        pass
+
+
+
+# --- Choosing a backend ---
+
+def make_backend(name, url=ARCGIS_URL, reference=None, timeout=300, retries=5, workers=1, min_batch=50):
+    if name == 'offline':
+        return OfflineBackend(reference)
+    return ArcGISBackend(url, timeout, retries, workers, min_batch)
@@ -0,0 +1,102 @@
+# Incremental ADI joins: keep the columns join_adi.py added for each location_id, together with a hash
+# of that row's (location_x, location_y), and on the next run only join the rows that are new or whose
+# coordinates changed. Everything else is copied from the previous run.
+#
+# The state is a Parquet file with location_id, location_hash and the added columns, typed as they were.
+# Its metadata records the join options (index, levels, nearest) and the size and modification time of
+# every file the index came from; if any of them differ, every row is rejoined.
+
+# Imports
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STATE_KEY = b'join_adi'
+
+
+
+# --- State ---
+
+def location_hashes(df):
+    # One uint64 per row from the coordinates alone, so re-geocoding an address changes it
+    return pd.util.hash_pandas_object(df[['location_x', 'location_y']], index=False).values
+
+def file_fingerprint(paths):
+    # {file: [size, mtime_ns]} for each path, with directories (compiled indexes) walked, so registering,
+    # recompiling or replacing any of them changes it. Missing files map to None
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(root, name) for root, dirs, names in os.walk(path) for name in names]
+        else:
+            files.append(path)
+    fingerprint = {}
+    for file in sorted(os.path.normpath(file) for file in files):
+        try:
+            stat = os.stat(file)
+            fingerprint[file] = [stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            fingerprint[file] = None
+    return fingerprint
+
+def read_state(path, options):
+    # Returns the previous run's added columns (with location_id and location_hash), or None when there
+    # is no usable state
+    try:
+        table = pq.read_table(path)
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    metadata = table.schema.metadata or {}
+    if json.loads(metadata.get(STATE_KEY, b'null')) != options:
+        print(f"Join options or index files changed since {path} was written; joining every row")
+        return None
+    return table.to_pandas()
+
+def write_state(path, added, hashes, options):
+    state = pd.concat([pd.DataFrame({'location_hash': hashes}), added.reset_index(drop=True)], axis=1)
+    table = pa.Table.from_pandas(state, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), STATE_KEY: json.dumps(options).encode('utf-8')}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    pq.write_table(table.replace_schema_metadata(metadata), path)
+
+
+
+# --- Join ---
+
+def join_incremental(df, join, state_path, options):
+    # join(df) adds columns to df, keyed by location_id (as BlockGroupIndex.join and add_levels do).
+    # Returns the same frame as join(df), calling join only on rows that are new or moved since the
+    # run that wrote state_path, and updates state_path
+    hashes = location_hashes(df)
+    if df['location_id'].duplicated().any():
+        print("location_id is not unique; joining every row without incremental state")
+        return join(df)
+
+    state = read_state(state_path, options)
+    if state is None:
+        changed = np.ones(len(df), dtype=bool)
+    else:
+        previous = state.drop_duplicates('location_id').set_index('location_id')['location_hash']
+        changed = ~(previous.reindex(df['location_id']).values == hashes)
+    print(f"Incremental join: {changed.sum()} new or changed rows, {(~changed).sum()} reused")
+
+    joined = join(df[changed])
+    added_columns = ['location_id'] + [c for c in joined.columns if c not in df.columns]
+    added = joined[added_columns]
+    if state is not None:
+        reused = state.loc[state['location_id'].isin(df['location_id'][~changed]), added_columns]
+        added = pd.concat([reused, added], ignore_index=True) if len(added) else reused.reset_index(drop=True)
+
+    # Left merge keeps the input order, with a location in several block groups on adjacent rows
+    result = df.merge(added, on='location_id', how='left')
+    # Nothing new, moved or dropped: the state on disk is already current
+    if state is None or changed.any() or len(added) != len(state):
+        write_state(state_path, added, hashes_by_row(df, hashes, added), options)
+    return result
+
+def hashes_by_row(df, hashes, added):
+    # The current hash of each row of added (which can hold several rows per location_id)
+    return pd.Series(hashes, index=df['location_id'].values).reindex(added['location_id']).values
@@ -1,21 +1,13 @@
 # Right-join geocoded addresses with shapefile, then join with ADI table
 
 #Imports 
-import pandas as pd
-import geopandas as gpd
 import argparse
 import os
+import time
 
-
-
-# --- Load in MO Census Block Group shapefile ---
-
-shp = gpd.read_file('resources/tl_2020_29_bg20.shp')
-shp.rename(columns={'GEOID20':'FIPS'}, inplace=True)
-shp['FIPS'] = shp['FIPS'].astype(str)
-
-census_blocks = shp.loc[:, ['FIPS', 'geometry']]
-print("Shape of census_blocks: ", census_blocks.shape)
+# Only the defaults are imported up front; pandas, pyarrow, shapely and the block groups are loaded by the
+# functions that need them, so --help and a bad argument return right away
+from defaults import ADI_TABLE, FORMATS, GEOGRAPHY_LEVELS, RESOURCES, SHAPEFILE
 
 
 
@@ -23,48 +15,123 @@ print("Shape of census_blocks: ", census_blocks.shape)
 
 description = "Load in geocoded addresses, for ADI joining"
 parser = argparse.ArgumentParser(description=description)
-parser.add_argument('infile', help="path to input CSV")
-args = parser.parse_args()
-
-if not os.path.exists(args.infile) or not os.path.isfile(args.infile):
-    print("ERROR: infile not found: " + args.infile)
-    exit(1)
-
-df = pd.read_csv(args.infile)
-
-if df is None:
-    print("ERROR: df is type None.")
-    exit(1)
-
-selected_columns = df.loc[:, ['location_id', 'location_x', 'location_y']]
-
-locations_gdf = gpd.GeoDataFrame(
-    selected_columns,
-    geometry = gpd.points_from_xy(
-        selected_columns.location_x, 
-        selected_columns.location_y),
-    crs = census_blocks.crs
-)
-print("Shape of locations_gdf: ", locations_gdf.shape)
-
-
-
-# --- Join locations to FIPS codes ---
-
-joined_gdf = gpd.sjoin(locations_gdf, census_blocks, how='inner', predicate='within')
-joined_df = pd.DataFrame(joined_gdf[['location_id', 'FIPS']])
-print("Shape of joined_df: ", joined_df.shape)
-
-df = df.merge(joined_df, on='location_id', how='left')
-
-
-
-# --- Join FIPS codes to ADI metrics ---
-
-adi_2020 = pd.read_csv('resources/MO_2020_ADI_Census_Block_Group_v4_0_1.csv')
-adi_2020 = adi_2020.astype(str).rename(columns={'ADI_NATRANK':'ADI_NAT_20', 'ADI_STATERNK':'ADI_ST_20'})
-df = df.merge(adi_2020, on='FIPS', how='left')
+parser.add_argument('infile', help="path to input CSV, Parquet or Feather file")
+parser.add_argument('-i', '--index', default=None,
+                    help="use this one compiled block group index from adi_index.py instead of every registered state")
+parser.add_argument('-r', '--resources', default=RESOURCES,
+                    help="directory with each state's block group and ADI files (see state_registry.py)")
+parser.add_argument('-l', '--levels', nargs='+', default=[], type=str.upper, choices=list(GEOGRAPHY_LEVELS),
+                    help="also resolve these larger geographies from each block group, with their metrics")
+parser.add_argument('-e', '--engine', default='grid', choices=['grid', 'strtree'],
+                    help="point-in-polygon engine for compiled indexes (grid: pip_engine.py; strtree: shapely only)")
+parser.add_argument('-w', '--workers', type=int, default=1,
+                    help="locate large inputs in N worker processes, one spatial partition at a time")
+parser.add_argument('-n', '--nearest', type=float, default=None, metavar='METERS',
+                    help="give points outside every block group the nearest one within METERS, "
+                         "and add match_type (within/nearest/none) and match_distance_m columns")
+parser.add_argument('--incremental', nargs='?', const='', default=None, metavar='STATE',
+                    help="only join rows that are new or moved since the last incremental run, keeping "
+                         "per-location state in STATE (default results/ADI_<infile>.state.parquet)")
+parser.add_argument('-c', '--columns', nargs='+', default=None,
+                    help="input columns to carry into the output besides location_id/x/y (default: all)")
+parser.add_argument('-f', '--format', default=None, choices=sorted(FORMATS.values()),
+                    help="output format (default: the input's)")
+
+
+def read_input(args):
+    if not os.path.exists(args.infile) or not os.path.isfile(args.infile):
+        print("ERROR: infile not found: " + args.infile)
+        exit(1)
+    from table_io import read_table, table_columns
+
+    # Only the columns the join needs, plus the ones to carry along; Parquet and Feather skip the rest on disk
+    columns = None
+    if args.columns is not None:
+        columns = ['location_id', 'location_x', 'location_y']
+        columns += [c for c in args.columns if c not in columns]
+        missing_columns = [c for c in columns if c not in table_columns(args.infile)]
+        if missing_columns:
+            print(f"ERROR: missing columns: {missing_columns}")
+            exit(1)
+    df = read_table(args.infile, columns)
+
+    if df is None:
+        print("ERROR: df is type None.")
+        exit(1)
+    return df
+
+
+
+# --- Register each state's Census Block Group polygons and ADI table ---
+# States are loaded lazily, the first time a point falls inside their bounding box
+
+def load_adi_index(index_path=None, resources=RESOURCES, engine='grid', workers=1):
+    # One compiled index (index_path), or every state registered in resources
+    from adi_index import load_index
+    from state_registry import StateRegistry
+    if index_path:
+        index = load_index(index_path, SHAPEFILE, ADI_TABLE, engine=engine == 'grid')
+        index.workers = workers
+    else:
+        index = StateRegistry(resources, engine=engine == 'grid', workers=workers)
+        print("Registered states: ", ", ".join(index.states()) or "none")
+    return index
+
+
+
+# --- Join locations to FIPS codes, then FIPS codes to ADI metrics (and larger geographies) ---
+
+def join_adi(df, index, levels=(), nearest=None, incremental=None):
+    # incremental: (state path, join options) to only join rows new or moved since the last run
+    from adi_index import add_levels
+    from incremental_join import join_incremental
+
+    def join(df):
+        df = index.join(df, nearest)
+        # Tract, county and state come from the block group's FIPS, with no further spatial joins
+        return add_levels(df, index.adi, levels)
+
+    if incremental is None:
+        return join(df)
+    return join_incremental(df, join, *incremental)
+
+def write_results(df, infile, levels=(), format=None, outdir='results'):
+    from adi_index import level_counts
+    from table_io import with_format, write_table
+    write_table(df, with_format(os.path.join(outdir, 'ADI_' + os.path.basename(infile)), format))
+
+    # One summary per level: number of locations in each unit, with the unit's metrics
+    for level in levels:
+        write_table(level_counts(df, level),
+                    with_format(os.path.join(outdir, level + '_ADI_' + os.path.basename(infile)), format))
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    df = read_input(args)
+
+    start = time.perf_counter()
+    index = load_adi_index(args.index, args.resources, args.engine, args.workers)
+    startup_seconds = time.perf_counter() - start
+
+    incremental = None
+    if args.incremental is not None:
+        from incremental_join import file_fingerprint
+        state_path = args.incremental or 'results/ADI_' + os.path.splitext(os.path.basename(args.infile))[0] + '.state.parquet'
+        incremental = (state_path, {'index': args.index or args.resources, 'levels': args.levels, 'nearest': args.nearest,
+                                    'sources': file_fingerprint(index.source_files())})
+
+    start = time.perf_counter()
+    df = join_adi(df, index, args.levels, args.nearest, incremental)
+    join_seconds = time.perf_counter() - start
+
+    # Time spent loading states on demand counts as startup, not join
+    load_seconds = getattr(index, 'load_seconds', 0.0)
+    print("Shape of census_blocks: ", (len(index), 2))
+    print(f"Startup: {startup_seconds + load_seconds:.3f}s, join: {join_seconds - load_seconds:.3f}s")
+
+    write_results(df, args.infile, args.levels, args.format)
+
+
 
-df.to_csv(
-    'results/ADI_' + os.path.basename(args.infile), 
-    index = False)
+if __name__ == "__main__":
+    main()
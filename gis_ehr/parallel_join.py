@@ -0,0 +1,79 @@
+# Parallel point-in-polygon joins for large inputs: the points are split into spatial partitions
+# (runs of neighbouring grid cells), each partition is located by a worker process, and the results
+# are put back in input order.
+#
+# Nothing big is pickled between processes:
+#   - each worker opens the compiled index itself, once, with the grid engine's arrays memory-mapped,
+#     so all workers share one copy of them in the page cache
+#   - the point coordinates are written once to shared memory, and a task is just a (start, end) range
+#     of the spatially sorted points
+
+# Imports
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# Below this many points, starting the workers costs more than it saves
+MIN_PARALLEL_POINTS = 200000
+
+_worker = {}
+
+
+
+# --- Worker side ---
+
+def _init_worker(index_path, shm_name, n_points):
+    from adi_index import BlockGroupIndex
+    _worker['index'] = BlockGroupIndex.load(index_path, mmap_mode='r')
+    _worker['shm'] = shared_memory.SharedMemory(name=shm_name)
+    _worker['xy'] = np.ndarray((2, n_points), dtype=np.float64, buffer=_worker['shm'].buf)
+
+def _locate_partition(start, end):
+    xy = _worker['xy']
+    point_idx, polygon_idx = _worker['index'].locate_serial(xy[0, start:end], xy[1, start:end])
+    return point_idx + start, polygon_idx
+
+
+
+# --- Driver ---
+
+def spatial_order(index, x, y):
+    # Sorts points by grid cell (row-major), so each partition covers a compact strip of the map
+    # and its workers touch only the edges in that strip
+    if index.engine is not None:
+        cell_size, origin = index.engine.cell_size, index.engine.origin
+    else:
+        cell_size, origin = 0.05, np.zeros(2)
+    col = np.nan_to_num((x - origin[0]) // cell_size, nan=-1)
+    row = np.nan_to_num((y - origin[1]) // cell_size, nan=-1)
+    return np.lexsort((col, row))
+
+def locate_parallel(index, x, y, workers, partitions_per_worker=4):
+    # Same result as index.locate_serial(x, y), computed by a pool of worker processes.
+    # index must have been loaded from a compiled directory (index.path), which the workers reopen
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if workers <= 1 or len(x) < MIN_PARALLEL_POINTS or index.path is None:
+        return index.locate_serial(x, y)
+
+    order = spatial_order(index, x, y)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 2 * len(x) * 8))
+    try:
+        xy = np.ndarray((2, len(x)), dtype=np.float64, buffer=shm.buf)
+        xy[0] = x[order]
+        xy[1] = y[order]
+        bounds = np.linspace(0, len(x), workers * partitions_per_worker + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(os.path.abspath(index.path), shm.name, len(x))) as executor:
+            results = list(executor.map(_locate_partition, bounds[:-1], bounds[1:]))
+        del xy
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Map sorted positions back to input rows, then restore input order
+    point_idx = order[np.concatenate([r[0] for r in results])]
+    polygon_idx = np.concatenate([r[1] for r in results])
+    reassemble = np.lexsort((polygon_idx, point_idx))
+    return point_idx[reassemble], polygon_idx[reassemble]
@@ -0,0 +1,225 @@
+# Point-in-polygon engine in plain NumPy, for block groups (polygons that don't overlap).
+#
+# The polygons' edges are bucketed into a uniform grid. For every grid cell we record which polygon
+# contains a reference point, the cell's center (computed exactly, once, when the engine is built).
+# A point's polygon then follows from the even-odd rule along a short path inside its own cell: from
+# the reference point horizontally to the point's x, then vertically to the point. Each edge of a
+# polygon crossed on the way flips whether we're inside it, so only the few edges bucketed in that
+# one cell are ever tested, and every test is a whole-array NumPy operation over all (point, edge)
+# pairs in a chunk.
+#
+# Both legs of the path use the half-open crossing rule from ray casting, so a path through a vertex
+# is counted once. Floating-point rounding can still misjudge a crossing right at the end of a leg, and
+# sjoin(predicate='within') leaves points exactly on a boundary unmatched, where the even-odd rule would
+# pick a side. So any point that lies, or whose path turns, within NEAR_EDGE degrees of an edge is
+# flagged and handed to an exact fallback (shapely) instead.
+#
+# The engine is just a handful of flat arrays, so it is saved as .npy files next to a compiled index
+# and can be memory-mapped back in.
+
+# Imports
+import os
+import numpy as np
+import shapely
+
+ENGINE_DIR = 'grid'
+ENGINE_ARRAYS = ['origin', 'cell_size', 'shape', 'cell_start', 'cell_edges', 'ref_x', 'ref_y', 'ref_polygon',
+                 'edges', 'edge_polygon']
+# About 0.1 mm; far below geocoding precision, far above rounding error
+NEAR_EDGE = 1e-9
+# Points per chunk; each point pairs with every edge in its cell, so this bounds peak memory
+CHUNK_POINTS = 1000000
+
+
+
+# --- Build ---
+
+def polygon_edges(geometries):
+    # Every edge of every ring (exteriors and holes), as x0, y0, x1, y1 and the owning polygon
+    parts, part_polygon = shapely.get_parts(geometries, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+    # Consecutive coordinates of the same ring form an edge (rings are closed, so no wrap-around)
+    same_ring = coord_ring[1:] == coord_ring[:-1]
+    start = coords[:-1][same_ring]
+    end = coords[1:][same_ring]
+    polygon = part_polygon[ring_part[coord_ring[:-1][same_ring]]]
+    return start[:, 0], start[:, 1], end[:, 0], end[:, 1], polygon
+
+def reference_polygons(geometries, x, y, nudge):
+    # Moves any reference point within NEAR_EDGE of a polygon boundary a little way into its cell,
+    # then returns which polygon each reference point is in (or -1). x and y are updated in place
+    tree = shapely.STRtree(geometries)
+    boundaries = shapely.boundary(geometries)
+    shapely.prepare(geometries)
+    cells = shapely.box(x - nudge / 2, y - nudge / 2, x + nudge / 2, y + nudge / 2)
+    for attempt in range(1, 11):
+        points = shapely.points(x, y)
+        point_idx, polygon_idx = tree.query(points)
+        inside = shapely.contains_xy(geometries[polygon_idx], x[point_idx], y[point_idx])
+        on_boundary = np.unique(point_idx[shapely.dwithin(boundaries[polygon_idx], points[point_idx], NEAR_EDGE)])
+        # The last pass only checks the final nudge
+        if len(on_boundary) == 0 or attempt == 10:
+            break
+        x[on_boundary] += nudge * 0.0037 * attempt
+        y[on_boundary] += nudge * 0.0019 * attempt
+    polygon = np.full(len(x), -1, dtype=np.int32)
+    polygon[point_idx[inside]] = polygon_idx[inside]
+
+    # Points the nudges never got clear of an edge (say, a boundary that runs along the nudge direction)
+    # move to a point inside one of the polygons in their cell instead, checked with an exact contains
+    for i in on_boundary:
+        candidates = tree.query(cells[i], predicate='intersects')
+        for j in candidates:
+            point = shapely.point_on_surface(shapely.intersection(geometries[j], cells[i]))
+            if (not shapely.is_empty(point) and shapely.contains(geometries[j], point)
+                    and not shapely.dwithin(boundaries[candidates], point, NEAR_EDGE).any()):
+                x[i], y[i] = shapely.get_coordinates(point)[0]
+                polygon[i] = j
+                break
+    return polygon
+
+class GridEngine:
+
+    def __init__(self, origin, cell_size, shape, cell_start, cell_edges, ref_x, ref_y, ref_polygon,
+                 edges, edge_polygon):
+        self.origin = origin
+        self.cell_size = float(cell_size)
+        self.shape = shape
+        self.cell_start = cell_start
+        self.cell_edges = cell_edges
+        self.ref_x = ref_x
+        self.ref_y = ref_y
+        self.ref_polygon = ref_polygon
+        # One row of x0, y0, x1, y1 per edge, so gathering an edge is a single contiguous read
+        self.edges = edges
+        self.edge_polygon = edge_polygon
+
+    @classmethod
+    def build(cls, geometries, edges_per_cell=2):
+        geometries = np.asarray(geometries)
+        x0, y0, x1, y1, edge_polygon = polygon_edges(geometries)
+        xmin, ymin, xmax, ymax = shapely.total_bounds(geometries)
+
+        # Square cells sized so that the average occupied cell holds about edges_per_cell edges
+        edge_length = np.hypot(x1 - x0, y1 - y0).mean()
+        cell_size = max(edge_length, np.sqrt((xmax - xmin) * (ymax - ymin) * edges_per_cell / len(x0)))
+        nx = int((xmax - xmin) / cell_size) + 1
+        ny = int((ymax - ymin) / cell_size) + 1
+        origin = np.array([xmin, ymin])
+
+        # Bucket each edge into every cell its bounding box overlaps
+        cx0 = ((np.minimum(x0, x1) - xmin) / cell_size).astype(np.int64)
+        cx1 = ((np.maximum(x0, x1) - xmin) / cell_size).astype(np.int64)
+        cy0 = ((np.minimum(y0, y1) - ymin) / cell_size).astype(np.int64)
+        cy1 = ((np.maximum(y0, y1) - ymin) / cell_size).astype(np.int64)
+        wx, wy = cx1 - cx0 + 1, cy1 - cy0 + 1
+        n_cells = wx * wy
+        edge = np.repeat(np.arange(len(x0)), n_cells)
+        offset = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        cell = (cy0[edge] + offset // wx[edge]) * nx + cx0[edge] + offset % wx[edge]
+        order = np.argsort(cell, kind='stable')
+        cell_edges = edge[order].astype(np.int32)
+        cell_start = np.zeros(nx * ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell, minlength=nx * ny), out=cell_start[1:])
+
+        # Which polygon holds each cell's reference point (its center); exact, and done once per cell
+        cells = np.arange(nx * ny)
+        ref_x = xmin + (cells % nx + 0.5) * cell_size
+        ref_y = ymin + (cells // nx + 0.5) * cell_size
+        ref_polygon = reference_polygons(geometries, ref_x, ref_y, cell_size)
+
+        return cls(origin, cell_size, np.array([ny, nx]), cell_start, cell_edges, ref_x, ref_y, ref_polygon,
+                   np.column_stack([x0, y0, x1, y1]), edge_polygon.astype(np.int32))
+
+    def save(self, path):
+        os.makedirs(os.path.join(path, ENGINE_DIR), exist_ok=True)
+        for name in ENGINE_ARRAYS:
+            np.save(os.path.join(path, ENGINE_DIR, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        # mmap_mode='r' maps the arrays instead of reading them, so processes share one copy in the page cache
+        return cls(*[np.load(os.path.join(path, ENGINE_DIR, name + '.npy'), mmap_mode=mmap_mode)
+                     for name in ENGINE_ARRAYS])
+
+    def locate(self, x, y, exact=None):
+        # Returns (point index, polygon index) for every point inside a polygon, ordered by point.
+        # exact(x, y) answers the same question for the few points too close to an edge to trust the grid
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        point_parts, polygon_parts = [], []
+        for start in range(0, len(x), CHUNK_POINTS):
+            point_idx, polygon_idx, near = self.locate_chunk(x[start:start + CHUNK_POINTS],
+                                                             y[start:start + CHUNK_POINTS])
+            if exact is not None and len(near):
+                keep = ~np.isin(point_idx, near)
+                near_point, near_polygon = exact(x[start + near], y[start + near])
+                point_idx = np.concatenate([point_idx[keep], near[near_point]])
+                polygon_idx = np.concatenate([polygon_idx[keep], near_polygon])
+                order = np.lexsort((polygon_idx, point_idx))
+                point_idx, polygon_idx = point_idx[order], polygon_idx[order]
+            point_parts.append(point_idx + start)
+            polygon_parts.append(polygon_idx)
+        if not point_parts:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        return np.concatenate(point_parts), np.concatenate(polygon_parts)
+
+    def locate_chunk(self, x, y):
+        ny, nx = self.shape
+        col = np.floor((x - self.origin[0]) / self.cell_size)
+        row = np.floor((y - self.origin[1]) / self.cell_size)
+        # NaN coordinates and points off the grid can't be in any polygon
+        on_grid = (col >= 0) & (col < nx) & (row >= 0) & (row < ny)
+        # Work through the points cell by cell, so the gathers below read edges in order
+        cell = (row * nx + col)[on_grid].astype(np.int64)
+        order = np.argsort(cell)
+        points = np.flatnonzero(on_grid)[order]
+        cell = cell[order]
+        px, py = x[points], y[points]
+        rx, ry = self.ref_x[cell], self.ref_y[cell]
+
+        # Every (point, edge) pair of the edges bucketed in the point's cell
+        counts = self.cell_start[cell + 1] - self.cell_start[cell]
+        pair_point = np.repeat(np.arange(len(points)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_edge = self.cell_edges[self.cell_start[cell][pair_point] + offset]
+        x0, y0, x1, y1 = self.edges[pair_edge].T
+        ppx, ppy = px[pair_point], py[pair_point]
+        pry = ry[pair_point]
+
+        # Only edges that straddle a leg's line can cross it; solve for the crossing just for those
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Horizontal leg, y = ry from rx to px: the edge straddles the line (half-open) and meets it in range
+            h = np.flatnonzero((y0 > pry) != (y1 > pry))
+            hit_x = x0[h] + (pry[h] - y0[h]) * (x1[h] - x0[h]) / (y1[h] - y0[h])
+            near_h = h[np.abs(hit_x - ppx[h]) <= NEAR_EDGE]
+            h = h[(hit_x > rx[pair_point[h]]) != (hit_x > ppx[h])]
+            # Vertical leg, x = px from ry to py
+            v = np.flatnonzero((x0 > ppx) != (x1 > ppx))
+            hit_y = y0[v] + (ppx[v] - x0[v]) * (y1[v] - y0[v]) / (x1[v] - x0[v])
+            near_v = v[(np.abs(hit_y - pry[v]) <= NEAR_EDGE) | (np.abs(hit_y - ppy[v]) <= NEAR_EDGE)]
+            v = v[(hit_y > pry[v]) != (hit_y > ppy[v])]
+        # An edge crossing both legs is crossed twice, which cancels out
+        crossed = np.setxor1d(h, v, assume_unique=True)
+
+        # Points on (or within NEAR_EDGE of) an edge, by their distance to the edge's line, within its extent
+        length = np.hypot(x1 - x0, y1 - y0)
+        on_edge = ((np.abs((x1 - x0) * (ppy - y0) - (y1 - y0) * (ppx - x0)) <= NEAR_EDGE * length)
+                   & (ppx >= np.minimum(x0, x1) - NEAR_EDGE) & (ppx <= np.maximum(x0, x1) + NEAR_EDGE)
+                   & (ppy >= np.minimum(y0, y1) - NEAR_EDGE) & (ppy <= np.maximum(y0, y1) + NEAR_EDGE))
+        near = np.unique(points[pair_point[np.concatenate([near_h, near_v, np.flatnonzero(on_edge)])]])
+
+        # A polygon contains the point if it contains the cell's reference point and was crossed an even
+        # number of times, or doesn't contain it and was crossed an odd number of times
+        n_polygons = np.int64(self.edge_polygon.max() + 1)
+        keys = pair_point[crossed] * n_polygons + self.edge_polygon[pair_edge[crossed]]
+        keys, crossings = np.unique(keys, return_counts=True)
+        flipped = keys[crossings % 2 == 1]
+        ref_polygon = self.ref_polygon[cell]
+        has_ref = ref_polygon >= 0
+        ref_keys = np.flatnonzero(has_ref) * n_polygons + ref_polygon[has_ref]
+        inside = np.setxor1d(ref_keys, flipped, assume_unique=True)
+        point_idx, polygon_idx = points[inside // n_polygons], inside % n_polygons
+        order = np.argsort(point_idx * n_polygons + polygon_idx)
+        return point_idx[order], polygon_idx[order], near
@@ -0,0 +1,156 @@
+# Run the gis_ehr stages in one process: geocode.py -> join_adi.py -> plot_adi.py.
+# Each stage hands its DataFrame to the next in memory, and the block group index (or the per-state
+# registry) is loaded once, for both the join and the plots. Any contiguous run of stages can be
+# selected; the input is whatever the first selected stage reads:
+#   python pipeline.py sampleAddresses.csv
+#   python pipeline.py results/GEOCODED_sampleAddresses.parquet --stages join plot
+# Each table a stage produces is still written to the output directory, under the name its script
+# would give it, unless --noSave is given. Per-stage times are printed at the end.
+
+# Imports
+import argparse
+import os
+import shutil
+import time
+
+# Each stage's modules (and pandas, pyarrow, shapely, ...) are imported when the stage runs
+from defaults import FORMATS, RESOURCES
+
+STAGES = ['geocode', 'join', 'plot']
+
+
+
+# --- Arguments ---
+
+description = "Run geocoding, the ADI join and the plots in one process"
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('infile', help="input of the first stage (addresses, geocoded or ADI-joined table)")
+parser.add_argument('-s', '--stages', nargs='+', default=STAGES, choices=STAGES,
+                    help="consecutive stages to run (default: all)")
+parser.add_argument('-o', '--outputPath', default='results', help="directory to store output")
+parser.add_argument('-f', '--format', default=None, choices=sorted(FORMATS.values()),
+                    help="format of the tables written (default: the input's)")
+parser.add_argument('--noSave', action='store_true', help="don't write the stages' tables, only the plots")
+# geocode.py
+parser.add_argument('-b', '--backend', default='arcgis', choices=['arcgis', 'offline'],
+                    help="geocoder to use (geocode.py --backend)")
+parser.add_argument('--reference', default=None,
+                    help="street range table for the offline backend (geocode.py --reference)")
+parser.add_argument('-u', '--url', default=None, help="geocodeAddresses endpoint (geocode.py --url)")
+parser.add_argument('-c', '--cache', default=None, help="SQLite geocode cache (geocode.py --cache)")
+parser.add_argument('--geocodeWorkers', type=int, default=1, help="batches in flight (geocode.py --workers)")
+# join_adi.py
+parser.add_argument('-i', '--index', default=None, help="compiled block group index (join_adi.py --index)")
+parser.add_argument('-r', '--resources', default=RESOURCES, help="state resources (join_adi.py --resources)")
+parser.add_argument('-l', '--levels', nargs='+', default=[], type=str.upper, choices=['TRACT', 'COUNTY', 'STATE'],
+                    help="larger geographies to add (join_adi.py --levels)")
+parser.add_argument('-e', '--engine', default='grid', choices=['grid', 'strtree'],
+                    help="point-in-polygon engine (join_adi.py --engine)")
+parser.add_argument('-w', '--workers', type=int, default=1, help="join worker processes (join_adi.py --workers)")
+parser.add_argument('-n', '--nearest', type=float, default=None, metavar='METERS',
+                    help="nearest block group fallback (join_adi.py --nearest)")
+
+
+
+# --- Stages ---
+
+def geocode_stage(infile, geocode_argv, outdir, format, save):
+    import geocode
+    from table_io import read_table, write_table
+    options = geocode.parser.parse_args([infile, '-o', outdir] + (['-f', format] if format else []) + geocode_argv)
+    if options.stream:
+        print("ERROR: --stream writes its output as it goes; run geocode.py on its own for streaming")
+        exit(1)
+    geocode.checkInput(options)
+    geocode.setup(options)
+    df = geocode.geocodeTable(read_table(infile))
+    geocode.teardown()
+    if save:
+        write_table(df, geocode.OUTFILE)
+    shutil.rmtree(geocode.JOURNAL_DIR)
+    return df, os.path.basename(geocode.OUTFILE)
+
+def run_pipeline(infile, stages=STAGES, geocode_argv=(), index_path=None, resources=RESOURCES, engine='grid',
+                 workers=1, levels=(), nearest=None, format=None, outdir='results', save=True):
+    # Returns (the last stage's DataFrame, {step: seconds})
+    if not os.path.exists(infile) or not os.path.isfile(infile):
+        print("ERROR: infile not found: " + infile)
+        exit(1)
+    os.makedirs(outdir, exist_ok=True)
+    from table_io import read_table, with_format
+    timings = {}
+    name = os.path.basename(infile)
+    df = None
+
+    if 'geocode' in stages:
+        start = time.perf_counter()
+        df, name = geocode_stage(infile, list(geocode_argv), outdir, format, save)
+        timings['geocode'] = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        df = read_table(infile)
+        timings['read input'] = time.perf_counter() - start
+
+    index = None
+    if 'join' in stages or 'plot' in stages:
+        from join_adi import load_adi_index
+        start = time.perf_counter()
+        index = load_adi_index(index_path, resources, engine, workers)
+        timings['load block groups'] = time.perf_counter() - start
+
+    if 'join' in stages:
+        from join_adi import join_adi, write_results
+        start = time.perf_counter()
+        df = join_adi(df, index, levels, nearest)
+        if save:
+            write_results(df, name, levels, format, outdir)
+        name = with_format('ADI_' + name, format)
+        timings['join'] = time.perf_counter() - start
+
+    if 'plot' in stages:
+        from plot_adi import census_blocks_for, plot_adi
+        start = time.perf_counter()
+        plot_adi(df, census_blocks_for(df, index), outdir)
+        timings['plot'] = time.perf_counter() - start
+
+    # States a registry loads on first use count as loading, not as the stage that touched them first
+    load_seconds = getattr(index, 'load_seconds', 0.0)
+    if load_seconds:
+        timings['load block groups'] += load_seconds
+        for stage in ['join', 'plot']:
+            if stage in timings:
+                timings[stage] -= min(load_seconds, timings[stage])
+                break
+    return df, timings
+
+def print_timings(timings):
+    print("\nStage timings:")
+    for step, seconds in timings.items():
+        print(f"  {step:<18} {seconds:>8.3f}s")
+    print(f"  {'total':<18} {sum(timings.values()):>8.3f}s")
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+
+    stages = [stage for stage in STAGES if stage in args.stages]
+    if stages != STAGES[STAGES.index(stages[0]):STAGES.index(stages[-1]) + 1]:
+        print(f"ERROR: stages must be consecutive: {' -> '.join(STAGES)}")
+        exit(1)
+
+    geocode_argv = ['-w', str(args.geocodeWorkers), '-b', args.backend]
+    if args.reference:
+        geocode_argv += ['--reference', args.reference]
+    if args.url:
+        geocode_argv += ['-u', args.url]
+    if args.cache:
+        geocode_argv += ['-c', args.cache]
+
+    df, timings = run_pipeline(args.infile, stages, geocode_argv, args.index, args.resources, args.engine,
+                               args.workers, args.levels, args.nearest, args.format, args.outputPath,
+                               not args.noSave)
+    print_timings(timings)
+
+
+
+if __name__ == "__main__":
+    main()
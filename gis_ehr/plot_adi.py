@@ -3,125 +3,155 @@
 #Imports
 import argparse
 import os
-import numpy as np
-import pandas as pd
-import geopandas as gpd
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
 
+# pandas, geopandas, plotly and matplotlib are imported by the functions that use them,
+# so --help and a bad path don't wait for them
+from defaults import RESOURCES
+from join_adi import load_adi_index
 
-# --- Load in csv ---
+
+# --- Load in table ---
 
 description = "Plot addresses and ADI metrics spatially"
 parser = argparse.ArgumentParser(description=description)
-parser.add_argument('infile', help="path to input CSV")
-args = parser.parse_args()
-
-if not os.path.exists(args.infile) or not os.path.isfile(args.infile):
-    print("ERROR: infile not found: " + args.infile)
-    exit(1)
-
-df = pd.read_csv(args.infile)
-
-if df is None:
-    print("ERROR: df is type None.")
-    exit(1)
-
-
-# --- Scatterplot of data ---
-
-def convert_adi(adi):
-    try:
-        return float(adi)
-    except ValueError:
-        return np.nan
-
-df['ADI_NAT_20_numeric'] = df['ADI_NAT_20'].apply(convert_adi)
-colors = ['black' if pd.isna(adi) else adi for adi in df['ADI_NAT_20_numeric']]
-
-# Create scatter plot
-scatterPlot = go.Figure(data=go.Scattergeo(
-    lon = df['location_x'],
-    lat = df['location_y'],
-    mode = 'markers',
-    marker = dict(
-        line = dict(width=1, color='rgba(0, 0, 0)'),
-        color = colors,
-        colorbar_title="ADI_NAT_20",
+parser.add_argument('infile', help="path to input CSV, Parquet or Feather file")
+parser.add_argument('-i', '--index', default=None,
+                    help="compiled block group index to draw polygons from, instead of the registered states")
+parser.add_argument('-r', '--resources', default=RESOURCES,
+                    help="directory with each state's block group and ADI files (see state_registry.py)")
+
+# Only the columns the plots use; FIPS and the ADI ranks are read as strings (see table_io.py)
+PLOT_COLUMNS = ['location_x', 'location_y', 'FIPS', 'ADI_NAT_20', 'ADI_ST_20']
+
+def read_input(infile):
+    if not os.path.exists(infile) or not os.path.isfile(infile):
+        print("ERROR: infile not found: " + infile)
+        exit(1)
+
+    from table_io import read_table
+    df = read_table(infile, PLOT_COLUMNS)
+
+    if df is None:
+        print("ERROR: df is type None.")
+        exit(1)
+    return df
+
+
+
+# --- Census Block Group polygons ---
+
+def census_blocks_for(df, index):
+    # FIPS + geometry of the block groups to draw, from a loaded BlockGroupIndex or StateRegistry
+    # (the compiled GeoParquet, not the shapefile); a registry loads only the states df has FIPS in
+    from state_registry import StateRegistry
+    if isinstance(index, StateRegistry):
+        return index.block_groups(df['FIPS'].dropna().astype(str).str[:2].unique())
+    return index.block_groups()
+
+
+
+# --- Plots ---
+
+def plot_adi(df, census_blocks, outdir='results'):
+    # Writes scatterplot.png and choroplethPlots.png to outdir.
+    import pandas as pd
+    import geopandas as gpd
+    import plotly.graph_objects as go
+    import matplotlib.pyplot as plt
+    from adi_table import encode_ranks, numeric_ranks
+
+    # Ranks joined in memory are categoricals (see adi_table.py); plain strings keep the legends to the values present
+    df = df[PLOT_COLUMNS].astype({'ADI_NAT_20': object, 'ADI_ST_20': object})
+
+    # Scatterplot of data
+    # Ranks as numbers, NaN for GQ, PH, GQ-PH and QDI (see adi_table.py)
+    df['ADI_NAT_20_numeric'] = numeric_ranks(encode_ranks(df['ADI_NAT_20']))
+    colors = ['black' if pd.isna(adi) else adi for adi in df['ADI_NAT_20_numeric']]
+
+    # Create scatter plot
+    scatterPlot = go.Figure(data=go.Scattergeo(
+        lon = df['location_x'],
+        lat = df['location_y'],
+        mode = 'markers',
+        marker = dict(
+            line = dict(width=1, color='rgba(0, 0, 0)'),
+            color = colors,
+            colorbar_title="ADI_NAT_20",
+        )
+    ))
+
+    scatterPlot.update_layout(
+        title='Addresses, colored by ADI_NAT_20 (Black if NA)',
+        geo_scope='usa'
     )
-))
-
-scatterPlot.update_layout(
-    title='Addresses, colored by ADI_NAT_20 (Black if NA)',
-    geo_scope='usa'
-)
-
-scatterPlot.write_image('results/scatterplot.png')
-
 
+    scatterPlot.write_image(os.path.join(outdir, 'scatterplot.png'))
 
-# --- Load in and merge MO Census Block Group shapefile ---
+    # Merge with the Census Block Group polygons
+    df_filtered = df[~pd.isna(df['ADI_NAT_20'])]
 
-shp = gpd.read_file('resources/tl_2020_29_bg20.shp')
-shp.rename(columns={'GEOID20':'FIPS'}, inplace=True)
-census_blocks = shp.loc[:, ['FIPS', 'geometry']]
-census_blocks['FIPS'] = census_blocks['FIPS'].astype(str)
+    # Establish generous window for later plots
+    x_range = max(df_filtered['location_x']) - min(df_filtered['location_x'])
+    x_window = [min(df_filtered['location_x']) - 0.01 - x_range/2, 
+                max(df_filtered['location_x']) + 0.01 + x_range/2]
+    y_range = max(df_filtered['location_y']) - min(df_filtered['location_y'])
+    y_window = [min(df_filtered['location_y']) - 0.01 - y_range/2, 
+                max(df_filtered['location_y']) + 0.01 + y_range/2]
+    window = [x_window, y_window]
 
-df_filtered = df[~pd.isna(df['ADI_NAT_20'])]
+    # Groupby to get counts
+    fips_summary = df.groupby(['FIPS', 'ADI_NAT_20', 'ADI_ST_20', 'ADI_NAT_20_numeric'], dropna=False).size()
+    fips_summary = fips_summary.reset_index(name='Count').dropna(subset=['FIPS', 'ADI_NAT_20', 'ADI_ST_20'])
 
-# Establish generous window for later plots
-x_range = max(df_filtered['location_x']) - min(df_filtered['location_x'])
-x_window = [min(df_filtered['location_x']) - 0.01 - x_range/2, 
-            max(df_filtered['location_x']) + 0.01 + x_range/2]
-y_range = max(df_filtered['location_y']) - min(df_filtered['location_y'])
-y_window = [min(df_filtered['location_y']) - 0.01 - y_range/2, 
-            max(df_filtered['location_y']) + 0.01 + y_range/2]
-window = [x_window, y_window]
+    merged_df = fips_summary.merge(census_blocks, on='FIPS')
 
-# Groupby to get counts
-fips_summary = df.groupby(['FIPS', 'ADI_NAT_20', 'ADI_ST_20']).size().reset_index(name='Count')
-fips_summary['FIPS'] = fips_summary['FIPS'].astype(int).astype(str)
+    merged_gdf = gpd.GeoDataFrame(merged_df, crs=census_blocks.crs)
 
-merged_df = fips_summary.merge(census_blocks, on='FIPS')
+    # Separate ADI numeric and string error codes
+    adiNum_merged_gdf = merged_gdf[merged_gdf['ADI_NAT_20_numeric'].notna()]
+    adiString_merged_gdf = merged_gdf[merged_gdf['ADI_NAT_20_numeric'].isna()]
 
-merged_gdf = gpd.GeoDataFrame(merged_df, crs=census_blocks.crs)
+    # Choropleth plots
 
-# Separate ADI numeric and string error codes
-merged_gdf['ADI_NAT_20_numeric'] = pd.to_numeric(merged_gdf['ADI_NAT_20'], errors='coerce')
-adiNum_merged_gdf = merged_gdf[merged_gdf['ADI_NAT_20_numeric'].notna()]
-adiString_merged_gdf = merged_gdf[merged_gdf['ADI_NAT_20_numeric'].isna()]
+    plt.figure(figsize=[10,5])
+    fig, axs = plt.subplots(2, 2)
 
+    # Count
+    ax_count = axs[0,0]
+    ax_count.set_title("Counts by CBG")
+    ax_count.set_xlim(x_window)
+    ax_count.set_ylim(y_window)
+    merged_gdf.plot(column='Count', edgecolor='black', legend=True, ax=ax_count)
 
+    # Blank
+    axs[0, 1].axis('off')
 
-# --- Choropleth plots ---
+    # ADI numeric
+    ax_adiNum = axs[1,0]
+    ax_adiNum.set_title("ADI (Numeric) by CBG")
+    ax_adiNum.set_xlim(x_window)
+    ax_adiNum.set_ylim(y_window)
+    adiNum_merged_gdf.plot(column='ADI_NAT_20_numeric', edgecolor='black', legend=True, ax=ax_adiNum)
 
-plt.figure(figsize=[10,5])
-fig, axs = plt.subplots(2, 2)
 
-# Count
-ax_count = axs[0,0]
-ax_count.set_title("Counts by CBG")
-ax_count.set_xlim(x_window)
-ax_count.set_ylim(y_window)
-merged_gdf.plot(column='Count', edgecolor='black', legend=True, ax=ax_count)
+    # ADI string errors
+    ax_adiStr = axs[1,1]
+    ax_adiStr.set_title("ADI Errors")
+    ax_adiStr.set_xlim(x_window)
+    ax_adiStr.set_ylim(y_window)
+    adiString_merged_gdf.plot(column='ADI_NAT_20', edgecolor='black', legend=True, ax=ax_adiStr)
 
-# Blank
-axs[0, 1].axis('off')
+    plt.tight_layout()
+    plt.savefig(os.path.join(outdir, 'choroplethPlots.png'))
+    plt.close('all')
 
-# ADI numeric
-ax_adiNum = axs[1,0]
-ax_adiNum.set_title("ADI (Numeric) by CBG")
-ax_adiNum.set_xlim(x_window)
-ax_adiNum.set_ylim(y_window)
-adiNum_merged_gdf.plot(column='ADI_NAT_20_numeric', edgecolor='black', legend=True, ax=ax_adiNum)
+def main(argv=None):
+    args = parser.parse_args(argv)
+    df = read_input(args.infile)
+    index = load_adi_index(args.index, args.resources)
+    plot_adi(df, census_blocks_for(df, index))
 
 
-# ADI string errors
-ax_adiStr = axs[1,1]
-ax_adiStr.set_title("ADI Errors")
-ax_adiStr.set_xlim(x_window)
-ax_adiStr.set_ylim(y_window)
-adiString_merged_gdf.plot(column='ADI_NAT_20', edgecolor='black', legend=True, ax=ax_adiStr)
 
-plt.tight_layout()
-plt.savefig('results/choroplethPlots.png')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
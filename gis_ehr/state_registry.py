@@ -0,0 +1,218 @@
+# Registry of per-state block group shapefiles and ADI tables, for joining addresses from any state.
+# A state is registered when its files are in resources/, named the way the Census and the
+# Neighborhood Atlas name their downloads:
+#   tl_2020_<state FIPS>_bg20.shp (+ .shx, .dbf, .prj)        e.g. tl_2020_17_bg20.shp for Illinois
+#   <state>_2020_ADI_Census_Block_Group_v4_0_1.csv            e.g. IL_2020_ADI_Census_Block_Group_v4_0_1.csv
+# or when adi_index.py has compiled them into resources/compiled/tl_2020_<state FIPS>_bg20.
+#
+# Only each state's bounding box is read up front (from the .shx header, or the compiled GeoParquet
+# metadata). Points are routed to the states whose box contains them, and a state's polygons are
+# loaded the first time a point falls in its box, so memory and startup grow with the states touched.
+#
+# List the registered states, or compile every state that doesn't have a compiled index yet:
+#   python state_registry.py
+#   python state_registry.py --compile
+
+# Imports
+import argparse
+import glob
+import json
+import os
+import struct
+import time
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from adi_index import BLOCK_GROUPS_FILE, BlockGroupIndex, join_fips, match_nearest, search_degrees, shapefile_files
+from adi_table import AdiTable
+from defaults import RESOURCES
+
+STATE_ABBREVIATIONS = {
+    '01': 'AL', '02': 'AK', '04': 'AZ', '05': 'AR', '06': 'CA', '08': 'CO', '09': 'CT', '10': 'DE',
+    '11': 'DC', '12': 'FL', '13': 'GA', '15': 'HI', '16': 'ID', '17': 'IL', '18': 'IN', '19': 'IA',
+    '20': 'KS', '21': 'KY', '22': 'LA', '23': 'ME', '24': 'MD', '25': 'MA', '26': 'MI', '27': 'MN',
+    '28': 'MS', '29': 'MO', '30': 'MT', '31': 'NE', '32': 'NV', '33': 'NH', '34': 'NJ', '35': 'NM',
+    '36': 'NY', '37': 'NC', '38': 'ND', '39': 'OH', '40': 'OK', '41': 'OR', '42': 'PA', '44': 'RI',
+    '45': 'SC', '46': 'SD', '47': 'TN', '48': 'TX', '49': 'UT', '50': 'VT', '51': 'VA', '53': 'WA',
+    '54': 'WV', '55': 'WI', '56': 'WY', '72': 'PR',
+}
+
+
+
+# --- Resource paths ---
+
+def shapefile_path(state, resources=RESOURCES):
+    return os.path.join(resources, f'tl_2020_{state}_bg20.shp')
+
+def adi_path(state, resources=RESOURCES):
+    return os.path.join(resources, f'{STATE_ABBREVIATIONS[state]}_2020_ADI_Census_Block_Group_v4_0_1.csv')
+
+def compiled_path(state, resources=RESOURCES):
+    return os.path.join(resources, 'compiled', f'tl_2020_{state}_bg20')
+
+def header_bounds(path):
+    # The .shp/.shx header stores the file's bounding box at bytes 36-68 (xmin, ymin, xmax, ymax)
+    with open(path, 'rb') as f:
+        return struct.unpack('<4d', f.read(100)[36:68])
+
+def compiled_bounds(path):
+    geo = json.loads(pq.read_schema(os.path.join(path, BLOCK_GROUPS_FILE)).metadata[b'geo'])
+    return tuple(geo['columns']['geometry']['bbox'])
+
+
+
+# --- Registry ---
+
+class StateRegistry:
+
+    def __init__(self, resources=RESOURCES, engine=True, workers=1):
+        self.resources = resources
+        self.engine = engine
+        self.workers = workers
+        self.bounds = {}
+        self.indexes = {}
+        self.load_seconds = 0.0
+        for state in STATE_ABBREVIATIONS:
+            compiled = compiled_path(state, resources)
+            shx = os.path.splitext(shapefile_path(state, resources))[0] + '.shx'
+            if os.path.isdir(compiled):
+                self.bounds[state] = compiled_bounds(compiled)
+            elif os.path.isfile(shx) and os.path.isfile(adi_path(state, resources)):
+                self.bounds[state] = header_bounds(shx)
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes.values())
+
+    def states(self):
+        return list(self.bounds)
+
+    def source_files(self):
+        # Each registered state's compiled index, or its shapefile and ADI table
+        files = []
+        for state in self.bounds:
+            compiled = compiled_path(state, self.resources)
+            if os.path.isdir(compiled):
+                files.append(compiled)
+            else:
+                files += shapefile_files(shapefile_path(state, self.resources)) + [adi_path(state, self.resources)]
+        return files
+
+    def index(self, state):
+        # Loads a state's index the first time it is needed
+        if state not in self.indexes:
+            start = time.perf_counter()
+            compiled = compiled_path(state, self.resources)
+            if os.path.isdir(compiled):
+                self.indexes[state] = BlockGroupIndex.load(compiled, self.engine)
+            else:
+                self.indexes[state] = BlockGroupIndex.from_sources(shapefile_path(state, self.resources),
+                                                                   adi_path(state, self.resources))
+            self.indexes[state].workers = self.workers
+            self.load_seconds += time.perf_counter() - start
+            print(f"Loaded {STATE_ABBREVIATIONS[state]}: {len(self.indexes[state])} block groups")
+        return self.indexes[state]
+
+    def route(self, x, y, margin=0.0):
+        # Returns {state: boolean mask of the points inside its bounding box (grown by margin degrees)},
+        # for states with any
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        routes = {}
+        for state, (xmin, ymin, xmax, ymax) in self.bounds.items():
+            inside = (x >= xmin - margin) & (x <= xmax + margin) & (y >= ymin - margin) & (y <= ymax + margin)
+            if inside.any():
+                routes[state] = inside
+        return routes
+
+    def locate(self, x, y):
+        # Returns (point index, FIPS) for every point inside a block group of a registered state
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        pending = np.ones(len(x), dtype=bool)
+        point_parts, fips_parts = [], []
+        for state, inside in self.route(x, y).items():
+            # Boxes of neighbouring states overlap; points already placed don't need another state
+            rows = np.flatnonzero(inside & pending)
+            if len(rows) == 0:
+                continue
+            index = self.index(state)
+            point_idx, polygon_idx = index.locate(x[rows], y[rows])
+            point_parts.append(rows[point_idx])
+            fips_parts.append(index.fips[polygon_idx])
+            pending[rows[point_idx]] = False
+
+        unplaced = (pending & ~np.isnan(x) & ~np.isnan(y)).sum()
+        if unplaced:
+            print(f"{unplaced} points are not in a block group of any registered state "
+                  f"({', '.join(STATE_ABBREVIATIONS[s] for s in self.bounds) or 'none'})")
+        if not point_parts:
+            return np.array([], dtype=int), np.array([], dtype=object)
+        point_idx = np.concatenate(point_parts)
+        order = np.argsort(point_idx, kind='stable')
+        return point_idx[order], np.concatenate(fips_parts)[order]
+
+    def block_groups(self, states=None):
+        # Block group polygons of these states (default: the ones loaded so far), as one GeoDataFrame
+        import geopandas as gpd
+        states = list(self.indexes) if states is None else [state for state in states if state in self.bounds]
+        frames = [self.index(state).block_groups() for state in states]
+        if not frames:
+            return gpd.GeoDataFrame({'FIPS': []}, geometry=[])
+        return pd.concat(frames, ignore_index=True)
+
+    @property
+    def adi(self):
+        # ADI rows of the states loaded so far, which covers every FIPS locate() can return
+        return AdiTable.concat(index.adi for index in self.indexes.values())
+
+    def locate_nearest(self, x, y, max_meters):
+        # Nearest block group within max_meters, across every registered state near each point
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        best_fips = np.full(len(x), None, dtype=object)
+        best_meters = np.full(len(x), np.inf)
+        valid = ~np.isnan(x) & ~np.isnan(y)
+        if not valid.any():
+            return np.array([], dtype=int), best_fips[:0], best_meters[:0]
+        for state, inside in self.route(x, y, search_degrees(y[valid], max_meters)).items():
+            rows = np.flatnonzero(inside)
+            near_idx, fips, meters = self.index(state).locate_nearest(x[rows], y[rows], max_meters)
+            closer = meters < best_meters[rows[near_idx]]
+            best_fips[rows[near_idx[closer]]] = fips[closer]
+            best_meters[rows[near_idx[closer]]] = meters[closer]
+        found = np.flatnonzero(np.isfinite(best_meters))
+        return found, best_fips[found], best_meters[found]
+
+    def join(self, df, nearest=None):
+        x, y = df['location_x'].values, df['location_y'].values
+        point_idx, fips = self.locate(x, y)
+        if nearest is None:
+            return join_fips(df, point_idx, fips, self.adi)
+        point_idx, fips, match = match_nearest(x, y, point_idx, fips, self.locate_nearest, nearest)
+        return join_fips(df, point_idx, fips, self.adi, match)
+
+
+
+if __name__ == "__main__":
+    description = "List the states with block group and ADI resources, optionally compiling them"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-r', '--resources', default=RESOURCES, help="directory holding the state resources")
+    parser.add_argument('--compile', action='store_true', help="compile every state without a compiled index")
+    args = parser.parse_args()
+
+    registry = StateRegistry(args.resources)
+    for state, bounds in registry.bounds.items():
+        compiled = compiled_path(state, args.resources)
+        if args.compile and not os.path.isdir(compiled):
+            start = time.perf_counter()
+            BlockGroupIndex.from_sources(shapefile_path(state, args.resources),
+                                         adi_path(state, args.resources)).save(compiled)
+            print(f"Compiled {compiled} in {time.perf_counter() - start:.2f}s")
+        status = "compiled" if os.path.isdir(compiled) else "shapefile"
+        print(f"{STATE_ABBREVIATIONS[state]} ({state}): {status}, bbox {tuple(round(b, 3) for b in bounds)}")
+
+    missing = [path for path in glob.glob(os.path.join(args.resources, 'tl_2020_*_bg20.shx'))
+               if os.path.basename(path)[8:10] not in registry.bounds]
+    for path in missing:
+        print(f"{path} has no matching ADI table, skipped")
@@ -0,0 +1,149 @@
+# Local stand-in for the ArcGIS geocodeAddresses endpoint.
+# Used to test and benchmark geocode.py without the WUSTL network.
+# Faults can be injected: HTTP 503s, ArcGIS-style error bodies, stalled responses,
+# a batch-size limit (anything larger gets an error), and a 4xx status for every batch (as for a bad token),
+# to exercise retries and adaptive batching.
+
+# Imports
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+GEOCODE_PATH = "/arcgis/rest/services/USA/GeocodeServer/geocodeAddresses"
+
+
+
+# --- Fake geocoding ---
+
+def parseAddresses(addresses):
+    # The addresses form field, as JSON (see arcgis_payload.py)
+    return json.loads(addresses)
+
+def fakeLocation(attributes):
+    # Deterministic coordinates around St. Louis, so repeated runs can be compared
+    text = " ".join(str(attributes.get(k, "")) for k in ["address", "city", "region", "postal", "SingleLine"])
+    h = zlib.crc32(text.encode("utf-8"))
+    location_x = -90.5 + (h % 10000) / 20000
+    location_y = 38.4 + (h // 10000 % 10000) / 20000
+    address = ", ".join(str(attributes[k]) for k in ["address", "city", "region", "postal"] if k in attributes)
+    # An address without a ZIP is a weaker match
+    has_zip = attributes.get("postal") or re.search(r"\d{5}(?:-\d{4})?\s*$", str(attributes.get("SingleLine") or ""))
+    return {
+        "address": attributes.get("SingleLine", address),
+        "location": {"x": location_x, "y": location_y},
+        "score": 100 if has_zip else 80,
+        "attributes": {"ResultID": attributes.get("ObjectID"), "Status": "M"}
+    }
+
+
+
+# --- Server ---
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+    error_rate = 0.0
+    slow_rate = 0.0
+    slow_latency = 5.0
+    max_batch = None
+    reject_status = None
+    rng = random.Random()
+    counts = None
+
+    def do_POST(self):
+        if self.path != GEOCODE_PATH:
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        try:
+            records = parseAddresses(form["addresses"][0])["records"]
+        except (KeyError, ValueError):
+            self.sendJson(400, {"error": {"code": 400, "message": "addresses must be a JSON object of records"}})
+            return
+        self.counts["requests"] += 1
+
+        # Simulate the server's processing time for one batch, sometimes stalling
+        roll = self.rng.random()
+        time.sleep(self.slow_latency if roll < self.slow_rate else self.latency)
+
+        roll = self.rng.random()
+        if self.reject_status is not None:
+            self.counts["failed"] += 1
+            self.sendJson(self.reject_status, {"error": {"code": self.reject_status, "message": "Request rejected."}})
+        elif roll < self.fail_rate:
+            self.counts["failed"] += 1
+            self.sendJson(503, {"error": "Service Unavailable"})
+        elif roll < self.fail_rate + self.error_rate:
+            self.counts["failed"] += 1
+            self.sendJson(200, {"error": {"code": 500, "message": "Unable to complete operation."}})
+        elif self.max_batch is not None and len(records) > self.max_batch:
+            self.counts["failed"] += 1
+            self.sendJson(200, {"error": {"code": 500, "message": f"Batch of {len(records)} is too large."}})
+        else:
+            self.sendJson(200, {"locations": [fakeLocation(r["attributes"]) for r in records]})
+
+    def sendJson(self, status, content):
+        body = json.dumps(content).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timed out) while we were stalling
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def startServer(port=0, latency=0.0, fail_rate=0.0, error_rate=0.0, slow_rate=0.0, slow_latency=5.0,
+                max_batch=None, reject_status=None, seed=None):
+    # Starts the stub in a background thread; returns (server, url)
+    # server.counts tracks requests received and failures injected
+    handler = type("StubHandler", (StubHandler,), {
+        "latency": latency, "fail_rate": fail_rate, "error_rate": error_rate,
+        "slow_rate": slow_rate, "slow_latency": slow_latency, "max_batch": max_batch,
+        "reject_status": reject_status,
+        "rng": random.Random(seed), "counts": {"requests": 0, "failed": 0}})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.counts = handler.counts
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}{GEOCODE_PATH}"
+    return server, url
+
+
+
+if __name__ == "__main__":
+    description = "Run a local stub of the ArcGIS geocodeAddresses endpoint"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-p', '--port', type=int, default=8080, help="port to listen on")
+    parser.add_argument('-l', '--latency', type=float, default=0.5,
+                        help="seconds to wait before answering each batch")
+    parser.add_argument('--failRate', type=float, default=0.0, help="fraction of batches answered with HTTP 503")
+    parser.add_argument('--errorRate', type=float, default=0.0,
+                        help="fraction of batches answered with an ArcGIS-style error body")
+    parser.add_argument('--slowRate', type=float, default=0.0, help="fraction of batches that stall")
+    parser.add_argument('--slowLatency', type=float, default=5.0, help="seconds a stalled batch takes")
+    parser.add_argument('--maxBatch', type=int, default=None, help="reject batches larger than this")
+    parser.add_argument('--rejectStatus', type=int, default=None,
+                        help="answer every batch with this HTTP status (e.g. 401 or 413)")
+    args = parser.parse_args()
+
+    server, url = startServer(args.port, args.latency, args.failRate, args.errorRate,
+                              args.slowRate, args.slowLatency, args.maxBatch, args.rejectStatus)
+    print("Stub geocoder listening at", url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,56 @@
+# Write a stand-in for the Census block group shapefile, for testing and benchmarking join_adi.py
+# when the real tl_2020_29_bg20.shp is not at hand (it is too large to keep in the repo).
+# Each block group becomes the Voronoi cell around its real interior point (INTPTLON20/INTPTLAT20
+# from the .dbf we do keep), clipped to the state's bounding box, so FIPS codes, counts, and
+# density match the real file even though the boundaries don't.
+
+# Imports
+import argparse
+import os
+import geopandas as gpd
+import pyogrio
+import shapely
+
+from state_registry import header_bounds
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources')
+
+
+
+# --- Build polygons ---
+
+def syntheticBlockGroups(dbf_path, shx_path, segment_length=0.002):
+    attributes = pyogrio.read_dataframe(dbf_path, read_geometry=False)
+    centers = shapely.points(attributes['INTPTLON20'].astype(float), attributes['INTPTLAT20'].astype(float))
+    state_box = shapely.box(*header_bounds(shx_path))
+
+    cells = shapely.voronoi_polygons(shapely.multipoints(centers), extend_to=state_box)
+    cells = shapely.intersection(shapely.get_parts(cells), state_box)
+    # Voronoi cells come back in arbitrary order; match each cell to the point it contains
+    tree = shapely.STRtree(cells)
+    point_idx, cell_idx = tree.query(centers, predicate='within')
+    geometry = cells[cell_idx[point_idx.argsort()]]
+
+    # Real block group outlines have many vertices; densify so point-in-polygon costs are comparable
+    geometry = shapely.segmentize(geometry, segment_length)
+    return gpd.GeoDataFrame(attributes, geometry=geometry, crs='EPSG:4269')
+
+
+
+if __name__ == "__main__":
+    description = "Write a synthetic block group shapefile from the real .dbf interior points"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('outdir', help="directory to write tl_2020_29_bg20.shp into")
+    parser.add_argument('--name', default='tl_2020_29_bg20', help="base name of the resource files")
+    parser.add_argument('--segmentLength', type=float, default=0.002,
+                        help="densify polygon edges to at most this many degrees")
+    args = parser.parse_args()
+
+    bg = syntheticBlockGroups(os.path.join(RESOURCES, args.name + '.dbf'),
+                              os.path.join(RESOURCES, args.name + '.shx'),
+                              args.segmentLength)
+    os.makedirs(args.outdir, exist_ok=True)
+    outfile = os.path.join(args.outdir, args.name + '.shp')
+    bg.to_file(outfile)
+    print(f"Wrote {len(bg)} synthetic block groups ({shapely.get_num_coordinates(bg.geometry.values).sum()} "
+          f"vertices) to {outfile}")
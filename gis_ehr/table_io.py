@@ -0,0 +1,166 @@
+# Reading and writing the tables the gis_ehr scripts pass to each other, as CSV, Parquet or Feather.
+# The format comes from the file extension (.csv, .parquet, .feather; anything else is read as CSV).
+#
+# Every column the pipeline knows about has an explicit type, whatever the format:
+#   - codes (ZIPs, FIPS, GISJOIN, ADI ranks, which include GQ/PH/QDI) and addresses are strings, so a ZIP
+#     keeps its leading zero and a FIPS never turns into a float
+#   - coordinates, scores and distances are float64 (CSV keeps whatever numbers pandas reads, so a
+#     score of 100 is written back as 100, not 100.0)
+# Other columns (location_id, anything extra in the input) keep the type they are read with.
+# Parquet and Feather also let a reader load only the columns it needs.
+
+# Imports
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from defaults import FORMATS, GEOGRAPHY_LEVELS
+
+# Larger geographies join_adi.py can add
+LEVELS = list(GEOGRAPHY_LEVELS)
+
+TEXT_COLUMNS = (
+    ['address_1', 'address_2', 'city', 'state', 'zip', 'givenCity', 'givenState', 'givenZip',
+     'street_address', 'matched_address', 'status',
+     'FIPS', 'GISJOIN', 'ADI_NAT_20', 'ADI_ST_20', 'match_type']
+    + [level + '_FIPS' for level in LEVELS])
+FLOAT_COLUMNS = (
+    ['location_x', 'location_y', 'score', 'match_distance_m']
+    + [level + suffix for level in LEVELS for suffix in ['_ADI_NAT_MEDIAN', '_ADI_ST_MEDIAN']])
+COUNT_COLUMNS = [level + '_BLOCK_GROUPS' for level in LEVELS] + ['numAddr']
+
+
+
+# --- Formats and schema ---
+
+def table_format(path):
+    return FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+def with_format(path, format=None):
+    # path with its extension swapped for format's; None keeps path as it is
+    if format is None or table_format(path) == format:
+        return path
+    return os.path.splitext(path)[0] + '.' + format
+
+def csv_dtypes(columns=None):
+    # read_csv dtypes for the text columns (restricted to columns, if given)
+    return {c: str for c in TEXT_COLUMNS if columns is None or c in columns}
+
+def as_text(values):
+    # Strings, with missing values as NaN (Parquet gives None) as read_csv has them;
+    # categoricals (the ADI ranks) are already strings
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    if values.dtype != object:
+        values = values.astype(str).astype(object).where(values.notna())
+    return values.where(values.notna(), np.nan)
+
+def apply_schema(df):
+    # Casts the known columns of a frame read from any format (or built in memory) to their types
+    columns = {}
+    for column in df.columns.intersection(TEXT_COLUMNS):
+        columns[column] = as_text(df[column])
+    for column in df.columns.intersection(FLOAT_COLUMNS):
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            columns[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    for column in df.columns.intersection(COUNT_COLUMNS):
+        columns[column] = df[column].astype('Int64')
+    return df.assign(**columns) if columns else df
+
+def arrow_schema(df):
+    # Inferred schema, with the known columns pinned (and all-missing columns typed as strings,
+    # so later chunks with values still fit)
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(schema):
+        if isinstance(df[field.name].dtype, pd.CategoricalDtype):
+            continue
+        if field.name in TEXT_COLUMNS or pa.types.is_null(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.string()))
+        elif field.name in FLOAT_COLUMNS:
+            schema = schema.set(i, pa.field(field.name, pa.float64()))
+    return schema.remove_metadata()
+
+def to_arrow(df, schema=None):
+    df = apply_schema(df)
+    return pa.Table.from_pandas(df, schema=schema or arrow_schema(df), preserve_index=False)
+
+
+
+# --- Reading ---
+
+def table_columns(path):
+    # Column names, without reading any rows
+    format = table_format(path)
+    if format == 'parquet':
+        return pq.read_schema(path).names
+    if format == 'feather':
+        return feather.read_table(path, memory_map=True).schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def read_table(path, columns=None):
+    # columns: load only these (all of them if None)
+    format = table_format(path)
+    if format == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    elif format == 'feather':
+        df = pd.read_feather(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns, dtype=csv_dtypes(columns))
+    return apply_schema(df)
+
+def iter_table(path, chunksize, columns=None):
+    # Yields the table chunksize rows at a time
+    format = table_format(path)
+    if format == 'parquet':
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield apply_schema(batch.to_pandas())
+    elif format == 'feather':
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        for start in range(0, table.num_rows, chunksize):
+            yield apply_schema(table.slice(start, chunksize).to_pandas())
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunksize, usecols=columns, dtype=csv_dtypes(columns)):
+            yield apply_schema(chunk)
+
+
+
+# --- Writing ---
+
+def write_table(df, path):
+    format = table_format(path)
+    if format == 'parquet':
+        pq.write_table(to_arrow(df), path)
+    elif format == 'feather':
+        feather.write_feather(to_arrow(df), path)
+    else:
+        df.to_csv(path, index=False)
+
+class TableWriter:
+    # Appends chunks to one table, for outputs written as they are produced (geocode.py --stream).
+    # Every chunk is cast to the first chunk's schema
+
+    def __init__(self, path):
+        self.path = path
+        self.format = table_format(path)
+        self.schema = None
+        self.writer = None
+        self.rows = 0
+
+    def write(self, df):
+        if self.format == 'csv':
+            df.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        else:
+            table = to_arrow(df, self.schema)
+            if self.writer is None:
+                self.schema = table.schema
+                self.writer = (pq.ParquetWriter(self.path, self.schema) if self.format == 'parquet'
+                               else pa.ipc.new_file(self.path, self.schema))
+            self.writer.write_table(table)
+        self.rows += df.shape[0]
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
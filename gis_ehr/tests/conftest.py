@@ -0,0 +1,29 @@
+# Shared fixtures for the gis_ehr tests. The scripts import each other as top-level modules, so the
+# gis_ehr directory goes on sys.path, as it is when they are run from there.
+# The index fixtures are built from the synthetic block groups in synthetic_index.py.
+
+# Imports
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adi_index import BlockGroupIndex
+from synthetic_index import synthetic_adi, synthetic_block_groups
+
+
+
+# --- Fixtures ---
+
+@pytest.fixture(scope='session')
+def strtree_index():
+    fips, cells = synthetic_block_groups()
+    return BlockGroupIndex(fips, cells, synthetic_adi(fips))
+
+@pytest.fixture(scope='session')
+def compiled_index(tmp_path_factory, strtree_index):
+    # The synthetic index saved and loaded back like a compiled one, with the grid engine
+    path = str(tmp_path_factory.mktemp('compiled'))
+    strtree_index.save(path)
+    return BlockGroupIndex.load(path)
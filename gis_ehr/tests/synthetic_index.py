@@ -0,0 +1,50 @@
+# A small synthetic block group index for the tests. The real block group shapefile isn't kept in the
+# repo, so these are Voronoi cells around random points near St. Louis, densified like real block group
+# outlines, with an ADI table that leaves a few block groups out.
+
+# Imports
+import numpy as np
+import shapely
+
+from adi_table import AdiTable, fips_keys
+from pip_engine import polygon_edges
+
+BOUNDS = (-90.8, 38.4, -90.0, 38.9)
+
+
+
+# --- Synthetic block groups ---
+
+def synthetic_block_groups(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = BOUNDS
+    centers = shapely.points(rng.uniform(xmin, xmax, n), rng.uniform(ymin, ymax, n))
+    box = shapely.box(*BOUNDS)
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(centers), extend_to=box))
+    cells = shapely.segmentize(shapely.intersection(cells, box), 0.005)
+    fips = np.array([f"29510{i:07d}" for i in range(len(cells))], dtype=object)
+    return fips, cells
+
+def synthetic_adi(fips, seed=0, missing=5):
+    # Ranks for all but the last `missing` block groups, with a suppression code (GQ) on the first
+    rng = np.random.default_rng(seed)
+    keys = fips_keys(fips[:len(fips) - missing])
+    nat = rng.integers(1, 101, len(keys))
+    st = rng.integers(1, 11, len(keys))
+    nat[0] = st[0] = -1
+    return AdiTable(keys, nat, st)
+
+def sample_points(geometries, n, seed=0):
+    # Random points over the polygons' bounding box, with 1% exactly on vertices and 1% on edge midpoints
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = shapely.total_bounds(geometries)
+    x = rng.uniform(xmin, xmax, n)
+    y = rng.uniform(ymin, ymax, n)
+    x0, y0, x1, y1, _ = polygon_edges(geometries)
+    k = n // 100
+    vertices = rng.integers(0, len(x0), k)
+    x[:k], y[:k] = x0[vertices], y0[vertices]
+    midpoints = rng.integers(0, len(x0), k)
+    x[k:2 * k] = (x0[midpoints] + x1[midpoints]) / 2
+    y[k:2 * k] = (y0[midpoints] + y1[midpoints]) / 2
+    return x, y
@@ -0,0 +1,77 @@
+# geocodingComparison/abigailScript.py --combined against the local stub server: which mode's match each
+# policy keeps, and the same output when some rows come from the cache. The stub scores an address
+# without a ZIP lower (80) than one with a ZIP (100).
+
+# Imports
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+
+import stub_server
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      'geocodingComparison', 'abigailScript.py')
+
+# (single-line address, separate fields, mode kept with --policy score, with --policy zip)
+ROWS = [
+    # Both have the same ZIP and score: ties go to the multi-line match
+    ("100 Main St, SAINT LOUIS, MO 63110", ("100 Main St", "SAINT LOUIS", "MO", "63110"), "multi", "multi"),
+    # No ZIP in the single line: it scores lower
+    ("101 Main St, SAINT LOUIS, MO", ("101 Main St", "SAINT LOUIS", "MO", "63110"), "multi", "multi"),
+    # No givenZip: the multi-line match scores lower
+    ("102 Main St, SAINT LOUIS, MO 63110", ("102 Main St", "SAINT LOUIS", "MO", ""), "single", "single"),
+    # The single line's ZIP disagrees with givenZip
+    ("103 Main St, SAINT LOUIS, MO 63111", ("103 Main St", "SAINT LOUIS", "MO", "63110"), "multi", "multi"),
+    # givenZip lost its leading zero: only the single line's returned ZIP agrees with it once normalized
+    ("1 Main St, BOSTON, MA 02134", ("1 Main St", "BOSTON", "MA", "2134"), "multi", "single"),
+]
+OUTPUT_COLUMNS = ["Returned Address", "Latitude", "Longitude", "Score", "Status"]
+
+
+
+def write_input(path, rows):
+    pd.DataFrame([(single, *fields) for single, fields, _, _ in rows],
+                 columns=["address", "street_address", "givenCity", "givenState", "givenZip"]).to_csv(path, index=False)
+    return path
+
+def run(infile, outdir, *options):
+    subprocess.run([sys.executable, SCRIPT, infile, '--combined', '--outputPath', outdir, *options],
+                   check=True, stdout=subprocess.DEVNULL)
+    name = os.path.splitext(os.path.basename(infile))[0]
+    return pd.read_csv(os.path.join(outdir, name + '_combined_GEOCODED.csv'), index_col=0, dtype=str,
+                       keep_default_na=False)
+
+@pytest.fixture(scope='module')
+def server():
+    server, url = stub_server.startServer(seed=0)
+    yield server, url
+    server.shutdown()
+
+@pytest.fixture(scope='module')
+def infile(tmp_path_factory):
+    return write_input(str(tmp_path_factory.mktemp('input') / 'addresses.csv'), ROWS)
+
+
+
+@pytest.mark.parametrize('policy, expected', [('score', [r[2] for r in ROWS]), ('zip', [r[3] for r in ROWS])])
+def test_policy_keeps(infile, server, tmp_path, policy, expected):
+    result = run(infile, str(tmp_path), '--url', server[1], '--policy', policy)
+    assert result['Chosen Mode'].tolist() == expected
+    for i, mode in enumerate(expected):
+        prefix = "Single " if mode == "single" else "Multi "
+        assert result.loc[i, OUTPUT_COLUMNS].tolist() == result.loc[i, [prefix + c for c in OUTPUT_COLUMNS]].tolist()
+    assert result['Single Score'].tolist() == ["100", "80", "100", "100", "100"]
+    assert result['Multi Score'].tolist() == ["100", "100", "80", "100", "100"]
+
+def test_cached_rows(infile, server, tmp_path):
+    # Rows 0, 2 and 4 are cached by a first run on just those; the second run sends only rows 1 and 3
+    # and must write what a run without the cache does
+    server, url = server
+    cache = str(tmp_path / 'cache.sqlite')
+    run(write_input(str(tmp_path / 'some.csv'), ROWS[::2]), str(tmp_path / 'some'), '--url', url, '--cache', cache)
+    requests = server.counts['requests']
+    cached = run(infile, str(tmp_path / 'cached'), '--url', url, '--cache', cache, '--policy', 'zip')
+    assert server.counts['requests'] == requests + 2
+    pd.testing.assert_frame_equal(cached, run(infile, str(tmp_path / 'plain'), '--url', url, '--policy', 'zip'))
@@ -0,0 +1,100 @@
+# combine_address_vectorized must give exactly what the row-wise combine_address gives,
+# and normalize_zip must clean up the ZIP spellings seen in the input files.
+
+# Imports
+import random
+import numpy as np
+import pandas as pd
+import pytest
+
+from address_normalize import address_keys, combine_address, combine_address_vectorized, normalize_zip
+
+EDGE_CASES = [
+    # Both missing, one missing (the other is returned unstripped)
+    (np.nan, np.nan),
+    (np.nan, " 6475 Forsyth Blvd "),
+    (" 660 S Euclid Ave ", np.nan),
+    (None, "Apt 2"),
+    # Equal, after stripping
+    ("660 S Euclid Ave", "660 S Euclid Ave"),
+    ("660 S Euclid Ave ", "  660 S Euclid Ave"),
+    # Substrings, both ways, including empty strings
+    ("660 S Euclid Ave", "660 S Euclid Ave Apt 2"),
+    ("660 S Euclid Ave Apt 2", "Apt 2"),
+    ("", "Apt 2"),
+    ("660 S Euclid Ave", ""),
+    ("", ""),
+    ("   ", "Unit 5"),
+    # Digit-leading address_2 goes first
+    ("Becker Library", "660 S Euclid Ave"),
+    ("Suite 100", "1 Brookings Dr"),
+    ("PO Box 12", "2nd Floor"),
+    # Otherwise address_1 then address_2
+    ("48 N 4th St", "Apt 3B"),
+    ("48 N 4th St", "#3"),
+    ("Building A", "Room 12"),
+    # Non-ASCII digits and letters
+    ("Calle Ñandú", "٣ Plaza"),
+]
+
+ZIP_CASES = {"63110": "63110", "63110-1234": "63110", "631101234": "63110", "63110.0": "63110",
+             "6311": "06311", "631": "00631", " 63110 ": "63110", "": "", "UNKNOWN": "UNKNOWN",
+             # Not a ZIP, ZIP+4 or short ZIP: kept, so different values never share a key
+             "1234567": "1234567", "12345678": "12345678", "6311-1234": "6311-1234", "63": "63",
+             "6311012345": "6311012345"}
+
+
+
+@pytest.mark.parametrize('address_1, address_2', EDGE_CASES)
+def test_edge_cases(address_1, address_2):
+    combined = combine_address_vectorized(pd.Series([address_1], dtype=object), pd.Series([address_2], dtype=object))
+    assert combined.tolist() == [combine_address(address_1, address_2)]
+
+def test_random_rows():
+    random.seed(0)
+    streets = ["Main St", "S Euclid Ave", "Forsyth Blvd", "N 4th St", "Pennsylvania Avenue NW"]
+    seconds = ["Apt 2", "Unit 5", "#3", "Suite 100", "2nd Floor", "1 Brookings Dr"]
+
+    def randomAddress1():
+        r = random.random()
+        if r < 0.05:
+            return np.nan
+        return f"{random.randint(1, 9999)} {random.choice(streets)}" + (" " if r < 0.1 else "")
+
+    def randomAddress2(add1):
+        r = random.random()
+        if r < 0.7:
+            return np.nan
+        if r < 0.75 and isinstance(add1, str):
+            return add1.strip()
+        if r < 0.8 and isinstance(add1, str):
+            return add1 + " " + random.choice(seconds)
+        return random.choice(seconds)
+
+    add1 = [randomAddress1() for i in range(20000)]
+    add2 = [randomAddress2(a) for a in add1]
+    expected = [combine_address(a, b) for a, b in zip(add1, add2)]
+    assert combine_address_vectorized(pd.Series(add1, dtype=object), pd.Series(add2, dtype=object)).tolist() == expected
+
+def test_normalize_zip():
+    assert normalize_zip(pd.Series(list(ZIP_CASES))).tolist() == list(ZIP_CASES.values())
+
+def test_normalize_zip_without_zips():
+    # No value is a ZIP, as for the blank ZIPs of single-line cache keys in abigailScript.py
+    assert normalize_zip(pd.Series(["", "", "N/A"])).tolist() == ["", "", "N/A"]
+
+def test_address_keys_ignore_case_and_spacing():
+    keys = address_keys(pd.Series(["660 S Euclid Ave", " 660 s  euclid ave"]), pd.Series(["St Louis", "ST LOUIS "]),
+                        pd.Series(["MO", "mo"]), pd.Series(["63110", "63110-1234"]))
+    assert keys[0] == keys[1]
+
+def test_address_keys_keep_malformed_zips_apart():
+    keys = address_keys(pd.Series(["1 Main St"] * 3), pd.Series(["St Louis"] * 3), pd.Series(["MO"] * 3),
+                        pd.Series(["1234567", "12345", "00123"]))
+    assert keys[0] != keys[2] and keys[1] != keys[2]
+
+def test_long_address_outlier():
+    # One very long address in the column must not change how the others combine
+    add1 = pd.Series(["660 S Euclid Ave", "x" * 100000, "Suite 100"], dtype=object)
+    add2 = pd.Series(["Apt 2", np.nan, "1 Brookings Dr"], dtype=object)
+    assert combine_address_vectorized(add1, add2).tolist() == [combine_address(a, b) for a, b in zip(add1, add2)]
@@ -0,0 +1,70 @@
+# validate_addresses must keep and drop the same rows as the row-wise is_input_valid_result_address,
+# and report the first check each dropped row failed.
+
+# Imports
+import random
+import numpy as np
+import pandas as pd
+import pytest
+
+from address_validate import ADDRESS_FIELDS, is_input_valid_result_address, validate_addresses
+
+# (ADD_LINE_1, ADD_LINE_2, STATE, expected reason or None if kept)
+EDGE_CASES = [
+    ("660 S Euclid Ave", "", "Missouri", None),
+    ("660 S Euclid Ave", "", "missouri ", "state"),
+    ("660 S Euclid Ave", "", "MO", "state"),
+    ("", "", "ILLINOIS", "no_address"),
+    ("n/a", "NA", "ILLINOIS", "no_address"),
+    ("", "Apt 2", "ILLINOIS", None),
+    ("Unknown", "", "TEXAS", "unknown"),
+    ("1 Main St", "address unknown", "TEXAS", "unknown"),
+    ("1 Main St\nUNKNOWN", "", "TEXAS", None),
+    ("Please update", "", "OHIO", "update"),
+    ("UNKNOWN - UPDATE", "", "OHIO", "unknown"),
+    ("PO Box 12", "", "OHIO", "po_box"),
+    ("PO BOX 12", "N/A", "OHIO", "po_box"),
+    ("", "po box 7", "OHIO", "po_box"),
+    ("PO Box 12", "Apt 2", "OHIO", None),
+    ("PO Box 12A", "", "OHIO", None),
+    ("PO Box 12\n", "", "OHIO", "po_box"),
+    ("P.O. Box 12", "", "OHIO", None),
+    ("PO Box ١٢", "", "OHIO", "po_box"),
+]
+
+
+
+@pytest.mark.parametrize('add1, add2, state, expected', EDGE_CASES)
+def test_edge_cases(add1, add2, state, expected):
+    data = pd.DataFrame([(add1, add2, "St Louis", state, "63110")], columns=ADDRESS_FIELDS)
+    keep, reason = validate_addresses(data)
+    assert keep[0] == is_input_valid_result_address(data.iloc[0])
+    assert (None if pd.isna(reason[0]) else reason[0]) == expected
+
+def test_random_rows():
+    random.seed(0)
+    streets = ["Main St", "S Euclid Ave", "Forsyth Blvd", "N 4th St"]
+    second_lines = ["", "", "", "Apt 2", "N/A", "UNKNOWN", "Unit 5"]
+    states = ["MISSOURI", "Illinois", "KANSAS", "MO", "HAWAII", "new york", "", "N/A"]
+
+    def randomAddress1():
+        r = random.random()
+        if r < 0.05:
+            return random.choice(["", "NA", "n/a"])
+        if r < 0.08:
+            return random.choice(["UNKNOWN", "Address Unknown", "NEEDS UPDATE"])
+        if r < 0.12:
+            return f"PO Box {random.randint(1, 9999)}"
+        return f"{random.randint(1, 9999)} {random.choice(streets)}"
+
+    n = 5000
+    data = pd.DataFrame({
+        "ADD_LINE_1": [randomAddress1() for i in range(n)],
+        "ADD_LINE_2": [random.choice(second_lines) for i in range(n)],
+        "CITY": "St Louis",
+        "STATE": [random.choice(states) for i in range(n)],
+        "ZIP": "63110",
+    })
+    keep, reason = validate_addresses(data)
+    assert np.array_equal(data.apply(is_input_valid_result_address, axis=1).to_numpy(dtype=bool), keep)
+    assert reason.isna().to_numpy().tolist() == keep.tolist()
@@ -0,0 +1,63 @@
+# Nearest block group fallback (join_adi.py --nearest), for one index and across the state registry,
+# including points with no block group anywhere near them.
+
+# Imports
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from adi_index import BlockGroupIndex
+from state_registry import StateRegistry, compiled_path
+from synthetic_index import synthetic_adi, synthetic_block_groups
+
+# Outside Missouri (the White House), and well past any synthetic block group
+WHITE_HOUSE = (-77.0365, 38.8977)
+
+
+
+@pytest.fixture(scope='module')
+def holed():
+    # The synthetic block groups with one interior cell left out, and a point in the middle of that hole
+    fips, cells = synthetic_block_groups()
+    hole = int(np.argmin(shapely.distance(cells, shapely.centroid(shapely.union_all(cells)))))
+    keep = np.arange(len(cells)) != hole
+    index = BlockGroupIndex(fips[keep], cells[keep], synthetic_adi(fips))
+    point = shapely.get_coordinates(shapely.point_on_surface(cells[hole]))[0]
+    meters_to_edge = shapely.distance(cells[hole].boundary, shapely.Point(point)) * 111000 * np.cos(np.radians(38.6))
+    return index, point, meters_to_edge
+
+def points_frame(*points):
+    x, y = zip(*points)
+    return pd.DataFrame({'location_id': np.arange(len(points)), 'location_x': x, 'location_y': y})
+
+
+
+def test_locate_nearest_without_matches(holed):
+    index, point, meters_to_edge = holed
+    for x, y in [point, WHITE_HOUSE]:
+        point_idx, fips, meters = index.locate_nearest([x], [y], meters_to_edge / 4)
+        assert len(point_idx) == len(fips) == len(meters) == 0
+
+def test_locate_nearest_within_reach(holed):
+    index, point, meters_to_edge = holed
+    point_idx, fips, meters = index.locate_nearest([point[0], WHITE_HOUSE[0]], [point[1], WHITE_HOUSE[1]],
+                                                   meters_to_edge * 4)
+    assert point_idx.tolist() == [0]
+    assert 0 < meters[0] <= meters_to_edge * 4
+
+def test_join_nearest_without_matches(holed):
+    index, point, meters_to_edge = holed
+    joined = index.join(points_frame(point, WHITE_HOUSE, (np.nan, np.nan)), nearest=meters_to_edge / 4)
+    assert joined['match_type'].tolist() == ['none', 'none', 'none']
+    assert joined['FIPS'].isna().all()
+
+def test_registry_nearest_without_matches(tmp_path, holed):
+    # A point inside Missouri's bounding box with no block group within reach
+    index, point, meters_to_edge = holed
+    index.save(compiled_path('29', str(tmp_path)))
+    registry = StateRegistry(str(tmp_path))
+    joined = registry.join(points_frame(point, WHITE_HOUSE), nearest=meters_to_edge / 4)
+    assert joined['match_type'].tolist() == ['none', 'none']
+    joined = registry.join(points_frame(point, WHITE_HOUSE), nearest=meters_to_edge * 4)
+    assert joined['match_type'].tolist() == ['nearest', 'none']
@@ -0,0 +1,61 @@
+# lookup and lookup_many must agree, in-process and through the local service.
+
+# Imports
+import numpy as np
+import pytest
+import requests
+
+from adi_lookup import LOOKUP_COLUMNS, AdiLookup, startServer
+from synthetic_index import sample_points
+
+
+
+@pytest.fixture(scope='module')
+def lookup(compiled_index):
+    return AdiLookup(index=compiled_index)
+
+@pytest.fixture(scope='module')
+def points(lookup):
+    return sample_points(lookup.index.geometries, 2000, seed=1)
+
+def test_lookup_many_matches_lookup(lookup, points):
+    lons, lats = points
+    many = lookup.lookup_many(lons, lats)
+    assert many['FIPS'].notna().any()
+    for i in range(len(lons)):
+        assert lookup.lookup(lons[i], lats[i]) == tuple(many.loc[i, LOOKUP_COLUMNS]), i
+
+def test_service_matches_lookup(lookup, points):
+    lons, lats = points[0][:200], points[1][:200]
+    server, url = startServer(lookup, port=0)
+    try:
+        with requests.Session() as session:
+            many = session.post(url + "/lookup_many", json={"lon": lons.tolist(), "lat": lats.tolist()}).json()
+            for i in range(0, len(lons), 20):
+                single = session.get(url + "/lookup", params={"lon": lons[i], "lat": lats[i]}).json()
+                assert single == {column: many[column][i] for column in LOOKUP_COLUMNS}
+                assert tuple(single.values()) == lookup.lookup(lons[i], lats[i])
+            assert session.get(url + "/lookup", params={"lon": "x"}).status_code == 400
+    finally:
+        server.shutdown()
+
+@pytest.mark.parametrize('lons, lats', [([-77.0365], [38.8977]), ([-77.0365, np.nan], [38.8977, np.nan]), ([], [])],
+                         ids=['outside', 'outside-and-missing', 'empty'])
+def test_lookup_many_without_matches(lookup, lons, lats):
+    many = lookup.lookup_many(lons, lats)
+    assert list(many.columns) == LOOKUP_COLUMNS
+    assert len(many) == len(lons)
+    assert many.isna().all().all()
+
+def test_service_without_matches(lookup):
+    server, url = startServer(lookup, port=0)
+    try:
+        with requests.Session() as session:
+            outside = session.post(url + "/lookup_many", json={"lon": [-77.0365], "lat": [38.8977]})
+            assert outside.status_code == 200
+            assert outside.json() == {column: [None] for column in LOOKUP_COLUMNS}
+            empty = session.post(url + "/lookup_many", json={"lon": [], "lat": []})
+            assert empty.json() == {column: [] for column in LOOKUP_COLUMNS}
+            assert session.post(url + "/lookup_many", json={"lon": [1, 2], "lat": [1]}).status_code == 400
+    finally:
+        server.shutdown()
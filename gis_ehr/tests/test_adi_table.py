@@ -0,0 +1,65 @@
+# The typed ADI table must join the same GISJOIN and rank strings as the string merge
+# join_adi.py used to do, and round-trip through its saved form.
+
+# Imports
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from adi_table import AdiTable, decode_ranks, encode_ranks
+from defaults import ADI_TABLE
+
+ADI_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ADI_TABLE)
+COLUMNS = ['GISJOIN', 'ADI_NAT_20', 'ADI_ST_20']
+
+
+
+@pytest.fixture(scope='module')
+def strings():
+    return pd.read_csv(ADI_CSV).astype(str).rename(columns={'ADI_NATRANK': 'ADI_NAT_20', 'ADI_STATERNK': 'ADI_ST_20'})
+
+@pytest.fixture(scope='module')
+def table():
+    return AdiTable.from_csv(ADI_CSV)
+
+def assert_same_join(strings, table, df):
+    merged = df.merge(strings, on='FIPS', how='left')
+    probed = table.join(df)
+    for column in COLUMNS:
+        assert merged[column].astype(object).fillna('').equals(probed[column].astype(object).fillna('')), column
+
+def test_join_matches_string_merge(strings, table):
+    # Mostly block groups in the table, some missing (no FIPS) and some unknown to it
+    rng = np.random.default_rng(0)
+    fips = rng.choice(np.append(strings['FIPS'].values, ['299999999999', np.nan]), 50000).astype(object)
+    assert_same_join(strings, table, pd.DataFrame({'location_id': np.arange(len(fips)), 'FIPS': fips}))
+
+def test_encode_decode_round_trip():
+    values = ['1', '70', '100', 'GQ', 'PH', 'GQ-PH', 'QDI', np.nan]
+    decoded = decode_ranks(encode_ranks(values))
+    assert list(pd.Series(decoded).astype(object).fillna('missing')) == values[:-1] + ['missing']
+
+def test_save_and_load(tmp_path, table):
+    table.save(str(tmp_path / 'adi.feather'))
+    loaded = AdiTable.load(str(tmp_path / 'adi.feather'))
+    assert np.array_equal(loaded.fips, table.fips) and np.array_equal(loaded.nat, table.nat)
+    assert np.array_equal(loaded.st, table.st)
+
+@pytest.mark.parametrize('fips', [[np.nan, np.nan], ['299999999999', np.nan], []], ids=['missing', 'unknown', 'empty'])
+def test_join_without_matches(strings, table, fips):
+    df = pd.DataFrame({'location_id': np.arange(len(fips)), 'FIPS': pd.Series(fips, dtype=object)})
+    assert_same_join(strings, table, df)
+    assert table.join(df)[COLUMNS].isna().all().all()
+
+def test_index_join_without_matches(strtree_index):
+    # A point outside every block group and a row without coordinates, as join_adi.py reads them
+    df = pd.DataFrame({'location_id': [1, 2], 'location_x': [-77.0365, np.nan], 'location_y': [38.8977, np.nan]})
+    joined = strtree_index.join(df)
+    assert joined[['FIPS'] + COLUMNS].isna().all().all()
+
+def test_join_with_empty_table():
+    # What a state registry with no states joins against
+    empty = AdiTable.concat([])
+    df = pd.DataFrame({'location_id': [1, 2], 'FIPS': pd.Series(['295100000000', np.nan], dtype=object)})
+    assert empty.join(df)[COLUMNS].isna().all().all()
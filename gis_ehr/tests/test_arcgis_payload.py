@@ -0,0 +1,80 @@
+# arcgis_payload.py must send the same records, and read back the same results, as the original
+# iterrows/str() helpers from geocode.py.
+
+# Imports
+import ast
+import json
+import numpy as np
+import pandas as pd
+
+from arcgis_payload import build_multi_line_payload, build_single_line_payload, parse_response
+
+
+
+# --- Original helpers, as they were in geocode.py ---
+
+def formatRecordsOld(data):
+    records = []
+    for index, row in data.iterrows():
+        attributes = dict({"ObjectID" : row["location_id"],
+                           "address" : row["street_address"],
+                           "city" : row["givenCity"],
+                           "region" : row["givenState"],
+                           "postal" : row["givenZip"]})
+        records.append(dict({"attributes": attributes}))
+    return str(dict({"records" : records}))
+
+def parsePostResponseOld(response):
+    locations = response["locations"]
+    d = []
+    for l in locations:
+        location_id = l["attributes"].get("ResultID", None)
+        address = l.get("address", None)
+        location_x = l.get("location", {}).get("x", None)
+        location_y = l.get("location", {}).get("y", None)
+        score = l.get("score", None)
+        status = l["attributes"].get("Status", None)
+        d.append((location_id, address, location_x, location_y, score, status))
+    return pd.DataFrame(d, columns=['location_id', 'matched_address', 'location_x', 'location_y', 'score', 'status'])
+
+
+
+# --- Synthetic batch and response ---
+
+def batch(n=1000):
+    return pd.DataFrame({
+        'location_id': range(1, n + 1),
+        'street_address': [f"{i} Main St" for i in range(n)],
+        'givenCity': 'SAINT LOUIS',
+        'givenState': 'MO',
+        'givenZip': 63110,
+    })
+
+def response(n=1000):
+    return json.loads(json.dumps({"locations": [
+        {"address": f"{i} Main St, Saint Louis, Missouri, 63110",
+         "location": {"x": -90.2 + i * 1e-5, "y": 38.6 + i * 1e-5},
+         "score": 100,
+         "attributes": {"ResultID": i + 1, "Status": "M"}}
+        for i in range(n)]}))
+
+
+
+def test_multi_line_payload_matches_original_records():
+    data = batch()
+    payload = build_multi_line_payload(data["location_id"], data["street_address"],
+                                       data["givenCity"], data["givenState"], data["givenZip"])
+    assert json.loads(payload) == ast.literal_eval(formatRecordsOld(data))
+
+def test_payload_sends_missing_values_as_null_and_whole_floats_as_integers():
+    payload = json.loads(build_single_line_payload(pd.Series([1.0, 2.0]), pd.Series(["660 S Euclid Ave", np.nan])))
+    assert payload == {"records": [{"attributes": {"ObjectID": 1, "SingleLine": "660 S Euclid Ave"}},
+                                   {"attributes": {"ObjectID": 2, "SingleLine": None}}]}
+
+def test_parse_response_matches_original():
+    pd.testing.assert_frame_equal(parsePostResponseOld(response()),
+                                  parse_response(response()).rename(columns={'ResultID': 'location_id'}))
+
+def test_parse_response_without_location():
+    parsed = parse_response({"locations": [{"attributes": {"ResultID": 1, "Status": "U"}, "score": 0}]})
+    assert np.isnan(parsed.loc[0, 'location_x']) and parsed.loc[0, 'matched_address'] is None
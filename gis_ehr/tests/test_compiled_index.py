@@ -0,0 +1,34 @@
+# A compiled index (adi_index.py) must load back the same block groups and ADI table it was saved from,
+# and join points exactly as the index built from the sources does.
+
+# Imports
+import numpy as np
+import pandas as pd
+import shapely
+
+from adi_index import BlockGroupIndex, load_index
+from synthetic_index import sample_points
+
+
+
+def test_load_round_trip(tmp_path, strtree_index):
+    strtree_index.save(str(tmp_path))
+    loaded = BlockGroupIndex.load(str(tmp_path), engine=False)
+    assert loaded.path == str(tmp_path)
+    assert loaded.engine is None
+    assert loaded.fips.tolist() == strtree_index.fips.tolist()
+    assert shapely.equals_exact(loaded.geometries, strtree_index.geometries, 0).all()
+    for column in ['fips', 'nat', 'st']:
+        assert np.array_equal(getattr(loaded.adi, column), getattr(strtree_index.adi, column))
+
+def test_compiled_join_matches_sources(strtree_index, compiled_index):
+    x, y = sample_points(strtree_index.geometries, 5000, seed=2)
+    df = pd.DataFrame({'location_id': np.arange(len(x)), 'location_x': x, 'location_y': y})
+    expected = strtree_index.join(df)
+    assert expected['FIPS'].notna().any()
+    pd.testing.assert_frame_equal(expected, compiled_index.join(df))
+
+def test_load_index_prefers_compiled(tmp_path, strtree_index):
+    strtree_index.save(str(tmp_path))
+    index = load_index(str(tmp_path), shapefile=str(tmp_path / 'missing.shp'))
+    assert index.path == str(tmp_path) and index.engine is not None
@@ -0,0 +1,56 @@
+# GeocodeClient: which failures are retried, which shrink the batch, and which are given up on at once.
+
+# Imports
+import pytest
+
+import stub_server
+from arcgis_payload import build_single_line_payload
+from geocode_client import AdaptiveBatchSize, GeocodeClient, GeocodeError, RequestRejected
+
+PAYLOAD = build_single_line_payload([1, 2], ["660 S Euclid Ave, St Louis, MO 63110", "1 Brookings Dr, St Louis, MO"])
+
+
+
+@pytest.fixture
+def stub(request):
+    server, url = stub_server.startServer(**request.param)
+    yield server, GeocodeClient(url, retries=3, backoff=0.01, batch_size=AdaptiveBatchSize(1000, 50))
+    server.shutdown()
+
+@pytest.mark.parametrize('stub', [{}], indirect=True)
+def test_success(stub):
+    server, client = stub
+    assert len(client.post(PAYLOAD)["locations"]) == 2
+    assert server.counts['requests'] == 1
+
+@pytest.mark.parametrize('stub', [{'fail_rate': 1.0}, {'error_rate': 1.0}], indirect=True, ids=['503', 'error-body'])
+def test_transient_failures_are_retried(stub):
+    server, client = stub
+    with pytest.raises(GeocodeError) as failure:
+        client.post(PAYLOAD)
+    assert not isinstance(failure.value, RequestRejected)
+    assert server.counts['requests'] == 4
+    assert client.batch_size.size < 1000
+
+@pytest.mark.parametrize('stub', [{'reject_status': 401}, {'reject_status': 400}], indirect=True, ids=['401', '400'])
+def test_rejected_requests_are_not_retried(stub):
+    server, client = stub
+    with pytest.raises(RequestRejected):
+        client.post(PAYLOAD)
+    assert server.counts['requests'] == 1
+    assert client.batch_size.size == 1000
+
+@pytest.mark.parametrize('stub', [{'reject_status': 413}], indirect=True)
+def test_too_large_shrinks_without_retrying(stub):
+    server, client = stub
+    with pytest.raises(GeocodeError) as failure:
+        client.post(PAYLOAD)
+    assert not isinstance(failure.value, RequestRejected)
+    assert server.counts['requests'] == 1
+    assert client.batch_size.size == 500
+
+@pytest.mark.parametrize('stub', [{}], indirect=True)
+def test_malformed_payload_is_rejected(stub):
+    server, client = stub
+    with pytest.raises(RequestRejected):
+        client.post(str({"records": []}))
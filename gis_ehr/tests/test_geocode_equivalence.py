@@ -0,0 +1,104 @@
+# geocode.py against the local stub server: every way of running it (concurrent workers, streaming,
+# the cache, the offline backend, and a server that fails, errors and rejects large batches) must
+# write the same output as one plain serial run.
+
+# Imports
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+
+import stub_server
+
+GEOCODE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'geocode.py')
+ROWS = 3000
+
+
+
+def write_addresses(path, nrow):
+    # Every tenth row repeats an earlier address, so dedup and fan-out are exercised too
+    with open(path, 'w') as f:
+        f.write("location_id,address_1,address_2,city,state,zip\n")
+        for i in range(nrow):
+            n = i - 5 if i % 10 == 9 else i
+            f.write(f"{i + 1},{n % 9000 + 100} Main St,,SAINT LOUIS,MO,{63100 + n % 50}\n")
+
+def geocode(infile, outdir, *options):
+    os.makedirs(outdir, exist_ok=True)
+    subprocess.run([sys.executable, GEOCODE, infile, '--outputPath', outdir, *options],
+                   check=True, stdout=subprocess.DEVNULL, cwd=outdir)
+    return pd.read_csv(os.path.join(outdir, 'GEOCODED_' + os.path.basename(infile)))
+
+@pytest.fixture(scope='module')
+def infile(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('input') / 'addresses.csv')
+    write_addresses(path, ROWS)
+    return path
+
+@pytest.fixture(scope='module')
+def server():
+    server, url = stub_server.startServer(seed=0)
+    yield url
+    server.shutdown()
+
+@pytest.fixture(scope='module')
+def reference(infile, server, tmp_path_factory):
+    return geocode(infile, str(tmp_path_factory.mktemp('reference')), '--url', server)
+
+
+
+def test_reference_geocodes_every_row(reference):
+    assert len(reference) == ROWS
+    assert reference['location_x'].notna().all()
+
+def test_repeated_addresses_share_results(reference):
+    # Row i (i % 10 == 9) repeats row i - 5 and must get its result, while keeping its own location_id
+    repeats = reference.iloc[9::10]
+    originals = reference.iloc[4::10].iloc[:len(repeats)]
+    assert (repeats['location_id'].values != originals['location_id'].values).all()
+    for column in ['location_x', 'location_y', 'score']:
+        assert (repeats[column].values == originals[column].values).all()
+
+@pytest.mark.parametrize('options', [['--workers', '4'], ['--stream'], ['--stream', '--workers', '4']],
+                         ids=['workers', 'stream', 'stream-workers'])
+def test_same_output(infile, server, reference, tmp_path, options):
+    pd.testing.assert_frame_equal(reference, geocode(infile, str(tmp_path), '--url', server, *options))
+
+def test_cached_rerun(infile, reference, tmp_path):
+    server, url = stub_server.startServer(seed=0)
+    try:
+        cache = str(tmp_path / 'cache.sqlite')
+        first = geocode(infile, str(tmp_path / 'first'), '--url', url, '--cache', cache)
+        requests = server.counts['requests']
+        # Every row of the second run must come from the cache
+        second = geocode(infile, str(tmp_path / 'second'), '--url', url, '--cache', cache)
+        assert server.counts['requests'] == requests
+    finally:
+        server.shutdown()
+    pd.testing.assert_frame_equal(reference, first)
+    pd.testing.assert_frame_equal(reference, second)
+
+def test_offline_stub_matches_server(infile, reference, tmp_path):
+    pd.testing.assert_frame_equal(reference, geocode(infile, str(tmp_path), '--backend', 'offline'))
+
+def test_faulty_server(infile, reference, tmp_path):
+    # 503s, error bodies and a batch limit below the default batch size: retries and adaptive
+    # batching must still geocode every row, with the same results
+    server, url = stub_server.startServer(fail_rate=0.05, error_rate=0.05, max_batch=400, seed=1)
+    try:
+        faulty = geocode(infile, str(tmp_path), '--url', url, '--workers', '4', '--retries', '3')
+        assert server.counts['failed'] > 0
+    finally:
+        server.shutdown()
+    pd.testing.assert_frame_equal(reference, faulty)
+
+def test_rejected_requests_are_not_split(infile, tmp_path):
+    # A 4xx like a bad token fails the run on the first batch, instead of splitting every batch down to --minBatch
+    server, url = stub_server.startServer(reject_status=401)
+    try:
+        with pytest.raises(subprocess.CalledProcessError):
+            geocode(infile, str(tmp_path), '--url', url)
+        assert server.counts['requests'] == 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,80 @@
+# geocodingComparison/geocodeManualAnalysis.py: the city and ZIP counts of matchCityStateZip, and the
+# flag tables combineFlags builds from a stratum's three files. Only main() needs matplotlib.
+
+# Imports
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'geocodingComparison'))
+
+from geocodeManualAnalysis import ARCFILES, DGFILES, STRATUMA, combineFlags, getFileType, matchCityStateZip
+
+GIVEN = pd.DataFrame({
+    'address': ["1 Main St", "2 Main St", "3 Main St", "4 Main St"],
+    'givenCity': ["Saint Louis", "SAINT LOUIS ", "Clayton", "Boston"],
+    'givenState': ["MO", "MO", "MO", "MA"],
+    'givenZip': ["63110", "63110-1234", "63105", "02134"],
+})
+
+
+
+def flags(addresses, columns, seed):
+    # Flagged rows of one file: the address, then that file's columns
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'address': addresses, **{c: rng.integers(0, 100, len(addresses)) for c in columns}})
+
+def chained_merge(flagTables):
+    # How the flag tables were joined before: outer merges one file at a time
+    merged = flagTables[0]
+    for df in flagTables[1:]:
+        merged = merged.merge(df, on='address', how='outer')
+    return merged
+
+
+
+def test_arcgis_counts():
+    df = GIVEN.assign(**{'Returned Address': ["1 Main St, St Louis, Missouri, 63110",
+                                              "2 Main St, Saint Louis, Missouri, 63110",
+                                              "3 Main St, Clayton, Missouri, 63117", np.nan]})
+    verify, mismatchTable = matchCityStateZip(df, ARCFILES[0])
+    assert (verify['cityMatch'], verify['zipCodeMatch'], verify['Nan zip codes'], verify['Diff zip codes']) == (2, 2, 1, 1)
+    assert mismatchTable['address'].tolist() == ["3 Main St", "4 Main St"]
+    assert mismatchTable['matchedZip_arcGISsingle'].tolist() == ["63117", "nan"]
+
+def test_degauss_counts():
+    # DeGAUSS ZIPs read as floats: 2134.0 lost its leading zero
+    df = GIVEN.assign(matched_city=["Saint Louis", "Saint Louis", "Clayton", "Boston"],
+                      matched_state=["MO", "MO", "MO", "MA"], matched_zip=[63110.0, 63111.0, np.nan, 2134.0])
+    verify, mismatchTable = matchCityStateZip(df, DGFILES[0])
+    assert (verify['cityMatch'], verify['zipCodeMatch'], verify['Nan zip codes'], verify['Diff zip codes']) == (4, 2, 1, 1)
+    assert mismatchTable['address'].tolist() == ["2 Main St", "3 Main St"]
+
+def test_combine_flags_matches_chained_merge():
+    # With each address flagged at most once per file, the values are those of the chained merge;
+    # only the column suffixes differ
+    flagTables = [flags(["a", "c", "d"], ['givenZip', 'Score'], 0), flags(["b", "c"], ['givenZip', 'Score'], 1),
+                  flags(["a", "b", "c", "e"], ['givenZip', 'matched_zip'], 2)]
+    combined = combineFlags(flagTables, [getFileType(file) for file in STRATUMA])
+    assert list(combined.columns) == ['address', 'givenZip_arcGISsingle', 'Score_arcGISsingle', 'givenZip_arcGISmulti',
+                                      'Score_arcGISmulti', 'givenZip_DeGAUSS', 'matched_zip_DeGAUSS']
+    expected = chained_merge(flagTables)
+    expected.columns = combined.columns
+    pd.testing.assert_frame_equal(combined, expected, check_dtype=False)
+
+def test_combine_flags_repeated_addresses():
+    # "a" is flagged twice in the first file, once in the second and three times in the third: the chained
+    # merge cross-joins its rows (2 x 1 x 3), combineFlags lines them up by occurrence (3 rows)
+    flagTables = [flags(["a", "a", "b"], ['Score'], 0), flags(["a", "b"], ['Score'], 1),
+                  flags(["a", "a", "a"], ['matched_zip'], 2)]
+    combined = combineFlags(flagTables, [getFileType(file) for file in STRATUMA])
+    assert len(chained_merge(flagTables)) == 7
+    assert combined.shape == (4, 4)
+    assert combined['address'].tolist() == ["a", "a", "a", "b"]
+    a = combined[combined['address'] == "a"]
+    assert a['Score_arcGISsingle'].tolist()[:2] == flagTables[0]['Score'].tolist()[:2]
+    assert a['Score_arcGISsingle'].isna().tolist() == [False, False, True]
+    assert a['Score_arcGISmulti'].notna().sum() == 1
+    assert a['matched_zip_DeGAUSS'].tolist() == flagTables[2]['matched_zip'].tolist()
@@ -0,0 +1,88 @@
+# The offline backend with a reference table (sampleStreetRanges.csv): house numbers interpolated along
+# their street's segment, ZIP centroids for addresses on no segment, and misses for anything else,
+# the same from single-line and multi-line records.
+
+# Imports
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from arcgis_payload import RESPONSE_COLUMNS
+from geocoder_backends import ZIP_SCORE, OfflineBackend, multi_line_records, single_line_records
+
+STREET_RANGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sampleStreetRanges.csv')
+
+# Ends of the two S Euclid Ave segments in 63110, and the ZIP's centroid (the mean of their midpoints)
+EUCLID_600 = (-90.26455, 38.63860, -90.26440, 38.63540)
+EUCLID_700 = (-90.26440, 38.63540, -90.26425, 38.63220)
+CENTROID_63110 = (np.mean([-90.26455, -90.26440, -90.26440, -90.26425]),
+                  np.mean([38.63860, 38.63540, 38.63540, 38.63220]))
+
+
+
+@pytest.fixture(scope='module')
+def backend():
+    return OfflineBackend(STREET_RANGES)
+
+def geocode(backend, *addresses):
+    # addresses: (street address, ZIP) pairs, geocoded as multi-line records
+    street, postal = zip(*addresses)
+    records = multi_line_records(np.arange(len(addresses)), street, ["SAINT LOUIS"] * len(addresses),
+                                 ["MO"] * len(addresses), postal)
+    return backend.geocode_batch(records)
+
+def along(segment, t):
+    x0, y0, x1, y1 = segment
+    return x0 + t * (x1 - x0), y0 + t * (y1 - y0)
+
+
+
+def test_interpolated_house_number(backend):
+    result = geocode(backend, ("660 S Euclid Ave", "63110"), ("750 s euclid  ave", "63110-1234")).iloc
+    assert list(result[0]) == [0, "660 S EUCLID AVE, 63110", *along(EUCLID_600, 60 / 98), 100, 'M']
+    assert list(result[1]) == [1, "750 S EUCLID AVE, 63110", *along(EUCLID_700, 50 / 98), 100, 'M']
+
+def test_other_side_of_the_street(backend):
+    # The segments are numbered along the even side; odd numbers on the same block take the same segment
+    result = geocode(backend, ("661 S Euclid Ave", "63110"), ("699 S Euclid Ave", "63110"),
+                     ("701 S Euclid Ave", "63110"))
+    assert result['score'].tolist() == [100, 100, 100]
+    assert tuple(result.loc[0, ['location_x', 'location_y']]) == along(EUCLID_600, 61 / 98)
+    # Past the segment's last even number, the point stays at its end rather than running past it
+    assert tuple(result.loc[1, ['location_x', 'location_y']]) == EUCLID_600[2:]
+    assert tuple(result.loc[2, ['location_x', 'location_y']]) == along(EUCLID_700, 1 / 98)
+
+def test_zip_centroid_fallback(backend):
+    # A number past every segment of a known street, and a street with no segments, in a known ZIP
+    result = geocode(backend, ("9999 S Euclid Ave", "63110"), ("12 Main St", "63110"), ("S Euclid Ave", "63110"))
+    assert result['matched_address'].tolist() == ["63110"] * 3
+    assert result['score'].tolist() == [ZIP_SCORE] * 3
+    assert result['status'].tolist() == ['M'] * 3
+    for i in range(3):
+        assert tuple(result.loc[i, ['location_x', 'location_y']]) == pytest.approx(CENTROID_63110)
+
+def test_miss(backend):
+    result = geocode(backend, ("660 S Euclid Ave", "10001"), ("660 S Euclid Ave", ""), ("", None))
+    assert result['matched_address'].isna().all()
+    assert result[['location_x', 'location_y']].isna().all().all()
+    assert result['score'].tolist() == [0, 0, 0]
+    assert result['status'].tolist() == ['U', 'U', 'U']
+
+def test_result_types(backend):
+    result = geocode(backend, ("660 S Euclid Ave", "63110"), ("12 Main St", "63110"), ("1 Main St", "10001"))
+    assert list(result.columns) == RESPONSE_COLUMNS
+    assert result['location_x'].dtype == result['location_y'].dtype == np.float64
+
+def test_single_line_matches_multi_line(backend):
+    addresses = [("660 S Euclid Ave", "63110"), ("699 S Euclid Ave", "63110"), ("12 Main St", "63110"),
+                 ("48 N 4th St", "63102"), ("1 Main St", "10001")]
+    single_line = [f"{street}, SAINT LOUIS, MO {postal}" for street, postal in addresses]
+    pd.testing.assert_frame_equal(geocode(backend, *addresses),
+                                  backend.geocode_batch(single_line_records(np.arange(len(addresses)), single_line)))
+
+def test_reference_columns_are_checked(tmp_path):
+    path = str(tmp_path / 'ranges.csv')
+    pd.read_csv(STREET_RANGES).drop(columns='to_y').to_csv(path, index=False)
+    with pytest.raises(ValueError, match='to_y'):
+        OfflineBackend(path)
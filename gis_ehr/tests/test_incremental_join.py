@@ -0,0 +1,90 @@
+# join_adi.py --incremental must write what a full run writes: after rows are moved, added and dropped,
+# and after the index it joins against changes (a state registered, an index recompiled in place).
+
+# Imports
+import numpy as np
+import pandas as pd
+import pytest
+
+import join_adi
+from state_registry import compiled_path
+from synthetic_index import sample_points, synthetic_adi
+
+OPTIONS = {'index': 'synthetic', 'levels': ['TRACT'], 'nearest': 100.0}
+
+
+
+@pytest.fixture(scope='module')
+def points(strtree_index):
+    x, y = sample_points(strtree_index.geometries, 3000, seed=4)
+    return pd.DataFrame({'location_id': np.arange(len(x)), 'location_x': x, 'location_y': y})
+
+def assert_same_join(actual, expected):
+    # Reused rows come back from the state file, where a categorical column can end up as object (with
+    # None for missing values); what join_adi.py writes is the same either way
+    def values(df):
+        return df.astype(object).where(df.notna(), None)
+    pd.testing.assert_frame_equal(values(actual), values(expected))
+
+def full_join(df, index):
+    return join_adi.join_adi(df, index, OPTIONS['levels'], OPTIONS['nearest'])
+
+def incremental_join(df, index, state_path):
+    return join_adi.join_adi(df, index, OPTIONS['levels'], OPTIONS['nearest'], (state_path, OPTIONS))
+
+def run(tmp_path, *options):
+    # join_adi.py on points.csv in tmp_path; returns its output
+    join_adi.main([str(tmp_path / 'points.csv'), *options])
+    return pd.read_csv(tmp_path / 'results' / 'ADI_points.csv', dtype=str)
+
+
+
+def test_moved_new_and_dropped_rows(tmp_path, capsys, strtree_index, points):
+    state_path = str(tmp_path / 'state.parquet')
+    first = points.iloc[:2000]
+    assert_same_join(incremental_join(first, strtree_index, state_path), full_join(first, strtree_index))
+
+    # Drop 100 rows, move 100 to other points, add 100 new ones, and shuffle
+    second = first.iloc[100:].copy()
+    second.iloc[:100, 1:] = points.iloc[2000:2100, 1:].values
+    second = pd.concat([second, points.iloc[2100:2200].assign(location_id=np.arange(5000, 5100))])
+    second = second.sample(frac=1, random_state=0).reset_index(drop=True)
+    capsys.readouterr()
+    assert_same_join(incremental_join(second, strtree_index, state_path), full_join(second, strtree_index))
+    assert "200 new or changed rows, 1800 reused" in capsys.readouterr().out
+
+    # Nothing changed: every row comes from the state
+    assert_same_join(incremental_join(second, strtree_index, state_path), full_join(second, strtree_index))
+    assert "0 new or changed rows, 2000 reused" in capsys.readouterr().out
+
+def test_registering_a_state(tmp_path, monkeypatch, capsys, strtree_index, points):
+    # Every row is unmatched while resources/ has no states, and must be joined once Missouri is compiled
+    monkeypatch.chdir(tmp_path)
+    points.to_csv(tmp_path / 'points.csv', index=False)
+    resources = str(tmp_path / 'resources')
+    options = ['--resources', resources, '--incremental']
+    assert run(tmp_path, *options)['FIPS'].isna().all()
+
+    strtree_index.save(compiled_path('29', resources))
+    capsys.readouterr()
+    incremental = run(tmp_path, *options)
+    assert "index files changed" in capsys.readouterr().out
+    assert incremental['FIPS'].notna().any()
+    pd.testing.assert_frame_equal(incremental, run(tmp_path, '--resources', resources))
+
+def test_recompiled_index(tmp_path, monkeypatch, strtree_index, points):
+    # The same block groups recompiled in place with a different ADI table
+    monkeypatch.chdir(tmp_path)
+    points.to_csv(tmp_path / 'points.csv', index=False)
+    index_path = str(tmp_path / 'index')
+    strtree_index.save(index_path)
+    first = run(tmp_path, '--index', index_path, '--incremental')
+
+    strtree_index.adi = synthetic_adi(strtree_index.fips, seed=1)
+    try:
+        strtree_index.save(index_path)
+    finally:
+        strtree_index.adi = synthetic_adi(strtree_index.fips)
+    incremental = run(tmp_path, '--index', index_path, '--incremental')
+    assert not incremental['ADI_NAT_20'].equals(first['ADI_NAT_20'])
+    pd.testing.assert_frame_equal(incremental, run(tmp_path, '--index', index_path))
@@ -0,0 +1,22 @@
+# locate_parallel must give exactly the serial result, in input order, at any worker count.
+
+# Imports
+import numpy as np
+import pytest
+
+import parallel_join
+from parallel_join import locate_parallel
+from synthetic_index import sample_points
+
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_parallel_matches_serial(monkeypatch, compiled_index, workers):
+    # Small inputs normally stay serial; lower the threshold so the pool actually runs
+    monkeypatch.setattr(parallel_join, 'MIN_PARALLEL_POINTS', 0)
+    x, y = sample_points(compiled_index.geometries, 20000, seed=1)
+    x[::97] = np.nan
+    expected = compiled_index.locate_serial(x, y)
+    actual = locate_parallel(compiled_index, x, y, workers)
+    assert np.array_equal(expected[0], actual[0])
+    assert np.array_equal(expected[1], actual[1])
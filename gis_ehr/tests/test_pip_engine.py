@@ -0,0 +1,65 @@
+# The STRtree path and the grid engine must find exactly the (point, block group) pairs
+# gpd.sjoin(predicate='within') finds, including for points right on vertices and edges.
+
+# Imports
+import numpy as np
+import pytest
+import shapely
+
+from pip_engine import NEAR_EDGE, GridEngine, reference_polygons
+from synthetic_index import sample_points
+
+
+
+def sjoin(geometries, x, y):
+    import geopandas as gpd
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y))
+    polygons = gpd.GeoDataFrame(geometry=geometries)
+    joined = gpd.sjoin(points, polygons, how='inner', predicate='within')
+    order = np.lexsort((joined['index_right'].values, joined.index.values))
+    return joined.index.values[order], joined['index_right'].values[order]
+
+def assert_same_pairs(expected, actual):
+    assert np.array_equal(expected[0], actual[0])
+    assert np.array_equal(expected[1], actual[1])
+
+@pytest.fixture(scope='module')
+def grid_engine(strtree_index):
+    return GridEngine.build(strtree_index.geometries)
+
+@pytest.fixture(scope='module')
+def points(strtree_index):
+    return sample_points(strtree_index.geometries, 50000)
+
+def test_strtree_matches_sjoin(strtree_index, points):
+    assert_same_pairs(sjoin(strtree_index.geometries, *points), strtree_index.locate_exact(*points))
+
+def test_grid_matches_sjoin(strtree_index, grid_engine, points):
+    expected = sjoin(strtree_index.geometries, *points)
+    assert_same_pairs(expected, grid_engine.locate(*points, exact=strtree_index.locate_exact))
+
+def test_saved_grid_matches(tmp_path, strtree_index, grid_engine, points):
+    grid_engine.save(str(tmp_path))
+    loaded = GridEngine.load(str(tmp_path), mmap_mode='r')
+    assert_same_pairs(grid_engine.locate(*points, exact=strtree_index.locate_exact),
+                      loaded.locate(*points, exact=strtree_index.locate_exact))
+
+def test_points_off_the_grid(grid_engine):
+    point_idx, polygon_idx = grid_engine.locate([np.nan, -100.0, 0.0], [np.nan, 38.5, 0.0])
+    assert len(point_idx) == 0 and len(polygon_idx) == 0
+
+def test_reference_point_stuck_on_an_edge():
+    # Two polygons split by a line through (0.5, 0.5) along the nudge direction, so nudging never
+    # moves that reference point off the edge
+    left, right = 0.5 - 0.5 * 0.19 / 0.37, 0.5 + 0.5 * 0.19 / 0.37
+    geometries = np.array([shapely.Polygon([(0, 0), (1, 0), (1, right), (0, left)]),
+                           shapely.Polygon([(0, left), (1, right), (1, 1), (0, 1)])])
+    x, y = np.array([0.5, 0.5]), np.array([0.5, 0.1])
+    polygon = reference_polygons(geometries, x, y, 0.5)
+    assert polygon[1] == 0 and (x[1], y[1]) == (0.5, 0.1)
+    assert polygon[0] >= 0
+    point = shapely.Point(x[0], y[0])
+    assert shapely.contains(geometries[polygon[0]], point)
+    assert not shapely.dwithin(shapely.boundary(geometries), point, NEAR_EDGE).any()
+    # Still inside its cell
+    assert abs(x[0] - 0.5) <= 0.25 and abs(y[0] - 0.5) <= 0.25
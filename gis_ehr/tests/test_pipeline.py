@@ -0,0 +1,57 @@
+# pipeline.py imports without side effects, its join stage writes what join_adi.py's join gives, and
+# the plot stage draws from the joined frame it is handed.
+
+# Imports
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipeline
+from join_adi import join_adi
+from synthetic_index import sample_points
+
+
+
+def test_join_stage_matches_join_adi(tmp_path, strtree_index, compiled_index):
+    index_path = str(tmp_path / 'index')
+    strtree_index.save(index_path)
+    x, y = sample_points(strtree_index.geometries, 500, seed=3)
+    infile = str(tmp_path / 'points.csv')
+    pd.DataFrame({'location_id': range(len(x)), 'location_x': x, 'location_y': y}).to_csv(infile, index=False)
+
+    pipeline.main([infile, '--stages', 'join', '--index', index_path, '--levels', 'TRACT',
+                   '--outputPath', str(tmp_path / 'results')])
+    written = pd.read_csv(str(tmp_path / 'results' / 'ADI_points.csv'), dtype=str)
+    expected = join_adi(pd.read_csv(infile), compiled_index, ['TRACT'])
+    assert len(written) == len(expected)
+    for column in ['FIPS', 'GISJOIN', 'ADI_NAT_20', 'TRACT_FIPS']:
+        pd.testing.assert_series_equal(written[column], expected[column].astype(object), check_dtype=False)
+    assert os.path.exists(str(tmp_path / 'results' / 'TRACT_ADI_points.csv'))
+
+def test_plot_stage(tmp_path, monkeypatch, strtree_index):
+    # The join and plot stages together, with the joined frame (categorical ranks) handed over in memory
+    pytest.importorskip('matplotlib')
+    plotly = pytest.importorskip('plotly')
+    import plotly.graph_objects as go
+    # Rendering the scatterplot needs a browser and plotly's map outlines from its CDN; write the
+    # figure as JSON instead, so what would be drawn can still be checked
+    monkeypatch.setattr(go.Figure, 'write_image', lambda figure, path: figure.write_json(path))
+
+    index_path = str(tmp_path / 'index')
+    strtree_index.save(index_path)
+    x, y = sample_points(strtree_index.geometries, 500, seed=3)
+    x[:5] = np.nan
+    infile = str(tmp_path / 'points.csv')
+    pd.DataFrame({'location_id': range(len(x)), 'location_x': x, 'location_y': y}).to_csv(infile, index=False)
+    outdir = tmp_path / 'results'
+    pipeline.main([infile, '--stages', 'join', 'plot', '--index', index_path, '--outputPath', str(outdir)])
+
+    joined = pd.read_csv(str(outdir / 'ADI_points.csv'), dtype=str)
+    scatter = plotly.io.read_json(str(outdir / 'scatterplot.png')).data[0]
+    assert len(scatter.lon) == len(joined)
+    # Black where there's no numeric rank (unmatched, GQ, ...), the rank itself otherwise
+    numeric = pd.to_numeric(joined['ADI_NAT_20'], errors='coerce')
+    assert list(scatter.marker.color) == ['black' if pd.isna(rank) else rank for rank in numeric]
+    with open(str(outdir / 'choroplethPlots.png'), 'rb') as f:
+        assert f.read(8) == b'\x89PNG\r\n\x1a\n'